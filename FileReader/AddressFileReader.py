@@ -1,5 +1,5 @@
 from FileReader import FileReader
-import re
+from collections import Counter
 
 
 class AddressFileReader(FileReader):
@@ -7,37 +7,39 @@ class AddressFileReader(FileReader):
         FileReader.__init__(self, filename, header)
 
         self.__location_to_search = None
-        self.__location_count = 0
+        self.__count_all_locations = False
+        self.__location_counts = Counter()
         self.__practice_code_to_postcode = {}
 
     def set_location_to_search(self, location_to_search):
         self.__location_to_search = location_to_search
 
+    """ Tallies the practices in every location during the same pass, so any number of locations can be asked for
+        with get_count_for_location afterwards
+    """
+    def set_count_all_locations(self, count_all_locations):
+        self.__count_all_locations = count_all_locations
+
     def process_file(self, row):
         if len(row) is not len(self.get_csv_header()):
             return
         else:
             self.__populate_practice_code_to_postcode(row)
 
-        if self.__location_to_search is None:
+        if self.__location_to_search is None and not self.__count_all_locations:
             return
         else:
             self.__count_locations(row)
 
-    """ Look for LONDON in the town field, then the locality field and finally in the address field.
-        This is because certain entries have empty fields.
+    """ A practice is in a location if its town, locality or address field is the location, as certain entries have
+        empty fields. The three fields are stripped of their padding once and the practice is counted once for every
+        distinct value among them, so every location is tallied in the same pass.
     """
     def __count_locations(self, row):
-        location_regex = re.compile(r'^' + self.__location_to_search + '\s*$')
-
-        if row[self.get_column_index('town')] and location_regex.search(row[self.get_column_index('town')]) is not None:
-            self.__location_count += 1
-        elif row[self.get_column_index('locality')] \
-                and location_regex.search(row[self.get_column_index('locality')]) is not None:
-            self.__location_count += 1
-        elif row[self.get_column_index('address')] \
-                and location_regex.search(row[self.get_column_index('address')]) is not None:
-            self.__location_count += 1
+        locations = {row[self.get_column_index('town')].rstrip(), row[self.get_column_index('locality')].rstrip(),
+                     row[self.get_column_index('address')].rstrip()}
+        locations.discard('')
+        self.__location_counts.update(locations)
 
     """ Populate a dictionary with practice_code as key and postcode as values.
         This will be useful for future lookup.
@@ -52,8 +54,30 @@ class AddressFileReader(FileReader):
 
         return self.__practice_code_to_postcode.get(practice_code, None)
 
+    """ Combines the counts and practice lookup of a reader that processed a later part of the file
+    """
+    def merge(self, other):
+        FileReader.merge(self, other)
+        self.__location_counts.update(other.__location_counts)
+        self.__practice_code_to_postcode.update(other.__practice_code_to_postcode)
+
+    def get_practice_code_to_postcode(self):
+        return self.__practice_code_to_postcode
+
+    """ Number of practices in the location set with set_location_to_search
+    """
     def get_location_count(self):
-        return self.__location_count
+        if self.__location_to_search is None:
+            return 0
+        return self.get_count_for_location(self.__location_to_search)
+
+    def get_count_for_location(self, location):
+        return self.__location_counts[location]
+
+    """ Number of practices in every location seen, a Counter keyed by town, locality or address
+    """
+    def get_location_counts(self):
+        return self.__location_counts
 
     def get_practice_code_to_postcode_count(self):
         return len(self.__practice_code_to_postcode)
@@ -0,0 +1,291 @@
+from FileReader.DrugCatalogue import DrugCatalogue
+from FileReader.PrescriptionAggregators import PriceByRegionAggregator, BnfHierarchyAggregator
+import json
+import os
+import sqlite3
+
+""" AggregateCube class
+    A materialised aggregate of a prescription file in a local SQLite database, built in one pass so that repeated and
+    new questions are answered with SQL instead of another scan of the file.
+    The cube holds one cell per practice, BNF CODE, BNF NAME and PERIOD, with the number of rows and the summed ITEMS,
+    NIC and ACT COST as integer counts and pence. BNF NAME is part of the grain because the drug categories are matched
+    on it. Each cell also sums the price per item of its rows, in millionths of a penny, so averages per prescription
+    come out exactly as PriceByRegionAggregator computes them.
+    Practices are joined to their postcode and region through a practices table filled by set_practice_lookups, and
+    presentations to their drug categories through a categories table filled by set_drug_catalogue.
+    Rows are summed in memory a block at a time and upserted with executemany, so memory stays bounded by the block.
+    The cube remembers the size and modification time of its source and is stale once either changes.
+    Attributes: filename - Path to the SQLite database
+"""
+
+
+class AggregateCube:
+    __schema = ('CREATE TABLE metadata (key TEXT PRIMARY KEY, value TEXT NOT NULL)',
+                'CREATE TABLE presentations (presentation_id INTEGER PRIMARY KEY, bnf_code TEXT NOT NULL, '
+                'bnf_name TEXT NOT NULL, UNIQUE (bnf_code, bnf_name))',
+                'CREATE TABLE cells (practice TEXT NOT NULL, presentation_id INTEGER NOT NULL, period TEXT NOT NULL, '
+                'rows INTEGER NOT NULL, items INTEGER NOT NULL, nic INTEGER NOT NULL, act_cost INTEGER NOT NULL, '
+                'priced_rows INTEGER NOT NULL, price INTEGER NOT NULL, '
+                'PRIMARY KEY (practice, presentation_id, period)) WITHOUT ROWID',
+                'CREATE INDEX cells_by_presentation ON cells (presentation_id)',
+                'CREATE INDEX cells_by_period ON cells (period)',
+                'CREATE TABLE practices (practice TEXT PRIMARY KEY, postcode TEXT, region TEXT)',
+                'CREATE TABLE categories (category TEXT NOT NULL, presentation_id INTEGER NOT NULL, '
+                'PRIMARY KEY (category, presentation_id))')
+    __upsert = ('INSERT INTO cells VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (practice, presentation_id, period) DO UPDATE SET rows = rows + excluded.rows, '
+                'items = items + excluded.items, nic = nic + excluded.nic, act_cost = act_cost + excluded.act_cost, '
+                'priced_rows = priced_rows + excluded.priced_rows, price = price + excluded.price')
+
+    def __init__(self, filename):
+        self.__filename = filename
+        self.__connection = None
+        self.__categorised = False
+
+    def get_filename(self):
+        return self.__filename
+
+    def __connect(self):
+        if self.__connection is None:
+            if not os.path.isfile(self.__filename):
+                raise ValueError('The aggregate cube ' + self.__filename + ' has not been built.')
+            self.__connection = sqlite3.connect(self.__filename)
+        return self.__connection
+
+    def close(self):
+        if self.__connection is not None:
+            self.__connection.close()
+            self.__connection = None
+
+    """ A connection cannot be pickled, a copy opens its own when it is first queried
+    """
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_AggregateCube__connection'] = None
+        return state
+
+    def __get_metadata(self, key):
+        if not os.path.isfile(self.__filename):
+            return None
+
+        try:
+            row = self.__connect().execute('SELECT value FROM metadata WHERE key = ?', (key,)).fetchone()
+        except sqlite3.DatabaseError:
+            return None
+        return json.loads(row[0]) if row is not None else None
+
+    """ True if the cube was built from a source with the given signature
+    """
+    def is_valid(self, source_signature):
+        return self.__get_metadata('source') == source_signature
+
+    def get_row_count(self):
+        return self.__get_metadata('row_count')
+
+    def get_skipped_row_count(self):
+        return self.__get_metadata('skipped_row_count')
+
+    def get_cell_count(self):
+        return self.__connect().execute('SELECT COUNT(*) FROM cells').fetchone()[0]
+
+    """ Builds the cube from rows of (practice, bnf_code, bnf_name, period, items, nic, act_cost), with the numbers
+        already parsed to counts and pence. Rows that are None or have a number that is None are skipped and counted.
+        The cube is written to a temporary database that replaces the old one once it is complete.
+    """
+    def build(self, rows, source_signature, block_size=1000000):
+        self.close()
+        temporary_file = self.__filename + '.tmp'
+        if os.path.isfile(temporary_file):
+            os.remove(temporary_file)
+
+        connection = sqlite3.connect(temporary_file)
+        try:
+            for statement in self.__schema:
+                connection.execute(statement)
+
+            presentations = {}
+            cells = {}
+            row_count = 0
+            skipped_row_count = 0
+
+            for row in rows:
+                if row is None or row[4] is None or row[5] is None or row[6] is None:
+                    skipped_row_count += 1
+                    continue
+
+                practice, bnf_code, bnf_name, period, items, nic, act_cost = row
+                presentation = (bnf_code.strip(), bnf_name.strip())
+                presentation_id = presentations.get(presentation)
+                if presentation_id is None:
+                    presentation_id = presentations[presentation] = len(presentations)
+
+                key = (practice.strip(), presentation_id, period.strip())
+                cell = cells.get(key)
+                if cell is None:
+                    cell = cells[key] = [0, 0, 0, 0, 0, 0]
+                cell[0] += 1
+                cell[1] += items
+                cell[2] += nic
+                cell[3] += act_cost
+                if items:
+                    cell[4] += 1
+                    cell[5] += PriceByRegionAggregator.get_price_per_item(act_cost, items)
+
+                row_count += 1
+                if len(cells) == block_size:
+                    self.__flush(connection, cells)
+
+            self.__flush(connection, cells)
+            connection.executemany('INSERT INTO presentations VALUES (?, ?, ?)',
+                                   [(presentation_id, bnf_code, bnf_name)
+                                    for (bnf_code, bnf_name), presentation_id in presentations.items()])
+            connection.executemany('INSERT INTO metadata VALUES (?, ?)',
+                                   [('source', json.dumps(source_signature)), ('row_count', json.dumps(row_count)),
+                                    ('skipped_row_count', json.dumps(skipped_row_count))])
+            connection.commit()
+        finally:
+            connection.close()
+
+        os.replace(temporary_file, self.__filename)
+        self.__categorised = False
+
+    def __flush(self, connection, cells):
+        connection.executemany(self.__upsert, [key + tuple(cell) for key, cell in cells.items()])
+        cells.clear()
+
+    """ Joins every practice in the cube to its postcode and region, None for whichever is not known
+    """
+    def set_practice_lookups(self, postcode_lookup, region_lookup):
+        connection = self.__connect()
+        practices = []
+
+        for practice, in connection.execute('SELECT DISTINCT practice FROM cells'):
+            postcode = postcode_lookup(practice)
+            try:
+                region = region_lookup(postcode) if postcode is not None and region_lookup is not None else None
+            except KeyError:
+                region = None
+            practices.append((practice, postcode, region))
+
+        with connection:
+            connection.execute('DELETE FROM practices')
+            connection.executemany('INSERT INTO practices VALUES (?, ?, ?)', practices)
+
+    def set_practice_dimension(self, practice_dimension):
+        self.set_practice_lookups(practice_dimension.get_postcode_for_practice,
+                                  practice_dimension.get_region_from_postcode)
+
+    """ Classifies every presentation in the cube with a DrugCatalogue, the catalogue shipped with the package unless
+        one is set before the first question about a drug category
+    """
+    def set_drug_catalogue(self, drug_catalogue):
+        connection = self.__connect()
+        categories = []
+
+        for presentation_id, bnf_code, bnf_name in connection.execute('SELECT * FROM presentations'):
+            for category in drug_catalogue.classify(bnf_name, bnf_code):
+                categories.append((category, presentation_id))
+
+        with connection:
+            connection.execute('DELETE FROM categories')
+            connection.executemany('INSERT INTO categories VALUES (?, ?)', categories)
+        self.__categorised = True
+
+    def __categorise(self):
+        if not self.__categorised:
+            self.set_drug_catalogue(DrugCatalogue.load())
+
+    """ Runs any SQL over the cube, for questions without a method of their own
+    """
+    def query(self, sql, parameters=()):
+        return self.__connect().execute(sql, parameters).fetchall()
+
+    def get_periods(self):
+        return [period for period, in self.query('SELECT DISTINCT period FROM cells ORDER BY period')]
+
+    """ Q2. Average cost of a prescription of a drug category
+    """
+    def get_average_cost(self, category='peppermint_oil'):
+        self.__categorise()
+        total, count = self.query('SELECT SUM(act_cost), SUM(rows) FROM cells JOIN categories USING (presentation_id) '
+                                  'WHERE category = ?', (category,))[0]
+        if not count or not total:
+            raise ValueError('Prescription information is not populated!')
+        return PriceByRegionAggregator.average_in_pounds(total, count)
+
+    """ Total actual spend in pence by practice postcode, 'UNKNOWN' for practices without one
+    """
+    def get_spend_by_postcode(self):
+        return dict(self.query("SELECT COALESCE(postcode, 'UNKNOWN'), SUM(act_cost) FROM cells "
+                               "LEFT JOIN practices USING (practice) GROUP BY 1"))
+
+    """ Q3. Top n postcodes by total actual spend in pounds, largest first
+    """
+    def get_top_spenders(self, n=5):
+        top_spenders = self.query("SELECT COALESCE(postcode, 'UNKNOWN') AS postcode, SUM(act_cost) AS spend "
+                                  "FROM cells LEFT JOIN practices USING (practice) GROUP BY 1 "
+                                  "ORDER BY spend DESC LIMIT ?", (n,))
+        if len(top_spenders) == 0:
+            return None
+        return [(postcode, spend / 100) for postcode, spend in top_spenders]
+
+    """ Q4. Average price per item of a drug category by region, starting with regions, 'UNKNOWN' for practices without
+        a region
+    """
+    def get_average_price_by_region(self, category='flucloxacillin', regions=()):
+        self.__categorise()
+        price_by_region = {region: 0.0 for region in regions}
+
+        for region, price, count in self.query("SELECT COALESCE(region, 'UNKNOWN'), SUM(price), SUM(priced_rows) "
+                                               "FROM cells JOIN categories USING (presentation_id) "
+                                               "LEFT JOIN practices USING (practice) "
+                                               "WHERE category = ? AND priced_rows > 0 GROUP BY 1", (category,)):
+            price_by_region[region] = PriceByRegionAggregator.get_average_price(price, count)
+
+        if 'UNKNOWN' in price_by_region:
+            price_by_region['UNKNOWN'] = price_by_region.pop('UNKNOWN')
+        return price_by_region
+
+    """ National average price per item of a drug category
+    """
+    def get_cost_per_prescription(self, category='flucloxacillin'):
+        self.__categorise()
+        price, count = self.query('SELECT SUM(price), SUM(priced_rows) FROM cells '
+                                  'JOIN categories USING (presentation_id) WHERE category = ?', (category,))[0]
+        if not count:
+            raise ValueError('cost_per_prescription information is not populated')
+        return PriceByRegionAggregator.get_average_price(price, count)
+
+    """ Q5. Number of items of a drug category by region, starting with regions, practices without a region left out
+    """
+    def get_item_count_by_region(self, category='antidepressant', regions=()):
+        self.__categorise()
+        count_by_region = {region: 0 for region in regions}
+
+        for region, items in self.query('SELECT region, SUM(items) FROM cells JOIN categories USING (presentation_id) '
+                                        'JOIN practices USING (practice) '
+                                        'WHERE category = ? AND region IS NOT NULL GROUP BY 1', (category,)):
+            count_by_region[region] = items
+        return count_by_region
+
+    """ Items and spend in pounds of every BNF code at a level, 'chapter', 'section', 'paragraph' or 'chemical',
+        optionally only those under a higher-level prefix, as {code: (items, spend)}
+    """
+    def get_bnf_totals(self, level, prefix=''):
+        length = BnfHierarchyAggregator.get_level_length(level)
+        return {code: (items, spend / 100)
+                for code, items, spend in self.query('SELECT substr(bnf_code, 1, ?) AS code, SUM(items), SUM(act_cost) '
+                                                     'FROM cells JOIN presentations USING (presentation_id) '
+                                                     'WHERE length(bnf_code) >= ? AND substr(bnf_code, 1, ?) = ? '
+                                                     'GROUP BY code', (length, length, len(prefix), prefix))}
+
+    """ Items and spend in pounds by region of one BNF code prefix, 'UNKNOWN' for practices without a region
+    """
+    def get_bnf_totals_by_region(self, prefix):
+        BnfHierarchyAggregator.check_prefix(prefix)
+        return {region: (items, spend / 100)
+                for region, items, spend in self.query("SELECT COALESCE(region, 'UNKNOWN'), SUM(items), SUM(act_cost) "
+                                                       "FROM cells JOIN presentations USING (presentation_id) "
+                                                       "LEFT JOIN practices USING (practice) "
+                                                       "WHERE substr(bnf_code, 1, ?) = ? GROUP BY 1",
+                                                       (len(prefix), prefix))}
@@ -0,0 +1,68 @@
+from abc import ABCMeta, abstractmethod
+
+""" Aggregator abstract class
+    Answers one question over the prescriptions as PrescriptionFileReader streams through them.
+    Every row is decoded and resolved once into a PrescriptionRecord, which is then handed to all registered
+    aggregators, so adding a question adds no parsing or lookup cost.
+"""
+
+
+class Aggregator(metaclass=ABCMeta):
+    """ Called with the region names once they are known, for aggregators that keep per-region totals
+    """
+    def set_regions(self, regions):
+        pass
+
+    """ Substrings at least one of which every raw line this aggregator counts contains, given the drug catalogue.
+        PrescriptionFileReader pushes them down to the reader, so other lines are skipped before they are split.
+        None, the default, means the aggregator needs every row.
+    """
+    def get_row_filter(self, drug_catalogue):
+        return None
+
+    """ Names of the PrescriptionRecord fields update reads, such as {'practice', 'act_cost'}. PrescriptionFileReader
+        only decodes the fields some registered aggregator reads and leaves the others None. 'categories' implies
+        the BNF NAME and BNF CODE columns are read, and get_postcode and get_region need 'practice'.
+        None, the default, means the aggregator reads every field.
+    """
+    def get_record_fields(self):
+        return None
+
+    """ Called with the index of each block of the file before its rows, when only a sample of the blocks is read
+    """
+    def start_block(self, block):
+        pass
+
+    """ The aggregator as it is pickled into a checkpoint, or taken back from one. An aggregator whose state refers to
+        files it may later delete returns a copy with files of its own inside directory, or inside its default
+        location when directory is None, so the checkpoint and the running aggregator do not share any.
+    """
+    def detach(self, directory=None):
+        return self
+
+    """ Called with a PrescriptionBatch when rows are processed a block at a time
+    """
+    def update_batch(self, batch):
+        raise NotImplementedError(type(self).__name__ + ' does not support batch processing.')
+
+    """ Average in pounds of a total in pence, or in 1/scale pence, over count, rounded half to even to whole pence
+        like round(). The exact ratio of the integers is rounded, so a half penny is never decided by float drift.
+    """
+    @staticmethod
+    def average_in_pounds(total, count, scale=1):
+        pence, remainder = divmod(total, count * scale)
+        if 2 * remainder > count * scale or (2 * remainder == count * scale and pence % 2 == 1):
+            pence += 1
+        return pence / 100
+
+    """ Methods to be over-ridden by concrete classes
+    """
+    @abstractmethod
+    def update(self, record):
+        pass
+
+    """ Folds in the state of the same aggregator run over a later part of the file
+    """
+    @abstractmethod
+    def merge(self, other):
+        pass
@@ -0,0 +1,172 @@
+from array import array
+import json
+import mmap
+import os
+
+""" ColumnarCache class
+    Stores the rows of a CSV as one binary file per column, which are read back through memory mapping.
+    String columns are dictionary-encoded: each distinct value is stored once and rows keep an integer code.
+    Numeric columns are stored as packed machine integers or doubles.
+    The cache remembers the size and modification time of its source and is stale once either changes.
+    Attributes: directory - The directory holding the column files and the metadata
+"""
+
+
+class ColumnarCache:
+    __metadata_file = 'metadata.json'
+    __code_type = 'I'
+
+    def __init__(self, directory):
+        self.__directory = directory
+
+    def get_directory(self):
+        return self.__directory
+
+    def __get_metadata(self):
+        path = os.path.join(self.__directory, self.__metadata_file)
+        if not os.path.isfile(path):
+            return None
+
+        with open(path, 'rt') as f:
+            return json.load(f)
+
+    """ True if the cache was built from a source with the given signature, and with the given numeric column types
+        when they are passed
+    """
+    def is_valid(self, source_signature, numeric_columns=None):
+        metadata = self.__get_metadata()
+        if metadata is None or metadata['source'] != source_signature:
+            return False
+        if numeric_columns is None:
+            return True
+
+        types = dict(zip(metadata['columns'], metadata['types']))
+        return all(types.get(column) == type_code for column, type_code in numeric_columns.items())
+
+    def get_row_count(self):
+        metadata = self.__get_metadata()
+        if metadata is None:
+            raise ValueError('The columnar cache in ' + self.__directory + ' has not been built.')
+        return metadata['row_count']
+
+    def get_skipped_row_count(self):
+        metadata = self.__get_metadata()
+        if metadata is None:
+            raise ValueError('The columnar cache in ' + self.__directory + ' has not been built.')
+        return metadata['skipped_row_count']
+
+    """ Converts the rows of a CSV, given as an open text file or any iterable of lines, into column files.
+        columns lists the column names in file order, numeric_columns maps a column name to its array type code.
+        converters optionally maps a numeric column name to a function that returns None for an unparseable field.
+        Rows with the wrong number of fields or unparseable numbers are skipped and counted.
+    """
+    def build(self, lines, columns, numeric_columns, source_signature, skip_header, converters=None):
+        dictionaries = [{} if column not in numeric_columns else None for column in columns]
+        arrays = [array(numeric_columns.get(column, self.__code_type)) for column in columns]
+        converters = [(converters or {}).get(column) or self.__converter(numeric_columns.get(column))
+                      for column in columns]
+        row_count = 0
+        skipped_row_count = 0
+
+        lines = iter(lines)
+        if skip_header:
+            next(lines, None)
+
+        for line in lines:
+            fields = line.rstrip('\n').split(',')
+            if len(fields) != len(columns):
+                skipped_row_count += 1
+                continue
+
+            try:
+                values = [converter(field) for converter, field in zip(converters, fields)]
+            except ValueError:
+                skipped_row_count += 1
+                continue
+            if None in values:
+                skipped_row_count += 1
+                continue
+
+            for dictionary, column_array, value in zip(dictionaries, arrays, values):
+                if dictionary is not None:
+                    value = dictionary.setdefault(value, len(dictionary))
+                column_array.append(value)
+
+            row_count += 1
+
+        os.makedirs(self.__directory, exist_ok=True)
+
+        for index, column_array in enumerate(arrays):
+            with open(self.__column_file(index), 'wb') as f:
+                column_array.tofile(f)
+
+        metadata = {'source': source_signature, 'columns': columns, 'row_count': row_count,
+                    'skipped_row_count': skipped_row_count,
+                    'types': [column_array.typecode for column_array in arrays],
+                    'dictionaries': [list(dictionary) if dictionary is not None else None
+                                     for dictionary in dictionaries]}
+
+        with open(os.path.join(self.__directory, self.__metadata_file), 'wt') as f:
+            json.dump(metadata, f)
+
+    """ Distinct values of every dictionary-encoded column, which its codes index, and None for numeric columns
+    """
+    def get_dictionaries(self):
+        metadata = self.__get_metadata()
+        if metadata is None:
+            raise ValueError('The columnar cache in ' + self.__directory + ' has not been built.')
+        return dict(zip(metadata['columns'], metadata['dictionaries']))
+
+    """ Yields the cached rows block_size at a time, as one array per column ordered like the source columns.
+        String columns hold the codes of their values, numeric columns the numbers. Each array is copied out of the
+        memory-mapped column file, so it stays valid after the read and can be wrapped by numpy.frombuffer.
+    """
+    def read_columns(self, block_size=1 << 16):
+        metadata = self.__get_metadata()
+        if metadata is None:
+            raise ValueError('The columnar cache in ' + self.__directory + ' has not been built.')
+        if metadata['row_count'] == 0:
+            return
+
+        files = [open(self.__column_file(index), 'rb') for index in range(len(metadata['columns']))]
+        maps = [mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) for f in files]
+        views = [memoryview(column_map) for column_map in maps]
+        item_sizes = [array(type_code).itemsize for type_code in metadata['types']]
+
+        try:
+            for start in range(0, metadata['row_count'], block_size):
+                columns = []
+                for view, type_code, item_size in zip(views, metadata['types'], item_sizes):
+                    column = array(type_code)
+                    column.frombytes(view[start * item_size:(start + block_size) * item_size])
+                    columns.append(column)
+                yield columns
+        finally:
+            for view in views:
+                view.release()
+            for column_map, f in zip(maps, files):
+                column_map.close()
+                f.close()
+
+    """ Yields every cached row as a tuple ordered like the source columns, with the values of string columns looked
+        up in their dictionaries. Rows are decoded a block at a time, a column at a time, through map.
+    """
+    def read_rows(self, block_size=1 << 16):
+        dictionaries = list(self.get_dictionaries().values())
+
+        for columns in self.read_columns(block_size):
+            columns = [column.tolist() if dictionary is None else map(dictionary.__getitem__, column)
+                       for dictionary, column in zip(dictionaries, columns)]
+            yield from zip(*columns)
+
+    def __column_file(self, index):
+        return os.path.join(self.__directory, 'column_' + str(index) + '.bin')
+
+    @staticmethod
+    def __converter(type_code):
+        if type_code is None:
+            return str
+        elif type_code in 'dfe':
+            return float
+        else:
+            return int
@@ -0,0 +1,68 @@
+from array import array
+from hashlib import blake2b
+import math
+
+""" CountMinSketch class
+    Estimates the total added for each key in a fixed width x depth table of counters, however many keys there are.
+    An estimate is never below the true total, and exceeds it by at most e / width of the grand total with probability
+    1 - e ** -depth. Keys are hashed once with BLAKE2b and the depth columns derived by double hashing, so sketches
+    built in different processes can be merged.
+    Attributes: width - Number of counters per row
+                depth - Number of rows
+"""
+
+
+class CountMinSketch:
+    def __init__(self, width=1 << 16, depth=4):
+        if width < 1 or depth < 1:
+            raise ValueError('width and depth must be at least 1.')
+
+        self.__width = width
+        self.__depth = depth
+        self.__counters = [array('q', bytes(8 * width)) for row in range(depth)]
+        self.__total = 0
+
+    def get_width(self):
+        return self.__width
+
+    def get_depth(self):
+        return self.__depth
+
+    def get_total(self):
+        return self.__total
+
+    """ Amount by which any estimate exceeds the true total, with probability 1 - e ** -depth
+    """
+    def get_error_bound(self):
+        return math.e / self.__width * self.__total
+
+    def __columns(self, key):
+        digest = blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'big')
+        second = int.from_bytes(digest[8:], 'big') | 1
+        return [(first + row * second) % self.__width for row in range(self.__depth)]
+
+    """ Adds count to key and returns the new estimate of its total
+    """
+    def add(self, key, count=1):
+        estimate = None
+        for counters, column in zip(self.__counters, self.__columns(key)):
+            counters[column] += count
+            if estimate is None or counters[column] < estimate:
+                estimate = counters[column]
+
+        self.__total += count
+        return estimate
+
+    def estimate(self, key):
+        return min(counters[column] for counters, column in zip(self.__counters, self.__columns(key)))
+
+    def merge(self, other):
+        if other.__width != self.__width or other.__depth != self.__depth:
+            raise ValueError('Only sketches of the same width and depth can be merged.')
+
+        for counters, other_counters in zip(self.__counters, other.__counters):
+            for column, count in enumerate(other_counters):
+                if count:
+                    counters[column] += count
+        self.__total += other.__total
@@ -0,0 +1,139 @@
+from collections import deque
+import json
+import os
+
+""" DrugCatalogue class
+    Classifies prescriptions into drug categories, as configured in a JSON catalogue such as drug_catalogue.json.
+    Each category lists BNF names, matched against the stripped BNF NAME either exactly, as a prefix or anywhere
+    in the name, and optionally BNF code prefixes, matched against the BNF CODE.
+    All names are compiled into a single Aho-Corasick automaton, so a BNF NAME is scanned once for every category.
+    Results are memoised per distinct BNF NAME and BNF CODE, so classifying a row is a dictionary hit.
+    Attributes: catalogue - Dictionary of category name to {'names': [...], 'match': 'exact' | 'prefix' | 'contains',
+                                                             'bnf_code_prefixes': [...]}
+"""
+
+
+class DrugCatalogue:
+    __default_catalogue_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'drug_catalogue.json')
+    __match_types = ('exact', 'prefix', 'contains')
+
+    def __init__(self, catalogue):
+        self.__categories = list(catalogue.keys())
+        self.__patterns = []
+        self.__code_prefixes = {}
+
+        for category, definition in catalogue.items():
+            match_type = definition.get('match', 'exact')
+            if match_type not in self.__match_types:
+                raise ValueError('Unknown match type ' + match_type + ' for category ' + category + '.')
+
+            for name in definition.get('names', []):
+                self.__patterns.append((name.strip(), category, match_type))
+            for prefix in definition.get('bnf_code_prefixes', []):
+                self.__code_prefixes.setdefault(prefix, set()).add(category)
+
+        self.__code_prefix_lengths = sorted(set(len(prefix) for prefix in self.__code_prefixes))
+        self.__build_automaton()
+
+        self.__name_categories = {}
+        self.__code_categories = {}
+
+    """ Loads a catalogue from a JSON file, the catalogue shipped with the package by default
+    """
+    @staticmethod
+    def load(filename=None):
+        with open(filename or DrugCatalogue.__default_catalogue_file, 'rt') as f:
+            return DrugCatalogue(json.load(f))
+
+    def get_categories(self):
+        return self.__categories
+
+    """ Substrings of the raw CSV line, one of which is in every row of the category: its names, and its BNF code
+        prefixes preceded by the delimiter. An empty tuple for a category that is not in the catalogue.
+    """
+    def get_substrings(self, category):
+        substrings = [name for name, name_category, match_type in self.__patterns if name_category == category]
+        substrings.extend(',' + prefix for prefix, categories in self.__code_prefixes.items() if category in categories)
+        return tuple(substrings)
+
+    """ Builds the goto, failure and output functions of an Aho-Corasick automaton over all names
+    """
+    def __build_automaton(self):
+        self.__goto = [{}]
+        self.__outputs = [[]]
+
+        for index, (name, category, match_type) in enumerate(self.__patterns):
+            state = 0
+            for character in name:
+                next_state = self.__goto[state].get(character)
+                if next_state is None:
+                    next_state = len(self.__goto)
+                    self.__goto[state][character] = next_state
+                    self.__goto.append({})
+                    self.__outputs.append([])
+                state = next_state
+            self.__outputs[state].append(index)
+
+        self.__failure = [0] * len(self.__goto)
+        queue = deque(self.__goto[0].values())
+
+        while queue:
+            state = queue.popleft()
+            for character, next_state in self.__goto[state].items():
+                queue.append(next_state)
+                failure = self.__failure[state]
+                while failure and character not in self.__goto[failure]:
+                    failure = self.__failure[failure]
+                self.__failure[next_state] = self.__goto[failure].get(character, 0)
+                self.__outputs[next_state] = self.__outputs[next_state] + self.__outputs[self.__failure[next_state]]
+
+    """ Categories of a BNF NAME, scanning the stripped name once through the automaton
+    """
+    def classify_name(self, bnf_name):
+        categories = self.__name_categories.get(bnf_name)
+        if categories is not None:
+            return categories
+
+        name = bnf_name.strip()
+        matches = set()
+        state = 0
+
+        for end, character in enumerate(name):
+            while state and character not in self.__goto[state]:
+                state = self.__failure[state]
+            state = self.__goto[state].get(character, 0)
+
+            for index in self.__outputs[state]:
+                pattern, category, match_type = self.__patterns[index]
+                start = end - len(pattern) + 1
+                if match_type == 'contains' or (start == 0 and (match_type == 'prefix' or end == len(name) - 1)):
+                    matches.add(category)
+
+        categories = frozenset(matches)
+        self.__name_categories[bnf_name] = categories
+        return categories
+
+    """ Categories of a BNF CODE, from the configured code prefixes
+    """
+    def classify_code(self, bnf_code):
+        categories = self.__code_categories.get(bnf_code)
+        if categories is not None:
+            return categories
+
+        code = bnf_code.strip()
+        matches = set()
+        for length in self.__code_prefix_lengths:
+            matches.update(self.__code_prefixes.get(code[:length], ()))
+
+        categories = frozenset(matches)
+        self.__code_categories[bnf_code] = categories
+        return categories
+
+    def classify(self, bnf_name, bnf_code=None):
+        if not self.__code_prefixes or bnf_code is None:
+            return self.classify_name(bnf_name)
+
+        return self.classify_name(bnf_name) | self.classify_code(bnf_code)
+
+    def uses_bnf_codes(self):
+        return len(self.__code_prefixes) != 0
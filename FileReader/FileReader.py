@@ -1,11 +1,20 @@
 from abc import ABCMeta, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+import codecs
 import csv
+import io
+import locale
+import mmap
 import os.path
+import random
+from FileReader.MappedRow import MappedRow
+from FileReader.ThreadedDecompressor import ThreadedDecompressor
 
 """ FileReader abstract class
     Contains various methods to read the contents of a file
     Implements the Iterator interface
-    Attributes: filename - Fully qualified path to the source CSV file
+    .gz, .bz2 and .xz files are decompressed on the fly, in a background thread
+    Attributes: filename - Fully qualified path to the source CSV file, optionally compressed
                 header   - The column names for the CSV
 """
 
@@ -16,21 +25,63 @@ class FileReader(metaclass=ABCMeta):
             raise FileNotFoundError('The file ' + filename + ' does not exist.')
 
         self.__filename = filename
+        self.__compression = ThreadedDecompressor.detect(filename)
         self.__filter_expression = None
+        self.__filter_expressions = None
         self.__line_count = 0
         self.__iteration_methods = {'lazy_read': self.__lazy_read, 'chunky_lazy_read': self.__chunky_lazy_read,
-                                    'lazy_sequential_read': self.__lazy_sequential_read}
+                                    'lazy_sequential_read': self.__lazy_sequential_read,
+                                    'parallel_read': self.__parallel_read, 'batch_read': self.__batch_read,
+                                    'projected_read': self.__projected_read, 'mmap_read': self.__mmap_read,
+                                    'sampled_read': self.__sampled_read}
         self.__iteration_method = None
+        self.__shard_iteration_method = 'lazy_sequential_read'
+        self.__worker_count = os.cpu_count() or 1
+        self.__byte_range = None
+        self.__batch_size = 100000
+        self.__projection = None
+        self.__sample = None
+        self.__encoding = locale.getpreferredencoding(False)
         self.__header = header
         self.column_to_index = None
         self.__line_width = 0
+        self.__chunk_size = 1 << 20
         self.__output_file = 'output.txt'
 
         self.populate_csv_header(header)
 
+    def set_output_file(self, output_file):
+        self.__output_file = output_file
+
     def get_output_file(self):
         return self.__output_file
 
+    """ Bound private methods cannot be pickled, so the iteration methods are stored by attribute name.
+        This lets readers be shipped to and from worker processes.
+    """
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_FileReader__iteration_methods'] = {name: self.__attribute_name(method)
+                                                   for name, method in self.__iteration_methods.items()}
+        if self.__iteration_method is not None:
+            state['_FileReader__iteration_method'] = self.__attribute_name(self.__iteration_method)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__iteration_methods = {name: getattr(self, attribute)
+                                    for name, attribute in self.__iteration_methods.items()}
+        if self.__iteration_method is not None:
+            self.__iteration_method = getattr(self, self.__iteration_method)
+
+    @staticmethod
+    def __attribute_name(method):
+        name = method.__func__.__name__
+        if name.startswith('__') and not name.endswith('__'):
+            class_name = method.__func__.__qualname__.split('.')[-2]
+            name = '_' + class_name.lstrip('_') + name
+        return name
+
     """ Allows iteration over a FileReader object
     """
     def __iter__(self):
@@ -45,24 +96,173 @@ class FileReader(metaclass=ABCMeta):
     def get_iteration_methods(self):
         return self.__iteration_methods
 
+    """ Selects the iteration method each worker uses on its byte range when parallel_read is active
+    """
+    def set_shard_iteration_method(self, iteration_method):
+        if iteration_method not in ('lazy_read', 'chunky_lazy_read', 'lazy_sequential_read', 'projected_read',
+                                    'mmap_read'):
+            raise ValueError(iteration_method + ' cannot be used to read a byte range.')
+
+        self.__shard_iteration_method = iteration_method
+
+    def get_shard_iteration_method(self):
+        return self.__shard_iteration_method
+
+    def set_worker_count(self, worker_count):
+        if worker_count < 1:
+            raise ValueError('worker_count must be at least 1.')
+
+        self.__worker_count = worker_count
+
+    def get_worker_count(self):
+        return self.__worker_count
+
+    def set_batch_size(self, batch_size):
+        if batch_size < 1:
+            raise ValueError('batch_size must be at least 1.')
+
+        self.__batch_size = batch_size
+
+    def get_batch_size(self):
+        return self.__batch_size
+
+    """ Declares the columns projected_read should return, in the order they are wanted
+    """
+    def set_projection(self, columns):
+        for column in columns:
+            self.get_column_index(column)
+
+        self.__projection = tuple(columns)
+
+    def get_projection(self):
+        return self.__projection
+
+    def get_filename(self):
+        return self.__filename
+
+    """ 'gzip', 'bz2' or 'xz' for a compressed file, None for a plain one
+    """
+    def get_compression(self):
+        return self.__compression
+
+    """ Opens the file positioned offset bytes into its uncompressed content.
+        Compressed files are decompressed in a background thread, so skipping to an offset means decompressing up to it.
+    """
+    def open_file(self, mode='rb', offset=0):
+        if self.__compression is None:
+            f = open(self.__filename, mode)
+            if offset:
+                f.seek(offset)
+            return f
+
+        f = io.BufferedReader(ThreadedDecompressor(self.__filename, self.__compression), 1 << 16)
+        while offset > 0:
+            skipped = len(f.read(min(offset, self.__chunk_size)))
+            if skipped == 0:
+                break
+            offset -= skipped
+
+        return f if 'b' in mode else io.TextIOWrapper(f, encoding=self.__encoding)
+
+    """ Identifies the current contents of the source file by its size and modification time
+    """
+    def get_source_signature(self):
+        status = os.stat(self.__filename)
+        return {'size': status.st_size, 'mtime_ns': status.st_mtime_ns}
+
+    def get_header(self):
+        return self.__header
+
+    def increment_line_count(self, count=1):
+        self.__line_count += count
+
+    """ Skips every row that contains none of the filter expressions before it is split, in chunky_lazy_read,
+        lazy_sequential_read, batch_read and mmap_read. filter_expression is a string, a list of strings any of which
+        may match, or None to read every row. Skipped rows are still counted in the line count.
+    """
     def set_filter(self, filter_expression):
         self.__filter_expression = filter_expression
+        if filter_expression is None:
+            self.__filter_expressions = None
+        elif isinstance(filter_expression, str):
+            self.__filter_expressions = (filter_expression,)
+        else:
+            self.__filter_expressions = tuple(filter_expression)
 
     def get_filter(self):
         return self.__filter_expression
 
+    """ The filter as a tuple of expressions, None when every row is read
+    """
+    def get_filter_expressions(self):
+        return self.__filter_expressions
+
+    """ Whether text contains any of the expressions, works on str and bytes alike
+    """
+    @staticmethod
+    def contains_any(text, expressions):
+        for expression in expressions:
+            if expression in text:
+                return True
+        return False
+
+    """ Makes sampled_read read a random fraction of the blocks of block_size bytes the file is divided into.
+        The same seed always picks the same blocks.
+    """
+    def set_sample(self, fraction, block_size=1 << 20, seed=0):
+        if not 0 < fraction <= 1:
+            raise ValueError('fraction must be greater than 0 and at most 1.')
+        if block_size < 1:
+            raise ValueError('block_size must be at least 1 byte.')
+
+        self.__sample = (fraction, block_size, seed)
+
+    def get_sample(self):
+        return self.__sample
+
+    """ Number of blocks the file is divided into for sampling
+    """
+    def get_block_count(self):
+        if self.__sample is None:
+            raise ValueError('set_sample must be called before the file is divided into blocks.')
+        return -(-os.path.getsize(self.__filename) // self.__sample[1])
+
+    """ Indices of the blocks sampled_read reads, in file order, at least one block of a non-empty file
+    """
+    def get_sampled_blocks(self):
+        block_count = self.get_block_count()
+        fraction, block_size, seed = self.__sample
+        sampled_count = min(block_count, max(1, round(fraction * block_count))) if block_count else 0
+        return sorted(random.Random(seed).sample(range(block_count), sampled_count))
+
+    """ Called by sampled_read before the rows of each sampled block, for subclasses that estimate across blocks
+    """
+    def start_block(self, block):
+        pass
+
     def get_line_count(self):
         return self.__line_count
 
     def get_line_width(self):
         return self.__line_width
 
+    """ Number of bytes chunky_lazy_read reads at a time
+    """
+    def set_chunk_size(self, chunk_size):
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be at least 1.')
+
+        self.__chunk_size = chunk_size
+
+    def get_chunk_size(self):
+        return self.__chunk_size
+
     """ Reads the first line of the CSV assuming it contains the header fields
         Populates a dictionary with fields as keys and integer indices as values
     """
     def populate_csv_header(self, header):
         if header is None:
-            with open(self.__filename, "rt") as f:
+            with self.open_file('rt') as f:
                 column_list = [h.strip() for h in f.__next__().split(',')]
                 self.column_to_index = dict(zip(column_list, [x for x in range(len(column_list))]))
         else:
@@ -76,59 +276,366 @@ class FileReader(metaclass=ABCMeta):
     def get_csv_header(self):
         return self.column_to_index.keys()
 
+    """ Splits the file into count byte ranges, each one ending just after a newline.
+        Returns a list of (start, end) tuples that cover the whole file without overlapping.
+        Compressed files cannot be split without decompressing them, so they raise a ValueError.
+    """
+    def get_byte_ranges(self, count):
+        if self.__compression is not None:
+            raise ValueError('Byte ranges are not available for ' + self.__compression + ' compressed files.')
+
+        file_size = os.path.getsize(self.__filename)
+        boundaries = [0]
+
+        with open(self.__filename, 'rb') as f:
+            for i in range(1, count):
+                f.seek(max(file_size * i // count, boundaries[-1]))
+                f.readline()
+                boundaries.append(f.tell())
+
+        boundaries.append(file_size)
+
+        return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if start < end]
+
+    """ Yields the lines of the file, restricted to the current byte range when one is set
+    """
+    def __read_lines(self):
+        if self.__byte_range is None:
+            with self.open_file('rt') as f:
+                for line in f:
+                    yield line
+        else:
+            start, end = self.__byte_range
+            with self.open_file('rb', start) as f:
+                position = start
+                for line in f:
+                    if position >= end:
+                        break
+                    position += len(line)
+                    yield line.decode(self.__encoding)
+
+    """ Yields decoded blocks of up to block_size bytes, restricted to the current byte range when one is set
+    """
+    def __read_blocks(self, block_size):
+        decoder = codecs.getincrementaldecoder(self.__encoding)()
+        start, end = self.__byte_range if self.__byte_range is not None else (0, None)
+
+        with self.open_file('rb', start) as f:
+            remaining = None if end is None else end - start
+            while True:
+                block = f.read(block_size if remaining is None else min(block_size, remaining))
+                if not block:
+                    break
+                if remaining is not None:
+                    remaining -= len(block)
+                yield decoder.decode(block)
+
+            tail = decoder.decode(b'', final=True)
+            if tail:
+                yield tail
+
+    """ Parses the header line with the csv module, keeping the field names exactly as DictReader would
+    """
+    def __get_fieldnames(self):
+        if self.__header is not None:
+            return self.__header
+
+        with self.open_file('rt') as f:
+            return next(csv.reader(f, delimiter=','))
+
     """ Use this method with CSVs that have a well-defined header as the first line.
         Returns each row of the file as a dictionary indexed by the header.
     """
     def __lazy_read(self):
-        with open(self.__filename, "rt") as f:
-            reader = csv.DictReader(f, fieldnames=self.__header, delimiter=',')
+        if self.__byte_range is None or self.__byte_range[0] == 0:
+            fieldnames = self.__header
+        else:
+            fieldnames = self.__get_fieldnames()
 
-            for row in reader:
-                self.__line_count += 1
-                yield row
+        reader = csv.DictReader(self.__read_lines(), fieldnames=fieldnames, delimiter=',')
+
+        for row in reader:
+            self.__line_count += 1
+            yield row
 
     def __set_line_width_for_chunks(self):
-        for line in open(self.__filename, 'rt'):
-            self.__line_width = len(line)
-            break
+        with self.open_file('rt') as f:
+            for line in f:
+                self.__line_width = len(line)
+                break
 
-    """ Reads a CSV multiple lines at a time, then returns each row as a list of items.
+    """ Reads a CSV chunk_size bytes at a time, then returns each row as a list of items.
+        A line cut off at the end of a chunk is carried over to the next one, so no row is ever split.
+        When a filter is set, chunks without the filter expression are skipped before any line is split,
+        and only the lines containing it are returned.
     """
-
     def __chunky_lazy_read(self):
-        with open(self.__filename, "rt") as f:
-            while True:
-                lines = f.read(self.__line_width * 15000)
-                if lines:
-                    lines_list = lines.split("\n")
-
-                    for line in lines_list:
-                        self.__line_count += 1
-                        if self.__filter_expression:
-                            if self.__filter_expression in line:
-                                yield line.split(',')
-                            else:
-                                continue
-                        else:
-                            if len(line) > 1:
-                                fields = line.split(',')
-                                if len(fields) is len(self.get_csv_header()):
-                                    yield fields
-                                else:
-                                    raise ValueError("The CSV contains ',' in one or more fields."
-                                                     " Please use the lazy_read method to correctly process this CSV.")
+        remainder = ''
 
-                else:
-                    break
+        for block in self.__read_blocks(self.__chunk_size):
+            lines = remainder + block
+            end = lines.rfind('\n')
+            if end == -1:
+                remainder = lines
+                continue
+
+            lines, remainder = lines[:end], lines[end + 1:]
+            self.__line_count += lines.count('\n') + 1
+
+            if self.__filter_expressions is not None and not self.contains_any(lines, self.__filter_expressions):
+                continue
+
+            for line in lines.split('\n'):
+                fields = self.__split_chunk_line(line)
+                if fields is not None:
+                    yield fields
+
+        if remainder:
+            self.__line_count += 1
+            fields = self.__split_chunk_line(remainder)
+            if fields is not None:
+                yield fields
+
+    def __split_chunk_line(self, line):
+        if len(line) <= 1:
+            return None
+        if self.__filter_expressions is not None and not self.contains_any(line, self.__filter_expressions):
+            return None
+
+        fields = line.split(',')
+        if len(fields) != len(self.column_to_index):
+            raise ValueError("The CSV contains ',' in one or more fields."
+                             " Please use the lazy_read method to correctly process this CSV.")
+        return fields
 
     """ Reads a file one line at a time.
-        Returns each row as a list of items.
+        Returns each row as a list of items, only splitting the lines that pass the filter when one is set.
     """
     def __lazy_sequential_read(self):
-        for line in open(self.__filename):
+        filter_expressions = self.__filter_expressions
+
+        for line in self.__read_lines():
             self.__line_count += 1
+            if filter_expressions is not None and not self.contains_any(line, filter_expressions):
+                continue
             yield line.split(',')
 
+    """ Reads the rows of a random sample of the blocks of the file, see set_sample, for approximate answers.
+        A row belongs to the block its line starts in, so every row is in exactly one block.
+        Returns each row as a list of items, like lazy_sequential_read. Needs an uncompressed file to seek in.
+    """
+    def __sampled_read(self):
+        if self.__sample is None:
+            raise ValueError('set_sample must be called before using sampled_read.')
+        if self.__compression is not None:
+            raise ValueError('sampled_read cannot seek in the compressed file ' + self.__filename + '.')
+
+        block_size = self.__sample[1]
+        filter_expressions = self.__filter_expressions
+
+        with open(self.__filename, 'rb') as f:
+            for block in self.get_sampled_blocks():
+                start = block * block_size
+                if start == 0:
+                    f.seek(0)
+                    position = len(f.readline()) if self.__header is None else 0
+                else:
+                    f.seek(start - 1)
+                    position = start - 1 + len(f.readline())
+
+                self.start_block(block)
+                while position < start + block_size:
+                    line = f.readline()
+                    if not line:
+                        break
+                    position += len(line)
+                    self.__line_count += 1
+
+                    line = line.decode(self.__encoding)
+                    if filter_expressions is not None and not self.contains_any(line, filter_expressions):
+                        continue
+                    yield line.split(',')
+
+    """ Use this method with wide CSVs when only a few columns are needed.
+        Parses each line with the csv module, so quoted fields are handled, and returns only the projected
+        columns as a tuple. The header line is skipped when the header comes from the file.
+    """
+    def __projected_read(self):
+        if self.__projection is None:
+            raise ValueError('set_projection must be called before using projected_read.')
+
+        indices = [self.get_column_index(column) for column in self.__projection]
+        reader = csv.reader(self.__read_lines(), delimiter=',')
+
+        if self.__header is None and (self.__byte_range is None or self.__byte_range[0] == 0):
+            next(reader, None)
+
+        for row in reader:
+            self.__line_count += 1
+            yield tuple([row[index] for index in indices])
+
+    """ Works on the memory-mapped file as bytes instead of decoding every line.
+        Returns each row as a MappedRow, which is only decoded once a field is indexed.
+        When a filter is set, the buffer is searched for the filter expressions and only the lines they occur in
+        are visited, the lines in between are just counted.
+    """
+    def __mmap_read(self):
+        if os.path.getsize(self.__filename) == 0:
+            return
+
+        start, end = self.__byte_range if self.__byte_range is not None else (0, None)
+
+        if self.__compression is not None:
+            yield from self.__compressed_mapped_rows(start, end)
+            return
+
+        with open(self.__filename, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            end = len(buffer) if end is None else end
+
+            try:
+                if self.__filter_expressions is not None:
+                    yield from self.__filtered_mapped_rows(buffer, start, end)
+                    return
+
+                while start < end:
+                    newline = buffer.find(b'\n', start, end)
+                    line_end = newline if newline != -1 else end
+                    self.__line_count += 1
+                    yield MappedRow(buffer, start, line_end, self.__encoding)
+                    start = line_end + 1
+            finally:
+                try:
+                    buffer.close()
+                except BufferError:
+                    pass
+
+    """ Yields the lines of buffer between start and end that contain a filter expression, finding the next
+        occurrence of every expression once and only searching again for those the read has moved past
+    """
+    def __filtered_mapped_rows(self, buffer, start, end):
+        expressions = [expression.encode(self.__encoding) for expression in self.__filter_expressions]
+        matches = [buffer.find(expression, start, end) for expression in expressions]
+
+        while True:
+            for index, expression in enumerate(expressions):
+                if start > matches[index] != -1:
+                    matches[index] = buffer.find(expression, start, end)
+
+            found = [match for match in matches if match != -1]
+            if not found:
+                self.__line_count += self.__count_lines(buffer, start, end)
+                return
+
+            match = min(found)
+            newline = buffer.rfind(b'\n', start, match)
+            line_start = newline + 1 if newline != -1 else start
+            newline = buffer.find(b'\n', match, end)
+            line_end = newline if newline != -1 else end
+
+            self.__line_count += self.__count_lines(buffer, start, line_start) + 1
+            yield MappedRow(buffer, line_start, line_end, self.__encoding)
+            start = line_end + 1
+
+    """ Number of lines between start and end, the last one possibly without a newline, counted in 16 MB slices
+    """
+    @staticmethod
+    def __count_lines(buffer, start, end):
+        count = 0 if start >= end or buffer[end - 1:end] == b'\n' else 1
+        while start < end:
+            stop = min(start + (1 << 24), end)
+            count += buffer[start:stop].count(b'\n')
+            start = stop
+        return count
+
+    """ A compressed file cannot be memory-mapped, so each decompressed line is wrapped in a MappedRow instead
+    """
+    def __compressed_mapped_rows(self, start, end):
+        expressions = None
+        if self.__filter_expressions is not None:
+            expressions = [expression.encode(self.__encoding) for expression in self.__filter_expressions]
+
+        with self.open_file('rb', start) as f:
+            for line in f:
+                if end is not None and start >= end:
+                    break
+                start += len(line)
+                self.__line_count += 1
+                if expressions is not None and not self.contains_any(line, expressions):
+                    continue
+                yield MappedRow(line, 0, len(line) - 1 if line.endswith(b'\n') else len(line), self.__encoding)
+
+    """ Reads the file like lazy_sequential_read, but yields lists of up to batch_size rows at a time.
+        Meant for readers that aggregate a whole block of rows at once.
+    """
+    def __batch_read(self):
+        filter_expressions = self.__filter_expressions
+        batch = []
+
+        for line in self.__read_lines():
+            self.__line_count += 1
+            if filter_expressions is not None and not self.contains_any(line, filter_expressions):
+                continue
+            batch.append(line.split(','))
+            if len(batch) == self.__batch_size:
+                yield batch
+                batch = []
+
+        if batch:
+            yield batch
+
+    """ Runs process_file over each byte range of the file in a pool of worker processes.
+        Every worker starts from a copy of this reader, so no rows should have been processed before.
+        The partial state of every worker is folded back into this reader through merge, in file order,
+        so iterating with this method yields no rows. A compressed file cannot be split, so it is processed here
+        in one piece with the shard iteration method.
+    """
+    def __parallel_read(self):
+        if self.__compression is not None:
+            self.process_byte_range(None)
+            return iter(())
+
+        byte_ranges = self.get_byte_ranges(self.__worker_count)
+
+        if len(byte_ranges) == 1:
+            self.process_byte_range(byte_ranges[0])
+        elif len(byte_ranges) > 1:
+            """ Tasks are pickled in the background, so nothing is merged until every worker has finished
+            """
+            with ProcessPoolExecutor(max_workers=len(byte_ranges)) as executor:
+                shards = list(executor.map(FileReader.process_byte_range, [self] * len(byte_ranges), byte_ranges))
+
+            for shard in shards:
+                self.merge(shard)
+
+        return iter(())
+
+    """ Processes the rows that start within byte_range with the shard iteration method.
+        Returns the reader itself, so it can be shipped back from a worker process and merged.
+    """
+    def process_byte_range(self, byte_range):
+        iteration_method = self.__iteration_method
+        self.__byte_range = byte_range
+        self.__iteration_method = self.__iteration_methods[self.__shard_iteration_method]
+
+        if self.__shard_iteration_method == 'chunky_lazy_read':
+            self.__set_line_width_for_chunks()
+
+        try:
+            for row in self:
+                self.process_file(row)
+        finally:
+            self.__byte_range = None
+            self.__iteration_method = iteration_method
+
+        return self
+
+    """ Folds the state of another reader over a later part of the same file into this one.
+        Concrete classes extend this with their own aggregates so that parallel_read matches a sequential read.
+    """
+    def merge(self, other):
+        self.__line_count += other.get_line_count()
+
     """ Methods to be over-ridden by concrete classes
     """
     @abstractmethod
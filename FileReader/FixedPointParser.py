@@ -0,0 +1,61 @@
+""" FixedPointParser class
+    Converts decimal fields such as ACT COST (00000069.92) or ITEMS (0000027) straight to integers scaled by
+    10 ** places, so 00000069.92 parses to 6992 pence with places=2, and sums of them are exact.
+    Fields are validated with string tests instead of by catching exceptions: anything that is not an optionally
+    signed decimal number parses to None. Digits beyond places are rounded half away from zero.
+    The zero-padded fields of the NHS extracts repeat a lot, so results are memoised per distinct field, up to
+    cache_size of them. Integers, such as the numbers read back from a columnar cache, are taken as already scaled.
+    Attributes: places     - Number of decimal places kept
+                cache_size - Maximum number of distinct fields memoised
+"""
+
+
+class FixedPointParser:
+    def __init__(self, places, cache_size=1 << 16):
+        if places < 0:
+            raise ValueError('places must not be negative.')
+
+        self.__places = places
+        self.__cache_size = cache_size
+        self.__cache = {}
+
+    """ The memoised values are dropped when a parser is pickled, a worker builds its own
+    """
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_FixedPointParser__cache'] = {}
+        return state
+
+    def get_places(self):
+        return self.__places
+
+    def parse(self, field):
+        value = self.__cache.get(field)
+        if value is None:
+            value = self.parse_uncached(field, self.__places)
+            if value is not None and len(self.__cache) < self.__cache_size:
+                self.__cache[field] = value
+        return value
+
+    @staticmethod
+    def parse_uncached(field, places):
+        if type(field) is int:
+            return field
+        if type(field) is not str:
+            return None
+
+        value = field.strip()
+        negative = value[:1] == '-'
+        if negative or value[:1] == '+':
+            value = value[1:]
+
+        whole, point, fraction = value.partition('.')
+        digits = whole + fraction
+        if not digits.isdigit() or not digits.isascii():
+            return None
+
+        number = int(whole + fraction[:places].ljust(places, '0') or '0')
+        if len(fraction) > places and fraction[places] >= '5':
+            number += 1
+
+        return -number if negative else number
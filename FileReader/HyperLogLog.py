@@ -0,0 +1,50 @@
+from hashlib import blake2b
+import math
+
+""" HyperLogLog class
+    Estimates the number of distinct values added in a fixed 2 ** precision bytes of memory, with a standard error of
+    about 1.04 / sqrt(2 ** precision), 0.8% at the default precision of 14. Small counts are corrected with linear
+    counting, so they are nearly exact.
+    Values are hashed with BLAKE2b rather than hash(), so sketches built in different processes can be merged.
+    Attributes: precision - Number of bits of the hash that pick a register, 4 to 18
+"""
+
+
+class HyperLogLog:
+    def __init__(self, precision=14):
+        if not 4 <= precision <= 18:
+            raise ValueError('precision must be between 4 and 18.')
+
+        self.__precision = precision
+        self.__registers = bytearray(1 << precision)
+
+    def get_precision(self):
+        return self.__precision
+
+    """ Relative standard error of the estimate
+    """
+    def get_standard_error(self):
+        return 1.04 / math.sqrt(len(self.__registers))
+
+    def add(self, value):
+        hashed = int.from_bytes(blake2b(value.encode(), digest_size=8).digest(), 'big')
+        register = hashed >> (64 - self.__precision)
+        rank = 64 - self.__precision - (hashed & ((1 << (64 - self.__precision)) - 1)).bit_length() + 1
+        if rank > self.__registers[register]:
+            self.__registers[register] = rank
+
+    def merge(self, other):
+        if other.__precision != self.__precision:
+            raise ValueError('Only sketches of the same precision can be merged.')
+        self.__registers = bytearray(map(max, self.__registers, other.__registers))
+
+    def count(self):
+        register_count = len(self.__registers)
+        alpha = 0.7213 / (1 + 1.079 / register_count)
+        estimate = alpha * register_count * register_count / sum(2.0 ** -rank for rank in self.__registers)
+
+        empty_count = self.__registers.count(0)
+        if estimate <= 2.5 * register_count and empty_count > 0:
+            estimate = register_count * math.log(register_count / empty_count)
+
+        return int(round(estimate))
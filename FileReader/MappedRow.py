@@ -0,0 +1,73 @@
+""" MappedRow class
+    One line of a memory-mapped CSV, returned by the mmap_read iteration method.
+    Behaves like the list of fields returned by lazy_sequential_read, but nothing is decoded until a field is indexed.
+    The line is then decoded and split in one step and the fields kept, which costs far less than locating and
+    decoding the fields one at a time. get_bytes reads a single field straight from the buffer without decoding.
+    A row is only valid until the iteration that produced it finishes.
+    Attributes: buffer   - The memory-mapped file
+                start    - Offset of the first byte of the line
+                end      - Offset just past the last byte of the line, excluding the newline
+                encoding - Encoding used to decode fields
+"""
+
+
+class MappedRow:
+    __slots__ = ('__buffer', '__start', '__end', '__encoding', '__fields')
+
+    def __init__(self, buffer, start, end, encoding):
+        self.__buffer = buffer
+        self.__start = start
+        self.__end = end
+        self.__encoding = encoding
+        self.__fields = None
+
+    def __get_fields(self):
+        if self.__fields is None:
+            self.__fields = str(self.__buffer[self.__start:self.__end], self.__encoding).split(',')
+
+        return self.__fields
+
+    def __len__(self):
+        return len(self.__get_fields())
+
+    def __getitem__(self, index):
+        fields = self.__fields
+        if fields is None:
+            fields = self.__get_fields()
+
+        return fields[index]
+
+    def __iter__(self):
+        return iter(self.__get_fields())
+
+    """ The raw bytes of a field as a memoryview slice, without copying or decoding.
+        Only the commas up to the field are searched for.
+    """
+    def get_bytes(self, index):
+        if index < 0:
+            index += len(self) if self.__fields is not None else self.__count_fields()
+        if index < 0:
+            raise IndexError('MappedRow index out of range')
+
+        start = self.__start
+        for field in range(index):
+            comma = self.__buffer.find(b',', start, self.__end)
+            if comma == -1:
+                raise IndexError('MappedRow index out of range')
+            start = comma + 1
+
+        end = self.__buffer.find(b',', start, self.__end)
+        return memoryview(self.__buffer)[start:end if end != -1 else self.__end]
+
+    """ Number of fields of the line, counting its commas without decoding it
+    """
+    def __count_fields(self):
+        count = 1
+        comma = self.__buffer.find(b',', self.__start, self.__end)
+        while comma != -1:
+            count += 1
+            comma = self.__buffer.find(b',', comma + 1, self.__end)
+        return count
+
+    def get_line(self):
+        return memoryview(self.__buffer)[self.__start:self.__end]
@@ -0,0 +1,165 @@
+import json
+import os
+import re
+
+""" PartitionStore class
+    A prescription extract split into one file per SHA and PCT, with a manifest of the partitions.
+    Every partition keeps the header line and the rows of its practices in file order, and the manifest lists the
+    practices of each partition, so a reader can skip the partitions that have no practice in the regions it is asked
+    about. Rows that do not have as many fields as the header are left out and counted in the manifest.
+    Rows are buffered per partition and appended a block at a time, so any number of partitions can be written without
+    holding a file open for each. The manifest is written last, so an interrupted split is never mistaken for a
+    complete one, and it remembers the size and modification time of the extract it was split from.
+    Attributes: directory - Directory holding the partition files and manifest.json
+"""
+
+
+class PartitionStore:
+    __manifest_version = 1
+
+    def __init__(self, directory):
+        self.__directory = directory
+        self.__manifest = None
+
+    def get_directory(self):
+        return self.__directory
+
+    def get_manifest_file(self):
+        return os.path.join(self.__directory, 'manifest.json')
+
+    """ File name of a partition, with anything but letters and digits in the codes replaced
+    """
+    @staticmethod
+    def get_partition_name(sha, pct):
+        return re.sub('[^A-Za-z0-9]', '_', sha) + '_' + re.sub('[^A-Za-z0-9]', '_', pct) + '.csv'
+
+    """ Splits the extract of a PrescriptionFileReader into partitions by SHA and PCT, replacing any earlier split
+    """
+    def partition(self, reader, block_size=100000):
+        os.makedirs(self.__directory, exist_ok=True)
+        if os.path.isfile(self.get_manifest_file()):
+            os.remove(self.get_manifest_file())
+        self.__manifest = None
+
+        sha_index = reader.get_column_index('SHA')
+        pct_index = reader.get_column_index('PCT')
+        practice_index = reader.get_column_index('PRACTICE')
+        column_count = len(reader.column_to_index)
+        partitions = {}
+        buffered_lines = {}
+        buffered_count = 0
+        row_count = 0
+        skipped_row_count = 0
+
+        with reader.open_file('rt') as f:
+            header_line = f.readline() if reader.get_header() is None else ''
+            if header_line and not header_line.endswith('\n'):
+                header_line += '\n'
+
+            for line in f:
+                fields = line.split(',')
+                if len(fields) != column_count:
+                    skipped_row_count += 1
+                    continue
+
+                key = (fields[sha_index].strip(), fields[pct_index].strip())
+                partition = partitions.get(key)
+                if partition is None:
+                    partition = partitions[key] = {'sha': key[0], 'pct': key[1],
+                                                   'file': self.get_partition_name(*key), 'rows': 0, 'practices': set()}
+                    with open(os.path.join(self.__directory, partition['file']), 'wt') as partition_file:
+                        partition_file.write(header_line)
+
+                partition['rows'] += 1
+                partition['practices'].add(fields[practice_index].strip())
+                buffered_lines.setdefault(key, []).append(line if line.endswith('\n') else line + '\n')
+                buffered_count += 1
+                row_count += 1
+
+                if buffered_count == block_size:
+                    self.__flush(partitions, buffered_lines)
+                    buffered_count = 0
+
+        self.__flush(partitions, buffered_lines)
+
+        for partition in partitions.values():
+            partition['practices'] = sorted(partition['practices'])
+            partition['bytes'] = os.path.getsize(os.path.join(self.__directory, partition['file']))
+
+        manifest = {'version': self.__manifest_version, 'source': os.path.abspath(reader.get_filename()),
+                    'signature': reader.get_source_signature(), 'has_header': reader.get_header() is None,
+                    'row_count': row_count, 'skipped_row_count': skipped_row_count,
+                    'partitions': [partitions[key] for key in sorted(partitions)]}
+        with open(self.get_manifest_file() + '.tmp', 'wt') as f:
+            json.dump(manifest, f)
+        os.replace(self.get_manifest_file() + '.tmp', self.get_manifest_file())
+        self.__manifest = manifest
+
+    def __flush(self, partitions, buffered_lines):
+        for key, lines in buffered_lines.items():
+            with open(os.path.join(self.__directory, partitions[key]['file']), 'at') as f:
+                f.write(''.join(lines))
+        buffered_lines.clear()
+
+    def get_manifest(self):
+        if self.__manifest is None:
+            if not os.path.isfile(self.get_manifest_file()):
+                raise ValueError('The extract has not been partitioned into ' + self.__directory + '.')
+            with open(self.get_manifest_file(), 'rt') as f:
+                manifest = json.load(f)
+            if manifest.get('version') != self.__manifest_version:
+                raise ValueError('The partitions in ' + self.__directory + ' were written by another version.')
+            self.__manifest = manifest
+        return self.__manifest
+
+    """ True if the partitions were split from an extract with the given signature
+    """
+    def is_valid(self, source_signature):
+        try:
+            return self.get_manifest()['signature'] == source_signature
+        except ValueError:
+            return False
+
+    def get_partitions(self):
+        return self.get_manifest()['partitions']
+
+    def has_header(self):
+        return self.get_manifest()['has_header']
+
+    def get_row_count(self):
+        return self.get_manifest()['row_count']
+
+    def get_skipped_row_count(self):
+        return self.get_manifest()['skipped_row_count']
+
+    def get_partition_file(self, partition):
+        return os.path.join(self.__directory, partition['file'])
+
+    """ The partitions with at least one practice in one of regions, the region of each practice given by
+        region_lookup. Practices without a region belong to 'UNKNOWN'. Optionally only the partitions of some SHAs.
+        With regions None, every partition of those SHAs.
+    """
+    def select(self, regions=None, region_lookup=None, shas=None):
+        regions = set(regions) if regions is not None else None
+        selected = []
+
+        for partition in self.get_partitions():
+            if shas is not None and partition['sha'] not in shas:
+                continue
+            if regions is None:
+                selected.append(partition)
+                continue
+
+            for practice in partition['practices']:
+                region = region_lookup(practice)
+                if (region if region is not None else 'UNKNOWN') in regions:
+                    selected.append(partition)
+                    break
+
+        return selected
+
+    """ Total size on disk of some partitions, of all of them by default
+    """
+    def get_total_size(self, partitions=None):
+        return sum(partition['bytes'] for partition in (partitions if partitions is not None else
+                                                        self.get_partitions()))
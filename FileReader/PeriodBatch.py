@@ -0,0 +1,173 @@
+from concurrent.futures import ProcessPoolExecutor
+import copy
+import os
+from FileReader.PracticeDimension import PracticeDimension
+from FileReader.PrescriptionFileReader import PrescriptionFileReader
+
+""" PeriodBatch class
+    Processes many monthly prescription extracts at once, one period per worker process.
+    Each extract is joined against the address file of the same PERIOD, or else the latest earlier one, through a
+    PracticeDimension built once per address period. The postcode lookup is shared by every period.
+    Gives access to the aggregates of every period and to the cumulative aggregates over all of them.
+    Attributes: postcode_reader - A processed PostcodeLookupReader
+"""
+
+
+class PeriodBatch:
+    __extensions = ('.csv', '.csv.gz', '.csv.bz2', '.csv.xz')
+
+    def __init__(self, postcode_reader):
+        self.__postcode_reader = postcode_reader
+        self.__address_readers = {}
+        self.__practice_dimensions = {}
+        self.__prescription_files = {}
+        self.__readers = {}
+        self.__iteration_method = 'lazy_sequential_read'
+        self.__worker_count = os.cpu_count() or 1
+        self.__profiling = False
+
+    def set_iteration_method(self, iteration_method):
+        self.__iteration_method = iteration_method
+
+    def get_iteration_method(self):
+        return self.__iteration_method
+
+    def set_worker_count(self, worker_count):
+        if worker_count < 1:
+            raise ValueError('worker_count must be at least 1.')
+        self.__worker_count = worker_count
+
+    def get_worker_count(self):
+        return self.__worker_count
+
+    """ Measure the time spent in each aggregator of every period, see PrescriptionFileReader.set_profiling
+    """
+    def set_profiling(self, profiling):
+        self.__profiling = profiling
+
+    """ The PERIOD of a file, taken from the given column of its first row
+    """
+    @staticmethod
+    def read_period(reader, column):
+        with reader.open_file('rt') as f:
+            if reader.get_header() is None:
+                f.readline()
+            fields = f.readline().split(',')
+
+        index = reader.get_column_index(column)
+        if len(fields) <= index or not fields[index].strip():
+            raise ValueError('The file ' + reader.get_filename() + ' has no ' + column + '.')
+
+        return fields[index].strip()
+
+    """ Adds a processed AddressFileReader, used for the prescriptions of its period and of later periods without one
+    """
+    def add_address_reader(self, address_reader):
+        self.__address_readers[self.read_period(address_reader, 'Period')] = address_reader
+        self.__practice_dimensions = {}
+
+    def add_prescription_file(self, filename):
+        period = self.read_period(PrescriptionFileReader(filename, None), 'PERIOD')
+        if period in self.__prescription_files:
+            raise ValueError('Both ' + self.__prescription_files[period] + ' and ' + filename + ' are for period ' +
+                             period + '.')
+
+        self.__prescription_files[period] = filename
+        return period
+
+    """ Adds every CSV file in a directory as a prescription extract, plain or compressed with gzip, bzip2 or xz
+    """
+    def add_prescription_directory(self, directory):
+        for name in sorted(os.listdir(directory)):
+            if name.lower().endswith(self.__extensions):
+                self.add_prescription_file(os.path.join(directory, name))
+
+    """ The period of the address file used for a prescription period: the same period, else the latest earlier
+        one, else the earliest one available
+    """
+    def get_address_period(self, period):
+        if not self.__address_readers:
+            raise ValueError('No address file has been added.')
+
+        periods = sorted(self.__address_readers)
+        earlier = [address_period for address_period in periods if address_period <= period]
+        return earlier[-1] if earlier else periods[0]
+
+    def __get_practice_dimension(self, period):
+        address_period = self.get_address_period(period)
+        practice_dimension = self.__practice_dimensions.get(address_period)
+        if practice_dimension is None:
+            practice_dimension = PracticeDimension()
+            practice_dimension.populate(self.__address_readers[address_period], self.__postcode_reader)
+            self.__practice_dimensions[address_period] = practice_dimension
+        return practice_dimension
+
+    """ Processes every prescription extract, in a pool of worker processes when there is more than one
+    """
+    def process(self):
+        periods = self.get_periods()
+        regions = self.__postcode_reader.get_regions_list()
+        arguments = [(self.__prescription_files[period], self.__get_practice_dimension(period), regions,
+                      self.__iteration_method, self.__profiling) for period in periods]
+
+        if len(periods) == 1 or self.__worker_count == 1:
+            readers = [self.process_period(*argument) for argument in arguments]
+        else:
+            with ProcessPoolExecutor(max_workers=min(self.__worker_count, len(periods))) as executor:
+                readers = list(executor.map(PeriodBatch.process_period, *zip(*arguments)))
+
+        self.__readers = dict(zip(periods, readers))
+
+    """ Processes one prescription extract. Returns the reader, so it can be shipped back from a worker process.
+    """
+    @staticmethod
+    def process_period(filename, practice_dimension, regions, iteration_method, profiling=False):
+        reader = PrescriptionFileReader(filename, None)
+        reader.set_iteration_method(iteration_method)
+        reader.set_profiling(profiling)
+        reader.set_practice_dimension(practice_dimension)
+        reader.setup_region_based_dictionaries(regions)
+
+        for row in reader:
+            reader.process_file(row)
+
+        return reader
+
+    """ Total size on disk of the prescription extracts
+    """
+    def get_total_size(self):
+        return sum(os.path.getsize(filename) for filename in self.__prescription_files.values())
+
+    def get_periods(self):
+        return sorted(self.__prescription_files)
+
+    def get_reader(self, period):
+        if period not in self.__readers:
+            raise KeyError(period + ' has not been processed.')
+        return self.__readers[period]
+
+    """ A reader holding the aggregates of every period, merged in period order
+    """
+    def get_cumulative_reader(self):
+        periods = sorted(self.__readers)
+        if not periods:
+            raise ValueError('No period has been processed.')
+
+        cumulative_reader = copy.deepcopy(self.__readers[periods[0]])
+        for period in periods[1:]:
+            cumulative_reader.merge(self.__readers[period])
+
+        return cumulative_reader
+
+    """ Writes the answers of every period to output_<period>.txt and appends the cumulative answers to output.txt
+    """
+    def write_output_to_file(self):
+        cumulative_reader = self.get_cumulative_reader()
+
+        for period in sorted(self.__readers):
+            reader = self.__readers[period]
+            reader.set_output_file('output_' + period + '.txt')
+            open(reader.get_output_file(), 'w').close()
+            reader.write_output_to_file()
+
+        cumulative_reader.write_output_to_file()
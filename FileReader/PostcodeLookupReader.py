@@ -1,4 +1,6 @@
 from FileReader import FileReader
+import json
+import os
 
 
 class PostcodeLookupReader(FileReader):
@@ -6,21 +8,96 @@ class PostcodeLookupReader(FileReader):
         FileReader.__init__(self, header, filename)
         self.__postcode_to_region_lookup = {}
         self.__regions = []
+        self.__known_regions = set()
+
+        """ Only two of the NSPL columns are needed, which projected_read returns as tuples
+        """
+        self.set_projection(('Postcode 3', 'Region Name'))
+
+        """ The lookup is persisted here, so warm runs can skip parsing the NSPL file
+        """
+        self.__index_file = self.get_filename() + '.index'
 
     def process_file(self, row):
         self.__populate_postcode_to_region_lookup(row)
 
     """ Populates a dictionary with the outer postcode as key and region as values
+        Accepts a dictionary from lazy_read or a (postcode, region) tuple from projected_read
     """
     def __populate_postcode_to_region_lookup(self, row):
-        outer_postcode = row['Postcode 3'].split(' ')[0]
-        region = row['Region Name']
+        if isinstance(row, dict):
+            postcode, region = row['Postcode 3'], row['Region Name']
+        else:
+            postcode, region = row
+
+        if region:
+            self.__postcode_to_region_lookup[postcode.split(' ')[0]] = region
+            self.__add_region(region)
+
+    def __add_region(self, region):
+        if region not in self.__known_regions:
+            self.__known_regions.add(region)
+            self.__regions.append(region)
+
+    """ Combines the lookup of a reader that processed a later part of the file, later rows taking precedence
+    """
+    def merge(self, other):
+        FileReader.merge(self, other)
+        self.__postcode_to_region_lookup.update(other.__postcode_to_region_lookup)
+
+        for region in other.__regions:
+            self.__add_region(region)
+
+    def set_index_file(self, index_file):
+        self.__index_file = index_file
+
+    def get_index_file(self):
+        return self.__index_file
+
+    """ Loads the lookup from the index file if it was built from the current version of the source file.
+        Returns True if the index was used, False if the source file still has to be processed, as it also has to be
+        when the index file does not hold an index.
+    """
+    def load_index(self):
+        if not os.path.isfile(self.__index_file):
+            return False
+
+        with open(self.__index_file, 'rt') as f:
+            try:
+                index = json.load(f)
+            except ValueError:
+                return False
+
+        if not isinstance(index, dict) or index.get('source') != self.get_source_signature():
+            return False
+        if not isinstance(index.get('lookup'), dict) or not isinstance(index.get('regions'), list):
+            return False
+
+        self.__postcode_to_region_lookup = index['lookup']
+        self.__regions = index['regions']
+        self.__known_regions = set(self.__regions)
+        return True
+
+    """ Writes the lookup to the index file, tagged with the signature of the source file.
+        Returns False, leaving no partial index behind, if the index file cannot be written, for instance because
+        the directory of the source file is read-only. set_index_file puts the index somewhere else.
+    """
+    def save_index(self):
+        index = {'source': self.get_source_signature(), 'regions': self.__regions,
+                 'lookup': self.__postcode_to_region_lookup}
+        temporary_file = self.__index_file + '.tmp'
+
+        try:
+            with open(temporary_file, 'wt') as f:
+                json.dump(index, f, separators=(',', ':'))
 
-        if region and region is not '':
-            self.__postcode_to_region_lookup[outer_postcode] = region
+            os.replace(temporary_file, self.__index_file)
+        except OSError:
+            if os.path.isfile(temporary_file):
+                os.remove(temporary_file)
+            return False
 
-            if region not in self.__regions:
-                self.__regions.append(region)
+        return True
 
     def get_total_postcodes(self):
         return len(self.__postcode_to_region_lookup)
@@ -0,0 +1,99 @@
+""" PracticeDimension class
+    Joins the practice addresses with the postcode lookup once per run.
+    Every practice gets an integer id, under which its postcode, outer postcode and region id are kept,
+    so resolving a prescription row is a single dictionary lookup followed by list indexing.
+    Regions are interned the same way, practices whose postcode has no known region get the region id None.
+"""
+
+
+class PracticeDimension:
+    def __init__(self):
+        self.__practice_ids = {}
+        self.__practice_codes = []
+        self.__postcodes = []
+        self.__outer_postcodes = []
+        self.__region_ids = []
+
+        self.__region_ids_by_name = {}
+        self.__regions = []
+        self.__region_by_postcode = {}
+
+    """ Builds the dimension from a processed AddressFileReader and PostcodeLookupReader
+    """
+    def populate(self, address_reader, postcode_reader):
+        for region in postcode_reader.get_regions_list():
+            self.__intern_region(region)
+
+        for practice_code, postcode in address_reader.get_practice_code_to_postcode().items():
+            try:
+                region = postcode_reader.get_region_from_postcode(postcode)
+            except KeyError:
+                region = None
+
+            self.add_practice(practice_code, postcode, region)
+
+    def add_practice(self, practice_code, postcode, region):
+        practice_id = self.__practice_ids.get(practice_code)
+        if practice_id is None:
+            practice_id = len(self.__practice_codes)
+            self.__practice_ids[practice_code] = practice_id
+            self.__practice_codes.append(practice_code)
+            self.__postcodes.append(None)
+            self.__outer_postcodes.append(None)
+            self.__region_ids.append(None)
+
+        region_id = self.__intern_region(region) if region is not None else None
+
+        self.__postcodes[practice_id] = postcode
+        self.__outer_postcodes[practice_id] = postcode.split(' ')[0] if postcode is not None else None
+        self.__region_ids[practice_id] = region_id
+        if postcode is not None:
+            self.__region_by_postcode[postcode] = region
+
+        return practice_id
+
+    def __intern_region(self, region):
+        region_id = self.__region_ids_by_name.get(region)
+        if region_id is None:
+            region_id = len(self.__regions)
+            self.__region_ids_by_name[region] = region_id
+            self.__regions.append(region)
+        return region_id
+
+    """ The integer id of a practice, None if the practice is not in the address file
+    """
+    def get_practice_id(self, practice_code):
+        return self.__practice_ids.get(practice_code)
+
+    def get_practice_code(self, practice_id):
+        return self.__practice_codes[practice_id]
+
+    def get_postcode(self, practice_id):
+        return self.__postcodes[practice_id] if practice_id is not None else None
+
+    def get_outer_postcode(self, practice_id):
+        return self.__outer_postcodes[practice_id] if practice_id is not None else None
+
+    def get_region_id(self, practice_id):
+        return self.__region_ids[practice_id] if practice_id is not None else None
+
+    def get_region(self, practice_id):
+        region_id = self.get_region_id(practice_id)
+        return self.__regions[region_id] if region_id is not None else None
+
+    def get_region_name(self, region_id):
+        return self.__regions[region_id]
+
+    def get_regions(self):
+        return self.__regions
+
+    def get_practice_count(self):
+        return len(self.__practice_codes)
+
+    """ Drop-in replacements for the lookups of AddressFileReader and PostcodeLookupReader
+    """
+    def get_postcode_for_practice(self, practice_code):
+        return self.get_postcode(self.get_practice_id(practice_code))
+
+    def get_region_from_postcode(self, postcode):
+        return self.__region_by_postcode.get(postcode)
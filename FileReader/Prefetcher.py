@@ -0,0 +1,64 @@
+import queue
+import threading
+
+""" Prefetcher class
+    Iterates over an iterable, typically a FileReader, in a background thread and hands the items over in blocks
+    through a bounded queue, so reading and parsing rows overlaps with work that does not need them yet.
+    At most queue_size blocks of block_size items are read ahead. An exception raised while iterating is re-raised
+    to the consumer, and the thread stops once the consumer stops iterating.
+    The thread only overlaps with the consumer while the iterable waits outside the GIL, on blocking reads or
+    decompression in C. An iterable that parses rows in Python holds the GIL, and prefetching it is slower than
+    iterating it directly.
+    Attributes: iterable   - The items to prefetch, iterated exactly once
+                block_size - Number of items handed over at a time
+                queue_size - Number of blocks that can be waiting
+"""
+
+
+class Prefetcher:
+    def __init__(self, iterable, block_size=10000, queue_size=16):
+        if block_size < 1 or queue_size < 1:
+            raise ValueError('block_size and queue_size must be at least 1.')
+
+        self.__queue = queue.Queue(queue_size)
+        self.__stopped = threading.Event()
+        self.__thread = threading.Thread(target=self.__fill, args=(iterable, block_size), daemon=True)
+        self.__thread.start()
+
+    def __fill(self, iterable, block_size):
+        try:
+            block = []
+            for item in iterable:
+                block.append(item)
+                if len(block) == block_size:
+                    self.__queue.put(('items', block))
+                    if self.__stopped.is_set():
+                        return
+                    block = []
+
+            self.__queue.put(('items', block))
+            self.__queue.put(('end', None))
+        except BaseException as error:
+            self.__queue.put(('error', error))
+
+    def __iter__(self):
+        try:
+            while True:
+                kind, payload = self.__queue.get()
+                if kind == 'end':
+                    return
+                if kind == 'error':
+                    raise payload
+                yield from payload
+        finally:
+            self.close()
+
+    """ Stops the background thread, leaving any rows it has not read yet unread
+    """
+    def close(self):
+        self.__stopped.set()
+        while self.__thread.is_alive():
+            try:
+                self.__queue.get_nowait()
+            except queue.Empty:
+                self.__thread.join(0.01)
@@ -0,0 +1,661 @@
+from FileReader.Aggregator import Aggregator
+from FileReader.CountMinSketch import CountMinSketch
+from FileReader.HyperLogLog import HyperLogLog
+from FileReader.PrescriptionRecord import PrescriptionBatch
+from FileReader.SpillingTotals import SpillingTotals
+from operator import itemgetter
+import heapq
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+""" Every aggregator keeps exact integer totals: items as counts and costs in pence, as PrescriptionRecord holds them.
+    Totals are only turned into pounds, and rounded, when an average is asked for.
+    The sampling and sketch aggregators at the end sum integers too, but their answers are estimates with error bounds.
+"""
+
+
+""" Q2. Count the prescriptions of a drug category and their total cost
+"""
+
+
+class AverageCostAggregator(Aggregator):
+    def __init__(self, category='peppermint_oil'):
+        self.__category = category
+        self.__prescription_location_count = 0
+        self.__prescription_total_cost = 0
+
+    def get_row_filter(self, drug_catalogue):
+        return drug_catalogue.get_substrings(self.__category)
+
+    def get_record_fields(self):
+        return {'categories', 'act_cost'}
+
+    def update(self, record):
+        if self.__category in record.categories and record.act_cost is not None:
+            self.__prescription_location_count += 1
+            self.__prescription_total_cost += record.act_cost
+
+    def update_batch(self, batch):
+        matches = batch.match_category(self.__category) & batch.valid_costs
+        self.__prescription_location_count += int(numpy.count_nonzero(matches))
+        self.__prescription_total_cost += int(batch.act_costs[matches].sum())
+
+    def merge(self, other):
+        self.__prescription_location_count += other.__prescription_location_count
+        self.__prescription_total_cost += other.__prescription_total_cost
+
+    def get_average(self):
+        if self.__prescription_location_count == 0 or self.__prescription_total_cost == 0:
+            raise ValueError('Prescription information is not populated!')
+
+        return self.average_in_pounds(self.__prescription_total_cost, self.__prescription_location_count)
+
+
+""" Q3. Total actual spend in pence by practice postcode, 'UNKNOWN' for practices without one
+"""
+
+
+class SpendByPostcodeAggregator(Aggregator):
+    def __init__(self):
+        self.__post_codes_by_actual_spend = {}
+
+    def get_record_fields(self):
+        return {'practice', 'act_cost'}
+
+    def update(self, record):
+        if record.act_cost is None:
+            return
+
+        postcode = record.get_postcode()
+        if postcode is None:
+            postcode = 'UNKNOWN'
+
+        self.__post_codes_by_actual_spend[postcode] = \
+            self.__post_codes_by_actual_spend.get(postcode, 0) + record.act_cost
+
+    def update_batch(self, batch):
+        keys, row_postcodes = batch.encode_postcodes()
+        row_postcodes = row_postcodes[batch.valid_costs]
+        spend = PrescriptionBatch.sum_by(row_postcodes, batch.act_costs[batch.valid_costs], len(keys))
+        present = numpy.bincount(row_postcodes, minlength=len(keys))
+
+        for postcode, index in keys.items():
+            if present[index]:
+                self.__post_codes_by_actual_spend[postcode] = \
+                    self.__post_codes_by_actual_spend.get(postcode, 0) + int(spend[index])
+
+    def merge(self, other):
+        for postcode, spend in other.__post_codes_by_actual_spend.items():
+            self.__post_codes_by_actual_spend[postcode] = self.__post_codes_by_actual_spend.get(postcode, 0) + spend
+
+    def get_spend_by_postcode(self):
+        return self.__post_codes_by_actual_spend
+
+
+""" Total actual spend in pence by practice code, for top-N questions by practice and by region.
+    Not registered by default, as only those questions read it.
+"""
+
+
+class SpendByPracticeAggregator(Aggregator):
+    def __init__(self):
+        self.__practices_by_actual_spend = {}
+
+    def get_record_fields(self):
+        return {'practice', 'act_cost'}
+
+    def update(self, record):
+        if record.act_cost is None:
+            return
+
+        self.__practices_by_actual_spend[record.practice] = \
+            self.__practices_by_actual_spend.get(record.practice, 0) + record.act_cost
+
+    def update_batch(self, batch):
+        spend = PrescriptionBatch.sum_by(batch.practice_codes[batch.valid_costs], batch.act_costs[batch.valid_costs],
+                                         len(batch.practices))
+        present = numpy.bincount(batch.practice_codes[batch.valid_costs], minlength=len(batch.practices))
+
+        for practice in numpy.argsort(batch.first_rows).tolist():
+            if present[practice]:
+                self.__practices_by_actual_spend[batch.practices[practice]] = \
+                    self.__practices_by_actual_spend.get(batch.practices[practice], 0) + int(spend[practice])
+
+    def merge(self, other):
+        for practice, spend in other.__practices_by_actual_spend.items():
+            self.__practices_by_actual_spend[practice] = self.__practices_by_actual_spend.get(practice, 0) + spend
+
+    def get_spend_by_practice(self):
+        return self.__practices_by_actual_spend
+
+
+""" Q4. Sum of the price per item of a drug category by region and across the nation.
+    Prices are kept in millionths of a penny, rounded once per row, so the sums are exact and do not depend on the
+    order rows are processed or merged in.
+"""
+
+
+class PriceByRegionAggregator(Aggregator):
+    __price_scale = 10 ** 6
+
+    def __init__(self, category='flucloxacillin'):
+        self.__category = category
+        self.__average_price_per_region = {}
+        self.__prescription_count_by_region = {}
+        self.__cost_per_prescription = 0
+        self.__prescription_count = 0
+
+    def set_regions(self, regions):
+        for region in regions:
+            self.__average_price_per_region.setdefault(region, 0)
+            self.__prescription_count_by_region.setdefault(region, 0)
+
+    def get_row_filter(self, drug_catalogue):
+        return drug_catalogue.get_substrings(self.__category)
+
+    def get_record_fields(self):
+        return {'practice', 'items', 'act_cost', 'categories'}
+
+    def update(self, record):
+        if self.__category not in record.categories:
+            return
+        if record.act_cost is None or not record.items:
+            return
+
+        region = record.get_region()
+        if region is None:
+            region = 'UNKNOWN'
+            self.__average_price_per_region.setdefault(region, 0)
+            self.__prescription_count_by_region.setdefault(region, 0)
+
+        price = self.get_price_per_item(record.act_cost, record.items)
+        self.__average_price_per_region[region] += price
+        self.__prescription_count_by_region[region] += 1
+
+        self.__cost_per_prescription += price
+        self.__prescription_count += 1
+
+    def update_batch(self, batch):
+        matches = batch.match_category(self.__category) & batch.valid_rows & (batch.items != 0)
+        items = numpy.where(matches, batch.items, 1)
+        prices = (batch.act_costs * self.__price_scale + items // 2) // items
+        regions, row_regions, matches = batch.encode_regions(matches, 'UNKNOWN')
+        price = PrescriptionBatch.sum_by(row_regions[matches], prices[matches], len(regions))
+        count = numpy.bincount(row_regions[matches], minlength=len(regions))
+
+        for region, index in regions.items():
+            if region == 'UNKNOWN':
+                self.__average_price_per_region.setdefault(region, 0)
+                self.__prescription_count_by_region.setdefault(region, 0)
+            self.__average_price_per_region[region] += int(price[index])
+            self.__prescription_count_by_region[region] += int(count[index])
+
+        self.__cost_per_prescription += int(prices[matches].sum())
+        self.__prescription_count += int(numpy.count_nonzero(matches))
+
+    def merge(self, other):
+        for region, price in other.__average_price_per_region.items():
+            self.__average_price_per_region[region] = self.__average_price_per_region.get(region, 0) + price
+        for region, count in other.__prescription_count_by_region.items():
+            self.__prescription_count_by_region[region] = self.__prescription_count_by_region.get(region, 0) + count
+
+        self.__cost_per_prescription += other.__cost_per_prescription
+        self.__prescription_count += other.__prescription_count
+
+    """ Price per item of a prescription in millionths of a penny, rounded half up
+    """
+    @staticmethod
+    def get_price_per_item(act_cost, items):
+        return (act_cost * PriceByRegionAggregator.__price_scale + items // 2) // items
+
+    """ Average in pounds of count prices per item totalling price, in millionths of a penny
+    """
+    @staticmethod
+    def get_average_price(price, count):
+        return Aggregator.average_in_pounds(price, count, PriceByRegionAggregator.__price_scale)
+
+    def get_average_price_by_region(self):
+        price_by_region_dict = {}
+
+        for region in self.__average_price_per_region.keys():
+            if self.__prescription_count_by_region[region] == 0:
+                price_by_region_dict[region] = 0.0
+            else:
+                price_by_region_dict[region] = self.get_average_price(self.__average_price_per_region[region],
+                                                                      self.__prescription_count_by_region[region])
+
+        return price_by_region_dict
+
+    def get_cost_per_prescription(self):
+        if self.__prescription_count == 0:
+            raise ValueError('cost_per_prescription information is not populated')
+        return self.get_average_price(self.__cost_per_prescription, self.__prescription_count)
+
+
+""" Q5. Number of antidepressant items by region, only counted once the regions are set
+"""
+
+
+class AntidepressantCountAggregator(Aggregator):
+    def __init__(self, category='antidepressant'):
+        self.__category = category
+        self.__antidepressant_prescription_count_by_region = {}
+
+    def set_regions(self, regions):
+        for region in regions:
+            self.__antidepressant_prescription_count_by_region.setdefault(region, 0)
+
+    def get_row_filter(self, drug_catalogue):
+        return drug_catalogue.get_substrings(self.__category)
+
+    def get_record_fields(self):
+        return {'practice', 'items', 'categories'}
+
+    def update(self, record):
+        if not self.__antidepressant_prescription_count_by_region:
+            return
+        if self.__category not in record.categories:
+            return
+
+        region = record.get_region()
+        if region is not None and record.items is not None:
+            self.__antidepressant_prescription_count_by_region[region] += record.items
+
+    def update_batch(self, batch):
+        if not self.__antidepressant_prescription_count_by_region:
+            return
+
+        regions, row_regions, matches = batch.encode_regions(batch.match_category(self.__category) & batch.valid_items,
+                                                             None)
+        total = PrescriptionBatch.sum_by(row_regions[matches], batch.items[matches], len(regions))
+
+        for region, index in regions.items():
+            self.__antidepressant_prescription_count_by_region[region] += int(total[index])
+
+    def merge(self, other):
+        for region, count in other.__antidepressant_prescription_count_by_region.items():
+            self.__antidepressant_prescription_count_by_region[region] = \
+                self.__antidepressant_prescription_count_by_region.get(region, 0) + count
+
+    def get_count_by_region(self):
+        return self.__antidepressant_prescription_count_by_region
+
+
+""" Items and actual spend in pence rolled up the BNF hierarchy, nationally and by region.
+    A BNF CODE such as 0703010F0 holds the chapter (07), section (0703), paragraph (070301) and chemical
+    substance (0703010F0). Codes too short for a level, such as appliances, are only counted at the levels they reach.
+    Regions are 'UNKNOWN' for practices without one. Every row is counted, so it is not registered by default.
+"""
+
+
+class BnfHierarchyAggregator(Aggregator):
+    __levels = (('chapter', 2), ('section', 4), ('paragraph', 6), ('chemical', 9))
+
+    def __init__(self):
+        self.__totals = {}
+        self.__totals_by_region = {}
+        self.__prefixes_by_code = {}
+
+    """ The prefixes of a BNF CODE at every level it reaches, worked out once per distinct code
+    """
+    def __get_prefixes(self, bnf_code):
+        prefixes = self.__prefixes_by_code.get(bnf_code)
+        if prefixes is None:
+            code = bnf_code.strip()
+            prefixes = tuple(code[:length] for level, length in self.__levels if len(code) >= length)
+            self.__prefixes_by_code[bnf_code] = prefixes
+        return prefixes
+
+    def __add(self, prefix, region, items, spend):
+        totals = self.__totals.get(prefix)
+        if totals is None:
+            totals = self.__totals[prefix] = [0, 0]
+        totals[0] += items
+        totals[1] += spend
+
+        totals = self.__totals_by_region.get((prefix, region))
+        if totals is None:
+            totals = self.__totals_by_region[(prefix, region)] = [0, 0]
+        totals[0] += items
+        totals[1] += spend
+
+    def get_record_fields(self):
+        return {'practice', 'bnf_code', 'items', 'act_cost'}
+
+    def update(self, record):
+        if record.act_cost is None or record.items is None:
+            return
+
+        region = record.get_region()
+        if region is None:
+            region = 'UNKNOWN'
+        for prefix in self.__get_prefixes(record.bnf_code):
+            self.__add(prefix, region, record.items, record.act_cost)
+
+    def update_batch(self, batch):
+        regions, row_regions, rows = batch.encode_regions(batch.valid_rows, 'UNKNOWN')
+        region_names = list(regions)
+        code_prefixes = [self.__get_prefixes(code) for code in batch.bnf_codes]
+
+        for depth in range(len(self.__levels)):
+            prefixes = {}
+            code_prefix = numpy.array([prefixes.setdefault(code[depth], len(prefixes)) if len(code) > depth else -1
+                                       for code in code_prefixes], dtype=numpy.intp)
+            row_prefix = code_prefix[batch.code_codes]
+            selected = rows & (row_prefix >= 0)
+            keys = row_prefix[selected] * len(regions) + row_regions[selected]
+            size = len(prefixes) * len(regions)
+            items = PrescriptionBatch.sum_by(keys, batch.items[selected], size)
+            spend = PrescriptionBatch.sum_by(keys, batch.act_costs[selected], size)
+            present = numpy.bincount(keys, minlength=size)
+
+            for prefix, prefix_index in prefixes.items():
+                for region_index, region in enumerate(region_names):
+                    key = prefix_index * len(regions) + region_index
+                    if present[key]:
+                        self.__add(prefix, region, int(items[key]), int(spend[key]))
+
+    def merge(self, other):
+        for prefix, (items, spend) in other.__totals.items():
+            totals = self.__totals.setdefault(prefix, [0, 0])
+            totals[0] += items
+            totals[1] += spend
+        for key, (items, spend) in other.__totals_by_region.items():
+            totals = self.__totals_by_region.setdefault(key, [0, 0])
+            totals[0] += items
+            totals[1] += spend
+
+    """ Length of the BNF codes at a level, 'chapter', 'section', 'paragraph' or 'chemical'
+    """
+    @staticmethod
+    def get_level_length(level):
+        for name, length in BnfHierarchyAggregator.__levels:
+            if name == level:
+                return length
+        raise ValueError('Unknown BNF level ' + str(level) + '.')
+
+    """ (items, spend) of every code at a level, optionally only those under a higher-level prefix
+    """
+    def get_totals(self, level, prefix=''):
+        length = self.get_level_length(level)
+        return {code: (totals[0], totals[1]) for code, totals in self.__totals.items()
+                if len(code) == length and code.startswith(prefix)}
+
+    @staticmethod
+    def check_prefix(prefix):
+        if len(prefix) not in [length for level, length in BnfHierarchyAggregator.__levels]:
+            raise ValueError(prefix + ' is not a BNF chapter, section, paragraph or chemical code.')
+
+    """ (items, spend) by region of a chapter, section, paragraph or chemical, the level given by the prefix length
+    """
+    def get_totals_by_region(self, prefix):
+        self.check_prefix(prefix)
+
+        return {region: (totals[0], totals[1]) for (code, region), totals in self.__totals_by_region.items()
+                if code == prefix}
+
+
+""" Rows, items and actual spend in pence by practice, BNF code and period, a group-by with far more keys than the
+    questions above. Totals are summed in a SpillingTotals, so at most max_keys of them are held in memory and the rest
+    are spilled to sorted run files in a run directory inside directory, to be merged by get_totals, at most fan_in at
+    a time. Not registered by default. Rows whose ITEMS or ACT COST is not a number are left out. Batches are not
+    supported, as they carry no PERIOD.
+"""
+
+
+class PracticeBnfPeriodAggregator(Aggregator):
+    def __init__(self, max_keys=1000000, directory=None, fan_in=64):
+        self.__totals = SpillingTotals(3, max_keys, directory, fan_in)
+
+    def get_record_fields(self):
+        return {'practice', 'bnf_code', 'period', 'items', 'act_cost'}
+
+    def update(self, record):
+        if record.items is None or record.act_cost is None:
+            return
+
+        self.__totals.add((record.practice.strip(), record.bnf_code.strip(), record.period.strip()),
+                          (1, record.items, record.act_cost))
+
+    def merge(self, other):
+        self.__totals.merge(other.__totals)
+
+    """ ((practice, bnf_code, period), (rows, items, spend)) pairs in key order, merged from memory and the run files
+    """
+    def get_totals(self):
+        return self.__totals.items()
+
+    def get_spilled_run_count(self):
+        return len(self.__totals.get_run_files())
+
+    """ Copy whose run files are linked into a run directory of its own, so a checkpoint keeps its runs after this
+        aggregator reduces or deletes them
+    """
+    def detach(self, directory=None):
+        detached = PracticeBnfPeriodAggregator.__new__(PracticeBnfPeriodAggregator)
+        detached.__totals = self.__totals.copy(directory)
+        return detached
+
+    """ Deletes the run files once the totals are no longer needed
+    """
+    def close(self):
+        self.__totals.close()
+
+
+""" Estimates of the average cost of a drug category (Q2) and of its average price per item by region and nationally
+    (Q4) from a random sample of the blocks of the file, with confidence intervals.
+    Totals are kept per block, and each average is estimated as the ratio of its totals over the sampled blocks. The
+    variance of the ratio is estimated from how much the blocks differ, with a finite population correction, so an
+    interval narrows as more of the blocks are read and has zero width once all of them are. Intervals of rare
+    categories with rows in only a few blocks are too narrow, read more blocks for those. Without sampling every row is
+    taken to be in one block, which gives the exact averages.
+    Estimates are (average, lower, upper) in pounds, None for a region without a sampled row.
+"""
+
+
+class SampledAverageAggregator(Aggregator):
+    __price_scale = 10 ** 6
+
+    def __init__(self, cost_category='peppermint_oil', price_category='flucloxacillin'):
+        self.__cost_category = cost_category
+        self.__price_category = price_category
+        self.__block = 0
+        self.__sampled_blocks = set()
+        self.__cost_by_block = {}
+        self.__price_by_region = {}
+        self.__price_by_block = {}
+
+    def set_regions(self, regions):
+        for region in regions:
+            self.__price_by_region.setdefault(region, {})
+
+    def get_row_filter(self, drug_catalogue):
+        return drug_catalogue.get_substrings(self.__cost_category) + \
+            drug_catalogue.get_substrings(self.__price_category)
+
+    def start_block(self, block):
+        self.__block = block
+        self.__sampled_blocks.add(block)
+
+    @staticmethod
+    def __add(totals_by_block, block, total):
+        totals = totals_by_block.get(block)
+        if totals is None:
+            totals = totals_by_block[block] = [0, 0]
+        totals[0] += total
+        totals[1] += 1
+
+    def get_record_fields(self):
+        return {'practice', 'items', 'act_cost', 'categories'}
+
+    def update(self, record):
+        if not self.__sampled_blocks:
+            self.__sampled_blocks.add(self.__block)
+        if record.act_cost is None:
+            return
+
+        if self.__cost_category in record.categories:
+            self.__add(self.__cost_by_block, self.__block, record.act_cost)
+
+        if self.__price_category in record.categories and record.items:
+            region = record.get_region()
+            price = PriceByRegionAggregator.get_price_per_item(record.act_cost, record.items)
+            self.__add(self.__price_by_region.setdefault(region if region is not None else 'UNKNOWN', {}),
+                       self.__block, price)
+            self.__add(self.__price_by_block, self.__block, price)
+
+    def merge(self, other):
+        self.__sampled_blocks |= other.__sampled_blocks
+        for totals_by_block, other_totals_by_block in \
+                [(self.__cost_by_block, other.__cost_by_block), (self.__price_by_block, other.__price_by_block)] + \
+                [(self.__price_by_region.setdefault(region, {}), totals_by_block)
+                 for region, totals_by_block in other.__price_by_region.items()]:
+            for block, (total, count) in other_totals_by_block.items():
+                totals = totals_by_block.setdefault(block, [0, 0])
+                totals[0] += total
+                totals[1] += count
+
+    def get_sampled_block_count(self):
+        return len(self.__sampled_blocks)
+
+    """ Ratio estimate of the average of the totals in pence, or in 1/scale pence, as (average, lower, upper) in pounds.
+        block_count is the number of blocks in the file, None if every block was read, and z sets the confidence,
+        1.96 for 95%. The interval is unbounded until rows have been read from at least two of several blocks, as the
+        spread of a single block says nothing about the others.
+    """
+    def __estimate(self, totals_by_block, block_count, z, scale=1):
+        sampled_count = len(self.__sampled_blocks)
+        total = sum(totals[0] for totals in totals_by_block.values())
+        count = sum(totals[1] for totals in totals_by_block.values())
+        if count == 0:
+            return None
+
+        average = Aggregator.average_in_pounds(total, count, scale)
+        if block_count is None or sampled_count >= block_count:
+            return average, average, average
+        if len(totals_by_block) < 2:
+            return average, float('-inf'), float('inf')
+
+        ratio = total / count
+        squares = sum((block_total - ratio * block_rows) ** 2 for block_total, block_rows in totals_by_block.values())
+        variance = (1 - sampled_count / block_count) * squares / (sampled_count - 1) / \
+            (sampled_count * (count / sampled_count) ** 2)
+        half_width = z * math.sqrt(variance)
+        return average, round((ratio - half_width) / scale / 100, 2), round((ratio + half_width) / scale / 100, 2)
+
+    def get_average_cost(self, block_count=None, z=1.96):
+        estimate = self.__estimate(self.__cost_by_block, block_count, z)
+        if estimate is None:
+            raise ValueError('Prescription information is not populated!')
+        return estimate
+
+    def get_average_price_by_region(self, block_count=None, z=1.96):
+        return {region: self.__estimate(totals_by_block, block_count, z, self.__price_scale)
+                for region, totals_by_block in self.__price_by_region.items()}
+
+    def get_cost_per_prescription(self, block_count=None, z=1.96):
+        estimate = self.__estimate(self.__price_by_block, block_count, z, self.__price_scale)
+        if estimate is None:
+            raise ValueError('cost_per_prescription information is not populated')
+        return estimate
+
+
+""" Number of distinct practices and BNF codes, counted with HyperLogLog sketches in fixed memory
+"""
+
+
+class DistinctCountAggregator(Aggregator):
+    def __init__(self, precision=14):
+        self.__practices = HyperLogLog(precision)
+        self.__bnf_codes = HyperLogLog(precision)
+        self.__last_practice = None
+
+    def get_record_fields(self):
+        return {'practice', 'bnf_code'}
+
+    def update(self, record):
+        """ Rows come grouped by practice, so most rows repeat the practice of the row before
+        """
+        if record.practice != self.__last_practice:
+            self.__practices.add(record.practice.strip())
+            self.__last_practice = record.practice
+        self.__bnf_codes.add(record.bnf_code.strip())
+
+    def merge(self, other):
+        self.__practices.merge(other.__practices)
+        self.__bnf_codes.merge(other.__bnf_codes)
+
+    def get_practice_count(self):
+        return self.__practices.count()
+
+    def get_bnf_code_count(self):
+        return self.__bnf_codes.count()
+
+    def get_standard_error(self):
+        return self.__practices.get_standard_error()
+
+
+""" Top spending postcodes, 'UNKNOWN' for practices without one, in fixed memory: spend is summed in a CountMinSketch
+    and the capacity postcodes with the largest estimates so far are kept as candidates.
+    Estimates only ever grow, so the smallest candidate only has to be found again when it is evicted or updated.
+"""
+
+
+class HeavySpenderAggregator(Aggregator):
+    def __init__(self, capacity=100, width=1 << 16, depth=4):
+        self.__capacity = capacity
+        self.__spend = CountMinSketch(width, depth)
+        self.__candidates = {}
+        self.__smallest = None
+
+    def get_record_fields(self):
+        return {'practice', 'act_cost'}
+
+    def update(self, record):
+        if record.act_cost is None:
+            return
+
+        postcode = record.get_postcode()
+        if postcode is None:
+            postcode = 'UNKNOWN'
+        self.__offer(postcode, self.__spend.add(postcode, record.act_cost))
+
+    def __offer(self, postcode, estimate):
+        if postcode in self.__candidates:
+            self.__candidates[postcode] = estimate
+            if postcode != self.__smallest:
+                return
+        elif len(self.__candidates) < self.__capacity:
+            self.__candidates[postcode] = estimate
+            if len(self.__candidates) < self.__capacity:
+                return
+        elif estimate > self.__candidates[self.__smallest]:
+            del self.__candidates[self.__smallest]
+            self.__candidates[postcode] = estimate
+        else:
+            return
+
+        self.__smallest = min(self.__candidates, key=self.__candidates.get)
+
+    def merge(self, other):
+        self.__spend.merge(other.__spend)
+        for postcode in set(self.__candidates) | set(other.__candidates):
+            self.__offer(postcode, self.__spend.estimate(postcode))
+
+    """ The n postcodes with the largest estimated spend, largest first, in pounds multiplied by scale
+    """
+    def get_top_spenders(self, n=5, scale=1):
+        top_spenders = heapq.nlargest(n, ((postcode, self.__spend.estimate(postcode))
+                                          for postcode in self.__candidates), key=itemgetter(1))
+        if len(top_spenders) == 0:
+            return None
+        return [(postcode, round(spend * scale / 100, 2)) for postcode, spend in top_spenders]
+
+    """ Amount in pounds, multiplied by scale, by which an estimate may exceed the spend of the rows read
+    """
+    def get_error_bound(self, scale=1):
+        return round(self.__spend.get_error_bound() * scale / 100, 2)
@@ -1,178 +1,724 @@
 from FileReader import FileReader
-import re
+from FileReader.AggregateCube import AggregateCube
+from FileReader.ColumnarCache import ColumnarCache
+from FileReader.DrugCatalogue import DrugCatalogue
+from FileReader.FixedPointParser import FixedPointParser
+from FileReader.PartitionStore import PartitionStore
+from FileReader.PrescriptionRecord import PrescriptionRecord, PrescriptionBatch, PrescriptionDictionaries
+from FileReader.PrescriptionAggregators import AverageCostAggregator, SpendByPostcodeAggregator, \
+    PriceByRegionAggregator, AntidepressantCountAggregator, SampledAverageAggregator, DistinctCountAggregator, \
+    HeavySpenderAggregator
+from operator import itemgetter
+from collections import deque
+import heapq
 import locale
+import os
+import pickle
+import shutil
+import tempfile
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 class PrescriptionFileReader(FileReader):
     def __init__(self, filename, header):
         FileReader.__init__(self, filename, header)
 
-        """ Keep track of number of locations and cost of prescriptions
-        """
-        self.__prescription_location_count = 0
-        self.__prescription_total_cost = 0.0
-
         """ Plugin a method to lookup postcode from practice code
-            Maintain a dictionary with outer postcodes as keys and actual spend as values
+            Plugin a method to lookup region from postcode
         """
         self.__postcode_lookup_method = None
-        self.__post_codes_by_actual_spend = {}
+        self.__region_lookup_method = None
 
-        """ Plugin a method to lookup region from postcode
-            Compile a regex to look for a particular prescription
-            Track the cost and prescription count nationally
+        """ Optional practice to postcode and region join, resolved once per run
         """
-        self.__region_lookup_method = None
-        self.__average_price_per_region = {}
-        self.__prescription_count_by_region = {}
-        self.__prescription_regex = re.compile(r'^Flucloxacillin\s*\w*')
-        self.__cost_per_prescription = 0
-        self.__prescription_count = 0
+        self.__practice_dimension = None
 
-        """ Keep track of various anti-depressant prescriptions
+        """ Drug categories the aggregators look for, classified once per distinct BNF NAME
         """
-        self.__antidepressant_prescriptions = 'Fluoxetine Hydrochloride Citalopram Hydrobromide Paroxetine' \
-                                              ' Hydrochloride Sertraline Hydrochloride Duloxetine Hydrochloride' \
-                                              ' Venlafaxine Mirtazapine'
-        self.__antidepressant_prescription_count_by_region = {}
+        self.__drug_catalogue = DrugCatalogue.load()
 
-    def process_file(self, row):
-        self.__calculate_average_cost(row)
-        self.__update_actual_spend_by_post_code(row)
-        self.__update_per_region_data(row)
-        if len(self.__average_price_per_region) is not 0:
-            self.__update_cost_per_prescription(row)
-        if len(self.__antidepressant_prescription_count_by_region) is not 0:
-            self.__update_antidepressant_count_by_region(row)
+        """ ITEMS are parsed to integer counts and ACT COST to integer pence, so every total is an exact sum
+        """
+        self.__items_parser = FixedPointParser(0)
+        self.__pence_parser = FixedPointParser(2)
+
+        """ Time spent decoding rows and in each aggregator, only measured once set_profiling is switched on.
+            Rows until the next one that is timed, so only one row in profile_interval pays for the clock reads.
+        """
+        self.__decode_time = None
+        self.__aggregator_times = None
+        self.__profile_interval = 100
+        self.__profile_countdown = 1
 
-    """ Q2. Increment the location count and total cost of matching prescription
+        """ Every question is answered by an aggregator, called in registration order for each decoded row
+        """
+        self.__aggregators = {}
+        self.__regions = None
+
+        """ Columns of the record fields the aggregators read, worked out again on the next row after they change
+        """
+        self.__record_columns = None
+        self.register_aggregator('average_cost', AverageCostAggregator())
+        self.register_aggregator('spend_by_postcode', SpendByPostcodeAggregator())
+        self.register_aggregator('price_by_region', PriceByRegionAggregator())
+        self.register_aggregator('antidepressant_count', AntidepressantCountAggregator())
+
+        """ Columnar copy of the file, so later runs can skip text parsing
+        """
+        self.__columnar_cache = ColumnarCache(filename + '.cache')
+        self.get_iteration_methods()['columnar_read'] = self.__columnar_read
+        self.get_iteration_methods()['columnar_batch_read'] = self.__columnar_batch_read
+
+        """ Aggregate cube of the file, so repeated and new questions can be answered without reading it again
+        """
+        self.__aggregate_cube = AggregateCube(filename + '.cube')
+
+        """ Partitions of the file by SHA and PCT, of which partitioned_read only reads those of the regions asked about
+        """
+        self.__partition_store = None
+        self.__partition_regions = None
+        self.__partition_shas = None
+        self.get_iteration_methods()['partitioned_read'] = self.__partitioned_read
+
+        """ Aggregate state is saved every checkpoint_interval rows, so a run can resume or pick up appended rows
+        """
+        self.__checkpoint_file = filename + '.checkpoint'
+        self.__checkpoint_interval = 1000000
+        self.__checkpoint_offset = 0
+        self.__checkpoint_tail = b''
+        self.get_iteration_methods()['checkpointed_read'] = self.__checkpointed_read
+
+    """ Aggregators registered after setup_region_based_dictionaries are given the regions straight away
+    """
+    def register_aggregator(self, name, aggregator):
+        self.__aggregators[name] = aggregator
+        self.__record_columns = None
+        if self.__regions is not None:
+            aggregator.set_regions(self.__regions)
+        if self.__aggregator_times is not None:
+            self.__aggregator_times.setdefault(name, 0.0)
+
+    def get_aggregator(self, name):
+        if name not in self.__aggregators:
+            raise KeyError(name + ' aggregator is not registered.')
+        return self.__aggregators[name]
+
+    def get_aggregators(self):
+        return self.__aggregators
+
+    """ Drops an aggregator whose question is not being asked, so its rows need not be read
+    """
+    def remove_aggregator(self, name):
+        self.get_aggregator(name)
+        del self.__aggregators[name]
+        self.__record_columns = None
+        if self.__aggregator_times is not None:
+            self.__aggregator_times.pop(name, None)
+
+    """ The substrings a raw line must contain for any registered aggregator to count it, combined from the row
+        filters the aggregators declare. None when some aggregator, such as spend by postcode, needs every row.
     """
-    def __calculate_average_cost(self, row):
-        if 'Peppermint Oil' in row[self.get_column_index('BNF NAME')]:
-            self.__prescription_location_count += 1
-            self.__prescription_total_cost += float(row[self.column_to_index['ACT COST']])
+    def get_row_filter(self):
+        substrings = []
+        for aggregator in self.__aggregators.values():
+            row_filter = aggregator.get_row_filter(self.__drug_catalogue)
+            if row_filter is None:
+                return None
+            substrings.extend(substring for substring in row_filter if substring not in substrings)
+        return substrings
+
+    """ Sets the combined row filter of the aggregators as the filter of the reader, so the iteration methods that
+        support filtering skip the rows no aggregator counts before splitting them. Call it again after changing
+        the aggregators or the drug catalogue.
+    """
+    def push_down_row_filter(self):
+        self.set_filter(self.get_row_filter())
 
-    def get_average_cost_of_prescription(self):
-        if self.__prescription_location_count is 0 or self.__prescription_total_cost is 0.0:
-            raise ValueError('Prescription information is not populated!')
+    def set_drug_catalogue(self, drug_catalogue):
+        self.__drug_catalogue = drug_catalogue
 
-        return round(self.__prescription_total_cost / self.__prescription_location_count, 2)
+    def get_drug_catalogue(self):
+        return self.__drug_catalogue
 
-    """ Q3. Populate a dictionary with postcodes as keys and total actual spend as values
+    """ Measures the time spent decoding rows and in each aggregator from now on.
+        Only one row in profile_interval is timed, and its times count for all profile_interval rows, so reading
+        the clock does not add to the times it measures. Batches are timed as a whole.
     """
-    def __update_actual_spend_by_post_code(self, row):
-        if self.__postcode_lookup_method is None:
-            raise ValueError('postcode_lookup_method not set.')
-        if not self.is_number(row[self.column_to_index['ACT COST']]):
-            return
+    def set_profiling(self, profiling, profile_interval=100):
+        if profile_interval < 1:
+            raise ValueError('profile_interval must be at least 1 row.')
 
-        practice_postcode = self.__postcode_lookup_method(row[self.column_to_index['PRACTICE']])
-        if practice_postcode is not None:
-            self.__post_codes_by_actual_spend.setdefault(practice_postcode, 0.0)
-            self.__post_codes_by_actual_spend[practice_postcode] += float(row[self.column_to_index['ACT COST']])
+        if profiling:
+            self.__decode_time = 0.0
+            self.__aggregator_times = {name: 0.0 for name in self.__aggregators}
         else:
-            self.__post_codes_by_actual_spend.setdefault('UNKNOWN', 0.0)
-            self.__post_codes_by_actual_spend['UNKNOWN'] += float(row[self.column_to_index['ACT COST']])
+            self.__decode_time = None
+            self.__aggregator_times = None
+        self.__profile_interval = profile_interval
+        self.__profile_countdown = 1
 
-    def set_practice_code_to_postcode_lookup(self, lookup_method):
-        self.__postcode_lookup_method = lookup_method
+    def get_decode_time(self):
+        return self.__decode_time
 
-    def get_top_5_spenders(self):
-        if len(self.__post_codes_by_actual_spend) is 0:
-            return None
+    def get_aggregator_times(self):
+        return self.__aggregator_times
+
+    """ Decodes the row once and hands the resulting record to every aggregator
+    """
+    def process_file(self, row):
+        if self.__aggregator_times is not None:
+            self.__profile_countdown -= 1
+            if self.__profile_countdown == 0:
+                self.__profile_countdown = self.__profile_interval
+                self.__process_file_profiled(row)
+                return
+
+        record = self.decode_row(row)
 
-        top_spenders = []
+        for aggregator in self.__aggregators.values():
+            aggregator.update(record)
 
-        for i in range(5):
-            index = max(self.__post_codes_by_actual_spend, key=self.__post_codes_by_actual_spend.get)
-            top_spenders.append((index, round(self.__post_codes_by_actual_spend.pop(index), 2)))
+    def __process_file_profiled(self, row):
+        start = time.perf_counter()
+        record = self.decode_row(row)
+        now = time.perf_counter()
+        self.__decode_time += (now - start) * self.__profile_interval
 
-        return top_spenders
+        for name, aggregator in self.__aggregators.items():
+            aggregator.update(record)
+            end = time.perf_counter()
+            self.__aggregator_times[name] += (end - now) * self.__profile_interval
+            now = end
 
-    """ Q4. Populate a dictionary with region as key and average prescription price as value
-            Populate a dictionary with region as key and total prescriptions as value
+    """ Decodes the fields of the row that some registered aggregator reads, leaving the others None
     """
-    def __update_per_region_data(self, row):
-        if self.__prescription_regex.search(row[self.column_to_index['BNF NAME']]) is None:
-            return
-        if self.__average_price_per_region is None:
-            raise ValueError('average_price_per_region dict not set up.')
-        if not self.is_number(row[self.column_to_index['ACT COST']]):
-            return
-        if not self.is_number(row[self.column_to_index['ITEMS']]):
+    def decode_row(self, row):
+        columns = self.__record_columns
+        if columns is None:
+            columns = self.__get_record_columns()
+        practice, bnf_code, bnf_name, items, act_cost, period, categories = columns
+
+        bnf_code = row[bnf_code] if bnf_code is not None else None
+        bnf_name = row[bnf_name] if bnf_name is not None else None
+
+        return PrescriptionRecord(row[practice] if practice is not None else None, bnf_code, bnf_name,
+                                  self.__items_parser.parse(row[items]) if items is not None else None,
+                                  self.__pence_parser.parse(row[act_cost]) if act_cost is not None else None,
+                                  self.__drug_catalogue.classify(bnf_name, bnf_code) if categories else None,
+                                  self.__postcode_lookup_method, self.__region_lookup_method,
+                                  self.__practice_dimension, row[period] if period is not None else None)
+
+    """ Column of each field of a PrescriptionRecord read straight from the row
+    """
+    __record_field_columns = (('practice', 'PRACTICE'), ('bnf_code', 'BNF CODE'), ('bnf_name', 'BNF NAME'),
+                              ('items', 'ITEMS'), ('act_cost', 'ACT COST'), ('period', 'PERIOD'))
+
+    """ Column indexes of the fields the aggregators declare, None for those none of them reads, and whether the drug
+        categories are classified. Classifying needs BNF CODE and BNF NAME, so they are read along with the categories.
+    """
+    def __get_record_columns(self):
+        fields = {'categories'}.union(field for field, column in self.__record_field_columns)
+        if all(aggregator.get_record_fields() is not None for aggregator in self.__aggregators.values()):
+            fields = set().union(*(aggregator.get_record_fields() for aggregator in self.__aggregators.values()))
+        if 'categories' in fields:
+            fields.update(('bnf_code', 'bnf_name'))
+
+        self.__record_columns = tuple(self.column_to_index[column] if field in fields else None
+                                      for field, column in self.__record_field_columns) + ('categories' in fields,)
+        return self.__record_columns
+
+    """ Vectorised equivalent of calling process_file on every row of a batch, for use with batch_read and
+        columnar_batch_read. rows is a list of split rows, which is decoded into NumPy arrays once, or a
+        PrescriptionBatch as columnar_batch_read yields it. The batch is handed to every aggregator. Requires numpy.
+    """
+    def process_batch(self, rows):
+        if numpy is None:
+            raise ImportError('process_batch requires numpy to be installed.')
+        if len(rows) == 0:
             return
 
-        postcode = self.__postcode_lookup_method(row[self.column_to_index['PRACTICE']])
+        start = time.perf_counter()
+        batch = rows if isinstance(rows, PrescriptionBatch) else self.decode_batch(rows)
 
-        if postcode is not None:
-            region = self.__region_lookup_method(postcode)
-        else:
-            region = 'UNKNOWN'
-            self.__average_price_per_region.setdefault(region, 0)
-            self.__prescription_count_by_region.setdefault(region, 0)
+        if self.__aggregator_times is None:
+            for aggregator in self.__aggregators.values():
+                aggregator.update_batch(batch)
+            return
 
-        self.__average_price_per_region[region] += \
-            float(row[self.column_to_index['ACT COST']]) / float(row[self.column_to_index['ITEMS']])
+        now = time.perf_counter()
+        self.__decode_time += now - start
+        for name, aggregator in self.__aggregators.items():
+            aggregator.update_batch(batch)
+            end = time.perf_counter()
+            self.__aggregator_times[name] += end - now
+            now = end
+
+    def decode_batch(self, rows):
+        postcode_lookup_method, region_lookup_method = self.__get_lookup_methods()
+
+        return PrescriptionBatch.from_rows([row[self.column_to_index['PRACTICE']] for row in rows],
+                                           [row[self.column_to_index['BNF CODE']] for row in rows],
+                                           [row[self.column_to_index['BNF NAME']] for row in rows],
+                                           [row[self.column_to_index['ITEMS']] for row in rows],
+                                           [row[self.column_to_index['ACT COST']] for row in rows],
+                                           self.__drug_catalogue, postcode_lookup_method, region_lookup_method)
+
+    """ Postcode and region lookups of the batch path, through the PracticeDimension when one is set
+    """
+    def __get_lookup_methods(self):
+        if self.__practice_dimension is not None:
+            return self.__practice_dimension.get_postcode_for_practice, \
+                self.__practice_dimension.get_region_from_postcode
 
-        self.__prescription_count_by_region[region] += 1
+        return self.__postcode_lookup_method, self.__region_lookup_method
+
+    def set_practice_code_to_postcode_lookup(self, lookup_method):
+        self.__postcode_lookup_method = lookup_method
 
     def set_postcode_to_region_lookup(self, lookup_method):
         self.__region_lookup_method = lookup_method
 
+    """ Resolve practices through a PracticeDimension instead of the two lookup methods
+    """
+    def set_practice_dimension(self, practice_dimension):
+        self.__practice_dimension = practice_dimension
+
+    def get_practice_dimension(self):
+        return self.__practice_dimension
+
     def setup_region_based_dictionaries(self, regions):
-        for region in regions:
-            self.__average_price_per_region.setdefault(region, 0)
-            self.__prescription_count_by_region.setdefault(region, 0)
-            self.__antidepressant_prescription_count_by_region.setdefault(region, 0)
+        self.__regions = list(regions)
+        for aggregator in self.__aggregators.values():
+            aggregator.set_regions(regions)
 
-    def get_average_price_by_region(self):
-        price_by_region_dict = {}
+    """ Q2. Average cost of a Peppermint Oil prescription
+    """
+    def get_average_cost_of_prescription(self):
+        return self.get_aggregator('average_cost').get_average()
 
-        for region in self.__average_price_per_region.keys():
-            if region not in price_by_region_dict.keys():
-                price_by_region_dict.setdefault(region, 0)
+    """ Q3. Top n postcodes by total actual spend, without modifying the aggregate
+    """
+    def get_top_spenders(self, n=5):
+        return self.__top_n(self.get_aggregator('spend_by_postcode').get_spend_by_postcode().items(), n)
 
-            try:
-                price_by_region_dict[region] = \
-                    round(self.__average_price_per_region[region] / self.__prescription_count_by_region[region], 2)
-            except ZeroDivisionError:
-                price_by_region_dict[region] = 0.0
+    def get_top_5_spenders(self):
+        return self.get_top_spenders(5)
 
-        return price_by_region_dict
+    """ Top n practices by total actual spend.
+        Spend by practice is only summed for these questions, so register a SpendByPracticeAggregator as
+        'spend_by_practice' before the file is read to ask them.
+    """
+    def get_top_spenders_by_practice(self, n=5):
+        return self.__top_n(self.get_aggregator('spend_by_practice').get_spend_by_practice().items(), n)
 
-    """ Calculate the average value of a prescription across the nation
+    """ Top n postcodes by total actual spend within each region, 'UNKNOWN' for practices without a region.
+        Practices are resolved once each, when the question is asked. Needs the 'spend_by_practice' aggregator.
     """
-    def __update_cost_per_prescription(self, row):
-        if self.__prescription_regex.search(row[self.column_to_index['BNF NAME']]) is None:
-            return
+    def get_top_spenders_by_region(self, n=5):
+        spend_by_region = {}
 
-        if self.is_number(row[self.column_to_index['ACT COST']]):
-            if not self.is_number(row[self.column_to_index['ITEMS']]):
-                return
-            self.__cost_per_prescription += \
-                float(row[self.column_to_index['ACT COST']]) / float(row[self.column_to_index['ITEMS']])
-            self.__prescription_count += 1
+        for practice, spend in self.get_aggregator('spend_by_practice').get_spend_by_practice().items():
+            postcode, region = self.__resolve_practice(practice)
+            postcodes = spend_by_region.setdefault(region if region is not None else 'UNKNOWN', {})
+            postcode = postcode if postcode is not None else 'UNKNOWN'
+            postcodes[postcode] = postcodes.get(postcode, 0) + spend
+
+        return {region: self.__top_n(postcodes.items(), n) for region, postcodes in spend_by_region.items()}
+
+    """ The postcode and region of a practice, None for whichever is not known
+    """
+    def __resolve_practice(self, practice):
+        if self.__practice_dimension is not None:
+            practice_id = self.__practice_dimension.get_practice_id(practice)
+            return self.__practice_dimension.get_postcode(practice_id), \
+                self.__practice_dimension.get_region(practice_id)
+
+        postcode = self.__postcode_lookup_method(practice)
+        if postcode is None or self.__region_lookup_method is None:
+            return postcode, None
+
+        try:
+            return postcode, self.__region_lookup_method(postcode)
+        except KeyError:
+            return postcode, None
+
+    """ Selects the n largest (key, pence) pairs with a heap, largest first, with the values in pounds
+    """
+    @staticmethod
+    def __top_n(items, n):
+        top_items = heapq.nlargest(n, items, key=itemgetter(1))
+        if len(top_items) == 0:
+            return None
+
+        return [(key, value / 100) for key, value in top_items]
+
+    """ Q4. Average price per prescription of Flucloxacillin by region and nationally
+    """
+    def get_average_price_by_region(self):
+        return self.get_aggregator('price_by_region').get_average_price_by_region()
 
     def get_cost_per_prescription(self):
-        if self.__prescription_count is 0:
-            raise ValueError('cost_per_prescription information is not populated')
-        return round(self.__cost_per_prescription / self.__prescription_count, 2)
+        return self.get_aggregator('price_by_region').get_cost_per_prescription()
+
+    """ Q5. Number of antidepressant prescriptions by region
+    """
+    def get_antidepressant_count_by_region(self):
+        return self.get_aggregator('antidepressant_count').get_count_by_region()
+
+    """ Items and spend in pounds of every BNF chapter, section, paragraph or chemical at a level,
+        as {code: (items, spend)}. The roll-up visits every row, so it is not registered by default: register a
+        BnfHierarchyAggregator as 'bnf_hierarchy' before the file is read, or ask the aggregate cube instead.
+    """
+    def get_bnf_totals(self, level, prefix=''):
+        return {code: (items, spend / 100)
+                for code, (items, spend) in self.get_aggregator('bnf_hierarchy').get_totals(level, prefix).items()}
+
+    """ Items and spend in pounds by region of one BNF code prefix, for example '0501' for all antibacterials,
+        from the 'bnf_hierarchy' aggregator
+    """
+    def get_bnf_totals_by_region(self, prefix):
+        return {region: (items, spend / 100)
+                for region, (items, spend) in self.get_aggregator('bnf_hierarchy').get_totals_by_region(prefix).items()}
+
+    """ Approximate mode: reads a random fraction of the blocks of block_size bytes of the file with sampled_read, and
+        registers aggregators that estimate the averages with confidence intervals, and distinct counts and top
+        spenders with sketches. The other aggregators only see the sampled rows; remove_aggregator saves their time.
+    """
+    def set_approximate(self, fraction, block_size=1 << 20, seed=0):
+        self.set_sample(fraction, block_size, seed)
+        self.set_iteration_method('sampled_read')
+        self.register_aggregator('sampled_average', SampledAverageAggregator())
+        self.register_aggregator('distinct_count', DistinctCountAggregator())
+        self.register_aggregator('heavy_spenders', HeavySpenderAggregator())
+
+    def start_block(self, block):
+        for aggregator in self.__aggregators.values():
+            aggregator.start_block(block)
+
+    """ Number of blocks in the file when only a sample of them is read, None when every row is read
+    """
+    def __get_sampled_block_count(self):
+        return self.get_block_count() if self.get_sample() is not None else None
+
+    """ Q2 and Q4 estimated from the sampled blocks, as (average, lower, upper) in pounds at a confidence set by z
+    """
+    def get_approximate_average_cost_of_prescription(self, z=1.96):
+        return self.get_aggregator('sampled_average').get_average_cost(self.__get_sampled_block_count(), z)
+
+    def get_approximate_average_price_by_region(self, z=1.96):
+        return self.get_aggregator('sampled_average').get_average_price_by_region(self.__get_sampled_block_count(), z)
 
-    """ Q5. Populate a dictionary with region as key and total prescriptions as value
+    def get_approximate_cost_per_prescription(self, z=1.96):
+        return self.get_aggregator('sampled_average').get_cost_per_prescription(self.__get_sampled_block_count(), z)
+
+    """ Distinct practices and BNF codes in the rows read, a lower bound for the whole file when it is sampled
     """
-    def __update_antidepressant_count_by_region(self, row):
-        prescription_name = row[self.column_to_index['BNF NAME']].rstrip()
-        if prescription_name not in self.__antidepressant_prescriptions:
+    def get_distinct_practice_count(self):
+        return self.get_aggregator('distinct_count').get_practice_count()
+
+    def get_distinct_bnf_code_count(self):
+        return self.get_aggregator('distinct_count').get_bnf_code_count()
+
+    """ Top n postcodes by estimated spend in pounds, scaled up from the sampled blocks to the whole file
+    """
+    def get_approximate_top_spenders(self, n=5):
+        block_count = self.__get_sampled_block_count()
+        scale = block_count / len(self.get_sampled_blocks()) if block_count else 1
+        return self.get_aggregator('heavy_spenders').get_top_spenders(n, scale)
+
+    """ Types of the numeric columns in the columnar cache, every other column is dictionary-encoded.
+        ITEMS are stored as counts, NIC and ACT COST in pence.
+    """
+    __numeric_columns = {'ITEMS': 'q', 'NIC': 'q', 'ACT COST': 'q'}
+
+    def set_cache_directory(self, directory):
+        self.__columnar_cache = ColumnarCache(directory)
+
+    def get_columnar_cache(self):
+        return self.__columnar_cache
+
+    """ Converts the prescription file into the columnar cache, unless the cache is already up to date
+    """
+    def build_columnar_cache(self):
+        signature = self.get_source_signature()
+        if self.__columnar_cache.is_valid(signature, self.__numeric_columns):
             return
 
-        postcode = self.__postcode_lookup_method(row[self.column_to_index['PRACTICE']])
-        if postcode is not None:
-            region = self.__region_lookup_method(postcode)
+        columns = sorted(self.column_to_index, key=self.column_to_index.get)
+        converters = {'ITEMS': self.__items_parser.parse, 'NIC': self.__pence_parser.parse,
+                      'ACT COST': self.__pence_parser.parse}
+        with self.open_file('rt') as f:
+            self.__columnar_cache.build(f, columns, self.__numeric_columns, signature, self.get_header() is None,
+                                        converters)
 
-            self.__antidepressant_prescription_count_by_region[region] += int(row[self.column_to_index['ITEMS']])
+    """ Reads the prescriptions back from the memory-mapped columnar cache, building it on first use.
+        Returns each row as a tuple with ITEMS, NIC and ACT COST already converted to counts and pence.
+        The rows are added to the line count as the read finishes.
+    """
+    def __columnar_read(self):
+        self.build_columnar_cache()
+        row_count = 0
 
-    def get_antidepressant_count_by_region(self):
-        return self.__antidepressant_prescription_count_by_region
+        try:
+            for row_count, row in enumerate(self.__columnar_cache.read_rows(), 1):
+                yield row
+        finally:
+            self.increment_line_count(row_count)
+
+    """ Reads the columnar cache like columnar_read, but yields a PrescriptionBatch of up to batch_size rows at a
+        time for process_batch, straight from the encoded columns. Every batch shares the dictionaries of the cache,
+        so each practice, BNF CODE and BNF NAME is resolved once per read. Requires numpy.
+    """
+    def __columnar_batch_read(self):
+        if numpy is None:
+            raise ImportError('columnar_batch_read requires numpy to be installed.')
+
+        self.build_columnar_cache()
+        columns = self.__columnar_cache.get_dictionaries()
+        postcode_lookup_method, region_lookup_method = self.__get_lookup_methods()
+        dictionaries = PrescriptionDictionaries(columns['PRACTICE'], columns['BNF CODE'], columns['BNF NAME'],
+                                                self.__drug_catalogue, postcode_lookup_method, region_lookup_method)
+        indexes = [self.column_to_index[column] for column in ['PRACTICE', 'BNF CODE', 'BNF NAME', 'ITEMS', 'ACT COST']]
+
+        for block in self.__columnar_cache.read_columns(self.get_batch_size()):
+            practice_codes, code_codes, name_codes, items, act_costs = \
+                [numpy.frombuffer(block[index], dtype=block[index].typecode) for index in indexes]
+            valid = numpy.ones(len(items), dtype=bool)
+            self.increment_line_count(len(items))
+            yield PrescriptionBatch(dictionaries, practice_codes, code_codes, name_codes, items, valid, act_costs,
+                                    valid)
+
+    def set_cube_file(self, cube_file):
+        self.__aggregate_cube = AggregateCube(cube_file)
+
+    def get_aggregate_cube(self):
+        return self.__aggregate_cube
+
+    """ Builds the aggregate cube from the file in one pass unless it is up to date, and returns it
+    """
+    def build_aggregate_cube(self, block_size=1000000):
+        signature = self.get_source_signature()
+        if not self.__aggregate_cube.is_valid(signature):
+            with self.open_file('rt') as f:
+                if self.get_header() is None:
+                    next(f, None)
+                self.__aggregate_cube.build(self.__cube_rows(f), signature, block_size)
+        return self.__aggregate_cube
+
+    def __cube_rows(self, lines):
+        indices = [self.get_column_index(column) for column in ['PRACTICE', 'BNF CODE', 'BNF NAME', 'PERIOD',
+                                                                 'ITEMS', 'NIC', 'ACT COST']]
+        column_count = len(self.column_to_index)
+
+        for line in lines:
+            fields = line.rstrip('\n').split(',')
+            if len(fields) != column_count:
+                yield None
+                continue
+
+            practice, bnf_code, bnf_name, period, items, nic, act_cost = [fields[index] for index in indices]
+            yield (practice, bnf_code, bnf_name, period, self.__items_parser.parse(items),
+                   self.__pence_parser.parse(nic), self.__pence_parser.parse(act_cost))
+
+    """ Splits the file into a PartitionStore in directory unless it already holds an up to date split, and reads
+        from it with partitioned_read
+    """
+    def build_partitions(self, directory):
+        partition_store = PartitionStore(directory)
+        if not partition_store.is_valid(self.get_source_signature()):
+            partition_store.partition(self)
+        self.__partition_store = partition_store
+        return partition_store
+
+    def set_partition_store(self, partition_store):
+        self.__partition_store = partition_store
+
+    def get_partition_store(self):
+        return self.__partition_store
+
+    """ Only read the partitions with a practice in one of regions, 'UNKNOWN' for practices without a region, and
+        optionally only those of some SHAs. None reads every partition.
+        The answers for those regions are complete, national answers and other regions only cover the partitions read.
+    """
+    def set_partition_regions(self, regions, shas=None):
+        self.__partition_regions = list(regions) if regions is not None else None
+        self.__partition_shas = set(shas) if shas is not None else None
+
+    def get_selected_partitions(self):
+        if self.__partition_store is None:
+            raise ValueError('set_partition_store must be called before using partitioned_read.')
+        if not self.__partition_store.is_valid(self.get_source_signature()):
+            raise ValueError('The partitions in ' + self.__partition_store.get_directory() +
+                             ' are not of the current ' + self.get_filename() + '.')
+
+        return self.__partition_store.select(self.__partition_regions, lambda practice:
+                                             self.__resolve_practice(practice)[1], self.__partition_shas)
+
+    """ Reads the rows of the selected partitions, one partition after the other, without their header lines
+    """
+    def __partitioned_read(self):
+        filter_expressions = self.get_filter_expressions()
+
+        for partition in self.get_selected_partitions():
+            with open(self.__partition_store.get_partition_file(partition), 'rt') as f:
+                if self.__partition_store.has_header():
+                    next(f, None)
+
+                for line in f:
+                    self.increment_line_count()
+                    if filter_expressions is not None and not self.contains_any(line, filter_expressions):
+                        continue
+                    yield line.split(',')
+
+    """ Number of bytes before the checkpoint offset that must be unchanged for the checkpoint to be reused
+    """
+    __checkpoint_tail_size = 4096
+
+    """ Changed whenever the aggregate state changes shape, so older checkpoints are not resumed
+    """
+    __checkpoint_version = 3
+
+    def set_checkpoint_file(self, checkpoint_file):
+        self.__checkpoint_file = checkpoint_file
+
+    def get_checkpoint_file(self):
+        return self.__checkpoint_file
+
+    def set_checkpoint_interval(self, checkpoint_interval):
+        if checkpoint_interval < 1:
+            raise ValueError('checkpoint_interval must be at least 1 row.')
+        self.__checkpoint_interval = checkpoint_interval
+
+    def get_checkpoint_interval(self):
+        return self.__checkpoint_interval
+
+    def get_checkpoint_offset(self):
+        return self.__checkpoint_offset
+
+    """ Restores the aggregates, line count and byte offset of the last checkpoint, so that checkpointed_read only
+        reads what follows it: the rest of an interrupted run, or the rows appended since the previous run.
+        The checkpoint is only used if the bytes just before its offset are unchanged and the same aggregators are
+        registered. Returns True if the checkpoint was used, False if the file has to be processed from the start.
+    """
+    def load_checkpoint(self):
+        if not os.path.isfile(self.__checkpoint_file):
+            return False
+
+        with open(self.__checkpoint_file, 'rb') as f:
+            try:
+                checkpoint = pickle.load(f)
+            except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+                return False
+
+        if not isinstance(checkpoint, dict) or checkpoint.get('version') != self.__checkpoint_version:
+            return False
+
+        offset = checkpoint['offset']
+        if checkpoint['tail'] != self.__read_tail(offset, len(checkpoint['tail'])):
+            return False
+        if checkpoint['aggregators'].keys() != self.__aggregators.keys():
+            return False
+
+        self.__aggregators = {name: aggregator.detach() for name, aggregator in checkpoint['aggregators'].items()}
+        self.__record_columns = None
+        self.increment_line_count(checkpoint['line_count'] - self.get_line_count())
+        self.__checkpoint_offset = offset
+        self.__checkpoint_tail = checkpoint['tail']
+        return True
+
+    """ Pickles the aggregates and line count, tagged with the byte offset up to which they have processed the file.
+        tail holds the bytes just before offset, when the caller has them, so compressed files are not re-read.
+        Files the aggregates refer to, such as spilled runs, are linked into a directory of the checkpoint's own under
+        <checkpoint file>.files, and those of the checkpoint it replaces are removed once it is written.
+    """
+    def save_checkpoint(self, offset, tail=None):
+        if tail is None:
+            tail = self.__read_tail(offset, self.__checkpoint_tail_size)
+
+        files_directory = self.__checkpoint_file + '.files'
+        os.makedirs(files_directory, exist_ok=True)
+        checkpoint_files = tempfile.mkdtemp(dir=files_directory)
+
+        checkpoint = {'version': self.__checkpoint_version, 'offset': offset,
+                      'tail': tail[-self.__checkpoint_tail_size:], 'line_count': self.get_line_count(),
+                      'aggregators': {name: aggregator.detach(checkpoint_files)
+                                      for name, aggregator in self.__aggregators.items()}}
+        temporary_file = self.__checkpoint_file + '.tmp'
+
+        with open(temporary_file, 'wb') as f:
+            pickle.dump(checkpoint, f, pickle.HIGHEST_PROTOCOL)
+
+        os.replace(temporary_file, self.__checkpoint_file)
+        for name in os.listdir(files_directory):
+            if os.path.join(files_directory, name) != checkpoint_files:
+                shutil.rmtree(os.path.join(files_directory, name), ignore_errors=True)
+        if not os.listdir(checkpoint_files):
+            shutil.rmtree(files_directory, ignore_errors=True)
+        self.__checkpoint_offset = offset
+        self.__checkpoint_tail = checkpoint['tail']
+
+    def __read_tail(self, offset, size):
+        start = max(offset - size, 0)
+        with self.open_file('rb', start) as f:
+            return f.read(offset - start)
+
+    """ Reads the file like lazy_sequential_read, starting at the checkpoint offset.
+        Once every checkpoint_interval rows have been processed, and at the end of the file, a checkpoint is saved.
+        A row is only counted in a checkpoint once the next row has been requested, that is after process_file.
+        Blank lines are skipped, so rows can be appended to a file that does not end with a newline, and so are
+        the lines without any of the filter expressions when a filter is set.
+    """
+    def __checkpointed_read(self):
+        encoding = locale.getpreferredencoding(False)
+        offset = self.__checkpoint_offset
+        rows = 0
+
+        expressions = None
+        if self.get_filter_expressions() is not None:
+            expressions = [expression.encode(encoding) for expression in self.get_filter_expressions()]
+
+        """ The last lines read, holding at least the checkpoint tail size in bytes
+        """
+        recent_lines = deque([self.__checkpoint_tail])
+        recent_size = len(self.__checkpoint_tail)
+
+        with self.open_file('rb', offset) as f:
+            for line in f:
+                if line.strip():
+                    self.increment_line_count()
+                    if expressions is None or self.contains_any(line, expressions):
+                        yield line.decode(encoding).split(',')
+                    rows += 1
+
+                offset += len(line)
+                recent_lines.append(line)
+                recent_size += len(line)
+                while recent_size - len(recent_lines[0]) >= self.__checkpoint_tail_size:
+                    recent_size -= len(recent_lines.popleft())
+
+                if rows == self.__checkpoint_interval:
+                    self.save_checkpoint(offset, b''.join(recent_lines))
+                    rows = 0
+
+        self.save_checkpoint(offset, b''.join(recent_lines))
+
+    """ Combines the aggregates of a reader that processed a later part of the file
+    """
+    def merge(self, other):
+        FileReader.merge(self, other)
+
+        for name, aggregator in self.__aggregators.items():
+            aggregator.merge(other.__aggregators[name])
+
+        if self.__aggregator_times is not None and other.__aggregator_times is not None:
+            self.__decode_time += other.__decode_time
+            for name, seconds in other.__aggregator_times.items():
+                self.__aggregator_times[name] = self.__aggregator_times.get(name, 0.0) + seconds
 
     """ Utility Method to determine if the supplied string is a float value
     """
@@ -198,18 +744,20 @@ class PrescriptionFileReader(FileReader):
         locale.setlocale(locale.LC_ALL, '')
         f = open(self.get_output_file(), 'a')
         f.write('Average cost of Peppermint Oil: £' + str(
-            self.format_as_currency(round(self.get_average_cost_of_prescription(), 2))) + '\n')
+            self.format_as_currency(self.get_average_cost_of_prescription())) + '\n')
 
         f.write('\nTop 5 postcodes by Actual Spend:\n')
-        for row in self.get_top_5_spenders():
-            f.write('Postcode ' + str(row[0]) + ' spent £' + self.format_as_currency((round(row[1], 2))) + '\n')
+        for row in self.get_top_5_spenders() or []:
+            f.write('Postcode ' + str(row[0]) + ' spent £' + self.format_as_currency(row[1]) + '\n')
 
         f.write('\nSpending per prescription of Flucloxacillin by region:\n')
-        national_mean = round(self.get_cost_per_prescription(), 2)
+        national_mean = self.get_cost_per_prescription()
         for key, value in self.get_average_price_by_region().items():
             f.write('The average cost in the ' + str(key) + ' region was £')
-            f.write(str(self.format_as_currency(round(value, 2))) + ';')
-            difference = round(national_mean - round(value, 2), 2)
+            f.write(str(self.format_as_currency(value)) + ';')
+            """ Both are already rounded to pence, so the difference is taken in whole pence
+            """
+            difference = (round(national_mean * 100) - round(value * 100)) / 100
             f.write(' this was £' + str(self.format_as_currency(abs(difference))))
             if difference > 0:
                 f.write(' less than ')
@@ -217,7 +765,7 @@ class PrescriptionFileReader(FileReader):
                 f.write(' greater than ')
             f.write('the national mean.\n')
 
-        f.write('\nNational Mean: £' + str(self.format_as_currency(round(self.get_cost_per_prescription(), 2))) + '\n')
+        f.write('\nNational Mean: £' + str(self.format_as_currency(national_mean)) + '\n')
 
         f.write('\nAntidepressant prescriptions by region:\n')
         for key, value in self.get_antidepressant_count_by_region().items():
@@ -0,0 +1,257 @@
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+""" PrescriptionRecord class
+    One prescription row, decoded once and shared by every aggregator.
+    items is an integer count and act_cost an integer number of pence, None when the field is not a number.
+    categories holds the drug categories of the row, as classified by a DrugCatalogue, and period the raw PERIOD field.
+    Fields no registered aggregator reads are not decoded and left None, see Aggregator.get_record_fields.
+    With a PracticeDimension only the integer id of the practice is looked up up front, and the postcode and region
+    are read from the dimension under that id when asked for, so rows no aggregator needs them for never look them up.
+    Otherwise the postcode and region are looked up on first use and remembered, so each row is resolved at most once.
+    A postcode the region lookup raises KeyError for has no region, which is remembered as well.
+"""
+
+
+class PrescriptionRecord:
+    __slots__ = ('practice', 'bnf_code', 'bnf_name', 'items', 'act_cost', 'categories', 'period', 'practice_id',
+                 '__practice_dimension', '__postcode_lookup', '__region_lookup', '__postcode', '__postcode_resolved',
+                 '__region', '__region_resolved')
+
+    def __init__(self, practice, bnf_code, bnf_name, items, act_cost, categories, postcode_lookup, region_lookup,
+                 practice_dimension=None, period=None):
+        self.practice = practice
+        self.bnf_code = bnf_code
+        self.bnf_name = bnf_name
+        self.items = items
+        self.act_cost = act_cost
+        self.categories = categories
+        self.period = period
+
+        self.__practice_dimension = practice_dimension
+        if practice_dimension is None:
+            self.practice_id = None
+            self.__postcode_lookup = postcode_lookup
+            self.__region_lookup = region_lookup
+            self.__postcode_resolved = False
+            self.__region_resolved = False
+        else:
+            self.practice_id = practice_dimension.get_practice_id(practice)
+
+    def get_postcode(self):
+        if self.__practice_dimension is not None:
+            return self.__practice_dimension.get_postcode(self.practice_id)
+
+        if not self.__postcode_resolved:
+            if self.__postcode_lookup is None:
+                raise ValueError('postcode_lookup_method not set.')
+            self.__postcode = self.__postcode_lookup(self.practice)
+            self.__postcode_resolved = True
+
+        return self.__postcode
+
+    """ Region of the practice, or None if the practice has no known postcode or its postcode no known region
+    """
+    def get_region(self):
+        if self.__practice_dimension is not None:
+            return self.__practice_dimension.get_region(self.practice_id)
+
+        if not self.__region_resolved:
+            postcode = self.get_postcode()
+            try:
+                self.__region = self.__region_lookup(postcode) if postcode is not None else None
+            except KeyError:
+                self.__region = None
+            self.__region_resolved = True
+
+        return self.__region
+
+    """ Utility method to convert a field to a float, None if it is not a number
+    """
+    @staticmethod
+    def to_number(string):
+        try:
+            return float(string)
+        except (TypeError, ValueError):
+            return None
+
+
+""" PrescriptionDictionaries class
+    The distinct PRACTICE, BNF CODE and BNF NAME values the rows of a PrescriptionBatch are encoded against.
+    Postcodes are looked up once per practice, and regions and drug category masks on first use and then remembered,
+    so every batch of a columnar read, which share the dictionaries of the cache, resolves each value once per read.
+    A postcode the region lookup raises KeyError for has no region, as for PrescriptionRecord.
+"""
+
+
+class PrescriptionDictionaries:
+    def __init__(self, practices, bnf_codes, bnf_names, drug_catalogue, postcode_lookup, region_lookup):
+        if postcode_lookup is None:
+            raise ValueError('postcode_lookup_method not set.')
+
+        self.practices = practices
+        self.bnf_codes = bnf_codes
+        self.names = bnf_names
+        self.postcodes = [postcode_lookup(practice) for practice in practices]
+
+        self.__drug_catalogue = drug_catalogue
+        self.__region_lookup = region_lookup
+        self.__regions = {}
+        self.__category_masks = {}
+
+    """ Region of the practice with the given code, or None if it has no known postcode or region
+    """
+    def get_region(self, practice):
+        if practice not in self.__regions:
+            postcode = self.postcodes[practice]
+            try:
+                self.__regions[practice] = self.__region_lookup(postcode) if postcode is not None else None
+            except KeyError:
+                self.__regions[practice] = None
+
+        return self.__regions[practice]
+
+    """ Masks of the distinct BNF NAMEs, and BNF CODEs if the catalogue uses them (None otherwise), in a drug category
+    """
+    def get_category_masks(self, category):
+        if category not in self.__category_masks:
+            name_mask = numpy.array([category in self.__drug_catalogue.classify_name(name) for name in self.names],
+                                    dtype=bool)
+            code_mask = None
+            if self.__drug_catalogue.uses_bnf_codes():
+                code_mask = numpy.array([category in self.__drug_catalogue.classify_code(code)
+                                         for code in self.bnf_codes], dtype=bool)
+            self.__category_masks[category] = name_mask, code_mask
+
+        return self.__category_masks[category]
+
+
+""" PrescriptionBatch class
+    A block of prescription rows decoded into NumPy arrays, for aggregators that work a batch at a time.
+    PRACTICE, BNF CODE and BNF NAME are integer codes into the PrescriptionDictionaries of the batch, so
+    classification and lookups run once per distinct value. ITEMS and ACT COST are int64 arrays of counts and pence,
+    exactly as PrescriptionRecord holds them. Numbers that fail to parse are 0 and masked out by valid_costs,
+    valid_items and valid_rows. first_rows holds the first row of every practice, len(batch) for those not in it.
+"""
+
+
+class PrescriptionBatch:
+    def __init__(self, dictionaries, practice_codes, code_codes, name_codes, items, valid_items, act_costs,
+                 valid_costs):
+        self.practices = dictionaries.practices
+        self.postcodes = dictionaries.postcodes
+        self.bnf_codes = dictionaries.bnf_codes
+        self.names = dictionaries.names
+        self.practice_codes = practice_codes
+        self.code_codes = code_codes
+        self.name_codes = name_codes
+        self.items, self.valid_items = items, valid_items
+        self.act_costs, self.valid_costs = act_costs, valid_costs
+        self.valid_rows = valid_costs & valid_items
+
+        used_practices, first_rows = numpy.unique(practice_codes, return_index=True)
+        self.first_rows = numpy.full(len(self.practices), len(practice_codes), dtype=numpy.intp)
+        self.first_rows[used_practices] = first_rows
+
+        self.__dictionaries = dictionaries
+
+    """ Decodes columns of strings, as split from the text file, encoding each string column in order of first
+        appearance
+    """
+    @staticmethod
+    def from_rows(practices, bnf_codes, bnf_names, items, act_costs, drug_catalogue, postcode_lookup,
+                  region_lookup):
+        practices, practice_codes = PrescriptionBatch.encode(practices)
+        bnf_codes, code_codes = PrescriptionBatch.encode(bnf_codes)
+        bnf_names, name_codes = PrescriptionBatch.encode(bnf_names)
+        dictionaries = PrescriptionDictionaries(practices, bnf_codes, bnf_names, drug_catalogue, postcode_lookup,
+                                                region_lookup)
+
+        return PrescriptionBatch(dictionaries, practice_codes, code_codes, name_codes,
+                                 *PrescriptionBatch.to_fixed_point(items, 0),
+                                 *PrescriptionBatch.to_fixed_point(act_costs, 2))
+
+    def __len__(self):
+        return len(self.name_codes)
+
+    """ Row mask of the rows whose BNF NAME satisfies predicate, evaluated once per distinct name
+    """
+    def match_names(self, predicate):
+        return numpy.array([predicate(name) for name in self.names], dtype=bool)[self.name_codes]
+
+    """ Row mask of the rows in a drug category, classified once per distinct BNF NAME and BNF CODE
+    """
+    def match_category(self, category):
+        name_mask, code_mask = self.__dictionaries.get_category_masks(category)
+        if code_mask is None:
+            return name_mask[self.name_codes]
+
+        return name_mask[self.name_codes] | code_mask[self.code_codes]
+
+    """ Encodes the postcode of every row, with 'UNKNOWN' for practices without one.
+        Returns a dict of postcode to code, in the order the postcodes first appear, and the code of every row.
+    """
+    def encode_postcodes(self):
+        keys = {}
+        practice_postcodes = numpy.empty(len(self.practices), dtype=numpy.intp)
+        for practice in numpy.argsort(self.first_rows, kind='stable').tolist():
+            postcode = self.postcodes[practice] if self.postcodes[practice] is not None else 'UNKNOWN'
+            practice_postcodes[practice] = keys.setdefault(postcode, len(keys))
+
+        return keys, practice_postcodes[self.practice_codes]
+
+    """ Looks up the region of every practice used by the rows in mask.
+        Practices without a postcode or region get unknown_region, or are dropped when it is None.
+        Returns a dict of region to code, the region code of every row and the mask narrowed to rows with a region.
+    """
+    def encode_regions(self, mask, unknown_region):
+        regions = {}
+        practice_regions = numpy.full(len(self.practices), -1, dtype=numpy.intp)
+
+        for practice in numpy.unique(self.practice_codes[mask]).tolist():
+            region = self.__dictionaries.get_region(practice)
+            if region is None:
+                if unknown_region is None:
+                    continue
+                region = unknown_region
+            practice_regions[practice] = regions.setdefault(region, len(regions))
+
+        row_regions = practice_regions[self.practice_codes]
+        return regions, row_regions, mask & (row_regions >= 0)
+
+    """ Encodes a column of strings as a list of its distinct values, in order of first appearance, and the code of
+        every value
+    """
+    @staticmethod
+    def encode(values):
+        distinct = {}
+        codes = numpy.array([distinct.setdefault(value, len(distinct)) for value in values], dtype=numpy.intp)
+        return list(distinct), codes
+
+    """ Converts a column of strings to floats in one step, using NaN for any value that is not a number
+    """
+    @staticmethod
+    def to_numbers(values):
+        try:
+            return numpy.array(values).astype(numpy.float64)
+        except ValueError:
+            return numpy.array([PrescriptionRecord.to_number(value) for value in values], dtype=numpy.float64)
+
+    """ Converts a column of strings to integers scaled by 10 ** places, and a mask of the values that are numbers.
+        Values with up to places decimals and below 2 ** 53 in total are exact in float64, so they round back exactly.
+    """
+    @staticmethod
+    def to_fixed_point(values, places):
+        numbers = PrescriptionBatch.to_numbers(values)
+        valid = ~numpy.isnan(numbers)
+        return numpy.rint(numpy.where(valid, numbers, 0.0) * 10 ** places).astype(numpy.int64), valid
+
+    """ Exact int64 totals of values grouped by keys in range(size), where bincount would sum in float64
+    """
+    @staticmethod
+    def sum_by(keys, values, size):
+        totals = numpy.zeros(size, dtype=numpy.int64)
+        numpy.add.at(totals, keys, values)
+        return totals
@@ -0,0 +1,89 @@
+from contextlib import contextmanager
+import os
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+""" Profiler class
+    Measures the wall time and CPU time of the stages of a run, and the throughput of the rows read in a stage.
+    Where the platform has it, the peak resident set size of the process so far is recorded at the end of every stage,
+    as cumulative_peak_rss_bytes, along with how much the stage raised it, as peak_rss_growth_bytes. The operating
+    system only keeps the peak of the whole process, so a stage that stays below an earlier peak shows no growth.
+    With trace_memory the peak memory allocated by Python during each stage is recorded too. It is traced with
+    tracemalloc, which slows Python down several times over, so timings taken alongside it are not representative.
+    Stages measured in other processes can be folded in with add_stages.
+    Attributes: trace_memory - Record the peak traced memory of every stage
+"""
+
+
+class Profiler:
+    def __init__(self, trace_memory=False):
+        self.__trace_memory = trace_memory
+        self.__stages = {}
+        self.__start_time = time.perf_counter()
+
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    """ Measures the body of a with statement as the stage name
+    """
+    @contextmanager
+    def stage(self, name):
+        if self.__trace_memory:
+            tracemalloc.reset_peak()
+        peak_rss_start = self.get_peak_rss() if resource is not None else None
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+
+        try:
+            yield
+        finally:
+            measurement = {'wall_seconds': time.perf_counter() - wall_start,
+                           'cpu_seconds': time.process_time() - cpu_start}
+            if resource is not None:
+                measurement['cumulative_peak_rss_bytes'] = self.get_peak_rss()
+                measurement['peak_rss_growth_bytes'] = measurement['cumulative_peak_rss_bytes'] - peak_rss_start
+            if self.__trace_memory:
+                measurement['peak_memory_bytes'] = tracemalloc.get_traced_memory()[1]
+            self.__stages[name] = measurement
+
+    """ Adds the number of rows and bytes read during a stage, with the resulting rates
+    """
+    def add_throughput(self, name, rows, size):
+        measurement = self.__stages[name]
+        wall_seconds = measurement['wall_seconds']
+        measurement['rows'] = rows
+        measurement['bytes'] = size
+        measurement['rows_per_second'] = rows / wall_seconds if wall_seconds > 0 else None
+        measurement['mb_per_second'] = size / 1e6 / wall_seconds if wall_seconds > 0 else None
+
+    """ Adds the rows a FileReader has read during a stage and the size of its file on disk
+    """
+    def count_reader(self, name, reader):
+        self.add_throughput(name, reader.get_line_count(), os.path.getsize(reader.get_filename()))
+
+    def add_stages(self, stages):
+        self.__stages.update(stages)
+
+    def get_stages(self):
+        return self.__stages
+
+    def get_stage(self, name):
+        if name not in self.__stages:
+            raise KeyError(name + ' stage has not been measured.')
+        return self.__stages[name]
+
+    """ Peak resident set size of this process in bytes, ru_maxrss is in kilobytes except on macOS
+    """
+    @staticmethod
+    def get_peak_rss():
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak_rss if sys.platform == 'darwin' else peak_rss * 1024
+
+    def get_wall_time(self):
+        return time.perf_counter() - self.__start_time
@@ -0,0 +1,178 @@
+from operator import itemgetter
+import heapq
+import os
+import pickle
+import shutil
+import tempfile
+
+""" SpillingTotals class
+    Sums tuples of integers by key within a memory budget, for group-bys with more keys than fit in memory.
+    Totals are kept in a dictionary until it holds max_keys keys. The dictionary is then sorted by key and spilled to a
+    run file, and emptied. items() merges the runs and what is left in memory with heapq.merge, adding up the totals of
+    a key that was spilled more than once, so memory stays bounded by max_keys however many keys there are. Keys must be
+    mutually orderable, such as tuples of strings.
+    At most fan_in runs are open at once: when there are more, the oldest fan_in runs are first merged into one, until
+    few enough are left, so the number of open files stays bounded however many times the totals were spilled.
+    Run files are written to a temporary directory of their own, created inside directory on the first spill, which
+    close() removes along with anything an interrupted or resumed run left in it. They are named files, so totals can
+    be pickled to and from worker processes. A pickle only holds the paths of the run files, so totals that outlive
+    this object, such as in a checkpoint, are pickled from a copy() with run files of its own.
+    Attributes: width     - Number of totals kept per key
+                max_keys  - Number of keys held in memory before they are spilled
+                directory - Directory to create the run directory in, the system temporary directory by default
+                fan_in    - Number of runs merged at a time
+"""
+
+
+class SpillingTotals:
+    __block_size = 10000
+
+    def __init__(self, width, max_keys=1000000, directory=None, fan_in=64):
+        if max_keys < 1:
+            raise ValueError('max_keys must be at least 1.')
+        if fan_in < 2:
+            raise ValueError('fan_in must be at least 2.')
+
+        self.__width = width
+        self.__max_keys = max_keys
+        self.__directory = directory
+        self.__fan_in = fan_in
+        self.__run_directory = None
+        self.__totals = {}
+        self.__run_files = []
+
+    def get_max_keys(self):
+        return self.__max_keys
+
+    def get_run_files(self):
+        return self.__run_files
+
+    """ Directory of the run files, None until the totals are first spilled
+    """
+    def get_run_directory(self):
+        return self.__run_directory
+
+    def add(self, key, values):
+        totals = self.__totals.get(key)
+        if totals is None:
+            if len(self.__totals) == self.__max_keys:
+                self.spill()
+            totals = self.__totals[key] = [0] * self.__width
+
+        for index, value in enumerate(values):
+            totals[index] += value
+
+    """ Writes the totals held in memory to a new run file, sorted by key
+    """
+    def spill(self):
+        if not self.__totals:
+            return
+
+        self.__write_run(sorted(self.__totals.items(), key=itemgetter(0)))
+        self.__totals = {}
+
+    def __make_run_directory(self, parent):
+        if self.__run_directory is None or not os.path.isdir(self.__run_directory):
+            if parent is not None:
+                os.makedirs(parent, exist_ok=True)
+            self.__run_directory = tempfile.mkdtemp(prefix='spill-', dir=parent)
+
+        return self.__run_directory
+
+    """ Writes (key, totals) pairs in key order to a new run file, in blocks of pickled pairs
+    """
+    def __write_run(self, items):
+        descriptor, run_file = tempfile.mkstemp(suffix='.run', dir=self.__make_run_directory(self.__directory))
+        with os.fdopen(descriptor, 'wb') as f:
+            block = []
+            for item in items:
+                block.append(item)
+                if len(block) == self.__block_size:
+                    pickle.dump(block, f, pickle.HIGHEST_PROTOCOL)
+                    block = []
+            if block:
+                pickle.dump(block, f, pickle.HIGHEST_PROTOCOL)
+
+        self.__run_files.append(run_file)
+
+    @staticmethod
+    def __read_run(run_file):
+        with open(run_file, 'rb') as f:
+            while True:
+                try:
+                    block = pickle.load(f)
+                except EOFError:
+                    return
+                yield from block
+
+    """ Merges runs of (key, totals) pairs in key order, adding up the totals of equal keys
+    """
+    @staticmethod
+    def __merge_runs(runs):
+        current_key = None
+        current_totals = None
+        for key, totals in heapq.merge(*runs, key=itemgetter(0)):
+            if current_totals is not None and key == current_key:
+                for index, value in enumerate(totals):
+                    current_totals[index] += value
+                continue
+
+            if current_totals is not None:
+                yield current_key, tuple(current_totals)
+            current_key, current_totals = key, list(totals)
+
+        if current_totals is not None:
+            yield current_key, tuple(current_totals)
+
+    """ Merges the oldest fan_in runs into one until at most fan_in runs are left, leaving room for the totals in memory
+    """
+    def __reduce_runs(self):
+        while len(self.__run_files) >= self.__fan_in:
+            run_files = self.__run_files[:self.__fan_in]
+            self.__run_files = self.__run_files[self.__fan_in:]
+            self.__write_run(self.__merge_runs([self.__read_run(run_file) for run_file in run_files]))
+            for run_file in run_files:
+                os.remove(run_file)
+
+    """ Every key with its totals as a tuple, in key order
+    """
+    def items(self):
+        self.__reduce_runs()
+        runs = [self.__read_run(run_file) for run_file in self.__run_files]
+        runs.append(iter(sorted(self.__totals.items(), key=itemgetter(0))))
+        return self.__merge_runs(runs)
+
+    """ Adds every total of other, spilling as needed, and closes other
+    """
+    def merge(self, other):
+        for key, totals in other.items():
+            self.add(key, totals)
+        other.close()
+
+    """ Copy of the totals that shares no run files with them: every run file is hard-linked, or copied where that
+        fails, into a new run directory inside parent, or inside directory by default. Reducing or closing either
+        one leaves the runs of the other in place.
+    """
+    def copy(self, parent=None):
+        copy = SpillingTotals(self.__width, self.__max_keys, self.__directory, self.__fan_in)
+        copy.__totals = {key: list(totals) for key, totals in self.__totals.items()}
+
+        for run_file in self.__run_files:
+            copy_file = os.path.join(copy.__make_run_directory(parent if parent is not None else self.__directory),
+                                     os.path.basename(run_file))
+            try:
+                os.link(run_file, copy_file)
+            except OSError:
+                shutil.copyfile(run_file, copy_file)
+            copy.__run_files.append(copy_file)
+
+        return copy
+
+    """ Removes the run directory with every run file in it
+    """
+    def close(self):
+        if self.__run_directory is not None:
+            shutil.rmtree(self.__run_directory, ignore_errors=True)
+        self.__run_directory = None
+        self.__run_files = []
+        self.__totals = {}
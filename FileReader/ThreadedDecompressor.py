@@ -0,0 +1,94 @@
+import bz2
+import gzip
+import io
+import lzma
+import queue
+import threading
+
+""" ThreadedDecompressor class
+    A raw binary stream over a .gz, .bz2 or .xz file that is decompressed in a background thread.
+    Decompressed blocks are handed over through a bounded queue, so decompression overlaps with parsing:
+    zlib, bz2 and lzma all release the GIL while they work. Wrap it in io.BufferedReader to read lines.
+    Attributes: filename    - Path to the compressed file
+                compression - 'gzip', 'bz2' or 'xz', as returned by detect
+                block_size  - Number of decompressed bytes handed over at a time
+                queue_size  - Number of blocks that can be waiting
+"""
+
+
+class ThreadedDecompressor(io.RawIOBase):
+    __openers = {'gzip': gzip.open, 'bz2': bz2.open, 'xz': lzma.open}
+    __magic_numbers = ((b'\x1f\x8b', 'gzip'), (b'BZh', 'bz2'), (b'\xfd7zXZ\x00', 'xz'))
+
+    def __init__(self, filename, compression, block_size=1 << 20, queue_size=8):
+        super().__init__()
+        if compression not in self.__openers:
+            raise ValueError('Unknown compression ' + str(compression) + '.')
+
+        self.__queue = queue.Queue(queue_size)
+        self.__stopped = threading.Event()
+        self.__block = memoryview(b'')
+        self.__position = 0
+        self.__finished = False
+        self.__thread = threading.Thread(target=self.__decompress, args=(filename, compression, block_size),
+                                         daemon=True)
+        self.__thread.start()
+
+    """ The compression of a file from its magic number, None for a plain file
+    """
+    @staticmethod
+    def detect(filename):
+        with open(filename, 'rb') as f:
+            start = f.read(6)
+
+        for magic_number, compression in ThreadedDecompressor.__magic_numbers:
+            if start.startswith(magic_number):
+                return compression
+        return None
+
+    def __decompress(self, filename, compression, block_size):
+        try:
+            with self.__openers[compression](filename, 'rb') as f:
+                while not self.__stopped.is_set():
+                    block = f.read(block_size)
+                    self.__queue.put(block)
+                    if not block:
+                        return
+        except BaseException as error:
+            self.__queue.put(error)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while self.__position == len(self.__block):
+            if self.__finished:
+                return 0
+
+            block = self.__queue.get()
+            if isinstance(block, BaseException):
+                self.__finished = True
+                raise block
+            if not block:
+                self.__finished = True
+                return 0
+
+            self.__block = memoryview(block)
+            self.__position = 0
+
+        count = min(len(buffer), len(self.__block) - self.__position)
+        buffer[:count] = self.__block[self.__position:self.__position + count]
+        self.__position += count
+        return count
+
+    """ Stops the background thread, discarding whatever it has decompressed but not handed over
+    """
+    def close(self):
+        if not self.closed:
+            self.__stopped.set()
+            while self.__thread.is_alive():
+                try:
+                    self.__queue.get_nowait()
+                except queue.Empty:
+                    self.__thread.join(0.01)
+        super().close()
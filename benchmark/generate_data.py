@@ -0,0 +1,236 @@
+import getopt
+import itertools
+import json
+import os
+import random
+import string
+import sys
+
+""" SyntheticData class
+    Writes deterministic prescription, address and NSPL postcode files shaped like the real extracts, for benchmarking.
+    The same seed and sizes always produce byte-for-byte identical files.
+    - Practices prescribe with a log-normal skew, so a few practices account for a large share of the rows.
+    - BNF names follow a Zipf distribution, with the drugs of the drug catalogue among them.
+    - Every outer postcode belongs to one PCT of the SHA of its region, so SHA and PCT follow the geography.
+    - Numeric fields are fixed-width and zero-padded like the NHS extracts, and names are space-padded.
+    - A small share of practices is missing from the address file, and a small share of postcodes from the NSPL,
+      like the mismatched periods of the real data.
+    Attributes: seed           - Seed of the random number generator
+                practice_count - Number of practices
+                drug_count     - Number of distinct BNF codes
+                outer_count    - Number of outer postcodes
+"""
+
+
+class SyntheticData:
+    __regions = ['North East', 'North West', 'Yorkshire and The Humber', 'East Midlands', 'West Midlands',
+                 'East of England', 'London', 'South East', 'South West']
+    __strategic_health_authorities = ['Q30', 'Q31', 'Q32', 'Q33', 'Q34', 'Q35', 'Q36', 'Q37', 'Q39']
+    __towns = ['LONDON', 'LEEDS', 'BRISTOL', 'MANCHESTER', 'STOCKTON', 'HARTLEPOOL', 'NEWCASTLE', 'DERBY', 'YORK',
+               'NORWICH', 'READING', 'EXETER', 'BIRMINGHAM', 'LIVERPOOL', 'SHEFFIELD', 'LEICESTER']
+    __streets = ['HIGH STREET', 'STATION ROAD', 'CHURCH LANE', 'VICTORIA ROAD', 'PARK AVENUE', 'MILL LANE',
+                 'LAWSON STREET', 'FARRER STREET', 'THE GREEN', 'KING STREET']
+    __postcode_header = ('Postcode 1,Postcode 2,Postcode 3,Date Introduced,User Type,Easting,Northing,'
+                         'Positional Quality,County Code,County Name,Local Authority Code,Local Authority Name,'
+                         'Ward Code,Ward Name,Country Code,Country Name,Region Code,Region Name,'
+                         'Parliamentary Constituency Code,Parliamentary Constituency Name,'
+                         'European Electoral Region Code,European Electoral Region Name,Primary Care Trust Code,'
+                         'Primary Care Trust Name,Lower Super Output Area Code,Lower Super Output Area Name,'
+                         'Middle Super Output Area Code,Middle Super Output Area Name,'
+                         'Output Area Classification Code,Output Area Classification Name,Longitude,Latitude,'
+                         'Spatial Accuracy,Last Uploaded,Location,Socrata ID')
+    __prescription_header = (' SHA,PCT,PRACTICE,BNF CODE,' + 'BNF NAME'.ljust(38) + ',ITEMS  ,NIC        ,'
+                             'ACT COST   ,PERIOD' + ' ' * 33)
+    __catalogue_file = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'FileReader',
+                                    'drug_catalogue.json')
+
+    def __init__(self, seed=0, practice_count=8000, drug_count=5000, outer_count=2500):
+        self.__random = random.Random(seed)
+        self.__outer_postcodes = self.__make_outer_postcodes(outer_count)
+        self.__practices = self.__make_practices(practice_count)
+        self.__drugs = self.__make_drugs(drug_count)
+        self.__organisations = self.__make_organisations(random.Random(seed))
+
+    def __make_outer_postcodes(self, outer_count):
+        outer_postcodes = {}
+        while len(outer_postcodes) < outer_count:
+            area = ''.join(self.__random.choice(string.ascii_uppercase) for i in range(self.__random.choice([1, 2])))
+            outer_postcode = area + str(self.__random.randint(1, 99))
+            outer_postcodes.setdefault(outer_postcode, self.__random.choice(self.__regions))
+        return sorted(outer_postcodes.items())
+
+    def __make_postcode(self, outer_postcode):
+        return outer_postcode + ' ' + str(self.__random.randint(0, 9)) + \
+            ''.join(self.__random.choice('ABDEFGHJLNPQRSTUWXYZ') for i in range(2))
+
+    def __make_practices(self, practice_count):
+        practices = []
+        for index in range(practice_count):
+            code = string.ascii_uppercase[index // 100000 % 26] + str(81001 + index % 100000).zfill(5)
+            outer_postcode = self.__random.choice(self.__outer_postcodes)[0]
+            practices.append((code, self.__make_postcode(outer_postcode), self.__random.lognormvariate(0, 0.8)))
+        return practices
+
+    """ The drugs of the catalogue, each with a few presentations, then synthetic drugs across the BNF chapters.
+        Each drug has a BNF code, a name and a typical cost per item.
+    """
+    def __make_drugs(self, drug_count):
+        with open(self.__catalogue_file, 'rt') as f:
+            catalogue = json.load(f)
+
+        names = []
+        for definition in catalogue.values():
+            for name in definition.get('names', []):
+                names.append(name)
+                if definition.get('match') != 'exact':
+                    names.extend([name + ' 250mg Cap', name + ' 500mg Cap', name + ' Oral Soln'])
+
+        drugs = []
+        codes = set()
+        for index in range(drug_count):
+            name = names[index] if index < len(names) else \
+                ''.join(self.__random.choice(string.ascii_lowercase) for i in range(self.__random.randint(6, 14))) \
+                .capitalize() + self.__random.choice([' Tab', ' Cap', ' Crm', ' Oral Susp', ' Inj', ' Gel', ''])
+
+            code = None
+            while code is None or code in codes:
+                code = str(self.__random.randint(1, 15)).zfill(2) + str(self.__random.randint(1, 12)).zfill(2) + \
+                    str(self.__random.randint(0, 9)).zfill(2) + str(self.__random.randint(0, 9)) + \
+                    self.__random.choice(string.ascii_uppercase) + '0'
+            codes.add(code)
+            drugs.append((code, name[:40].ljust(40), self.__random.lognormvariate(1.5, 1.2)))
+
+        """ Shuffled, so the catalogue drugs land at random ranks of the Zipf distribution
+        """
+        self.__random.shuffle(drugs)
+        return drugs
+
+    """ The SHA and PCT of every outer postcode, up to 15 PCTs per SHA, drawn from their own random number generator
+        so the rest of the data is the same as before they were added
+    """
+    def __make_organisations(self, organisation_random):
+        organisations = {}
+        for outer_postcode, region in self.__outer_postcodes:
+            region_index = self.__regions.index(region)
+            pct = '5' + 'ABCDEFGHJ'[region_index] + organisation_random.choice('0123456789ABCDE')
+            organisations[outer_postcode] = (self.__strategic_health_authorities[region_index], pct)
+        return organisations
+
+    def get_practices(self):
+        return self.__practices
+
+    """ NSPL rows: every practice postcode, then random postcodes, with a quoted Location containing a comma
+    """
+    def write_postcodes(self, filename, row_count):
+        postcodes = [postcode for code, postcode, weight in self.__practices]
+        postcodes = postcodes[:int(len(postcodes) * 0.98)]
+        regions = dict(self.__outer_postcodes)
+
+        with open(filename, 'wt') as f:
+            f.write(self.__postcode_header + '\n')
+            for index in range(row_count):
+                if index < len(postcodes):
+                    postcode = postcodes[index]
+                else:
+                    postcode = self.__make_postcode(self.__random.choice(self.__outer_postcodes)[0])
+                outer_postcode = postcode.split(' ')[0]
+                region = regions[outer_postcode]
+                latitude = round(self.__random.uniform(50.0, 55.8), 6)
+                longitude = round(self.__random.uniform(-5.5, 1.7), 6)
+
+                f.write(','.join([postcode.replace(' ', ''), postcode, postcode, '01-1980', '0',
+                                  str(self.__random.randint(100000, 600000)), str(self.__random.randint(0, 700000)),
+                                  '1', 'E10000009', 'County', 'E07000049', 'District', 'E05009519', '',
+                                  'E92000001', 'England', 'E1200000' + str(self.__regions.index(region) + 1), region,
+                                  'E14000815', 'Constituency', 'E15000009', region, 'E16000142', 'Trust',
+                                  'E01020383', 'Area 012B', 'E02004254', 'Area 012', '6B2', 'Classification',
+                                  str(longitude), str(latitude), 'Postcode Level', '27/05/2016',
+                                  '"(' + str(latitude) + ', ' + str(longitude) + ')"', str(index + 1)]) + '\n')
+
+    """ Headerless address rows, one per practice, except for a few practices that have closed since
+    """
+    def write_addresses(self, filename, period='201202'):
+        with open(filename, 'wt') as f:
+            for code, postcode, weight in self.__practices[:int(len(self.__practices) * 0.97)]:
+                town = self.__random.choice(self.__towns)
+                locality = town if self.__random.random() < 0.2 else ''
+                f.write(','.join([period, code, (code + ' SURGERY').ljust(40),
+                                  'THE HEALTH CENTRE'.ljust(25) if self.__random.random() < 0.5 else ' ' * 25,
+                                  self.__random.choice(self.__streets).ljust(25), locality.ljust(25),
+                                  (town if not locality else '').ljust(25), postcode]) + '\n')
+
+    """ Prescription rows for row_count prescriptions, written in blocks so large files stream to disk
+    """
+    def write_prescriptions(self, filename, row_count, period='201109', block_size=100000):
+        practice_weights = list(itertools.accumulate(weight for code, postcode, weight in self.__practices))
+        drug_weights = list(itertools.accumulate(1.0 / (rank + 1) ** 1.1 for rank in range(len(self.__drugs))))
+
+        with open(filename, 'wt') as f:
+            f.write(self.__prescription_header + '\n')
+            written = 0
+            while written < row_count:
+                count = min(block_size, row_count - written)
+                practices = self.__random.choices(self.__practices, cum_weights=practice_weights, k=count)
+                drugs = self.__random.choices(self.__drugs, cum_weights=drug_weights, k=count)
+                lines = []
+
+                for (practice, postcode, weight), (code, name, cost) in zip(practices, drugs):
+                    sha, pct = self.__organisations[postcode.split(' ')[0]]
+                    items = 1 + int(self.__random.expovariate(0.35))
+                    nic = round(items * cost * self.__random.uniform(0.8, 1.25), 2)
+                    act_cost = round(nic * self.__random.uniform(0.9, 0.95), 2)
+                    lines.append(sha + ',' + pct + ',' + practice + ',' + code + ',' + name + ',' +
+                                 str(items).zfill(7) + ',' + '{:011.2f}'.format(nic) + ',' +
+                                 '{:011.2f}'.format(act_cost) + ',' +
+                                 period + (' ' * 33 if self.__random.random() < 0.5 else '') + '\n')
+
+                f.write(''.join(lines))
+                written += count
+
+
+def print_usage():
+    print('Usage: python3 -m benchmark.generate_data -o <Output_directory> [-n <Prescription_rows>] [-s <Seed>]')
+    print('                                          [-c <Postcode_rows>] [-r <Practices>]')
+    print('Writes prescriptions.csv, addresses.csv and postcodes.csv, 1,000,000 prescriptions by default.')
+
+
+def main():
+    output_directory = ''
+    prescription_rows = 1000000
+    postcode_rows = 100000
+    practice_count = 8000
+    seed = 0
+
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "ho:n:s:c:r:")
+    except getopt.GetoptError:
+        print_usage()
+        sys.exit(1)
+
+    for opt, arg in opts:
+        if opt == '-h':
+            print_usage()
+            sys.exit(1)
+        elif opt == '-o':
+            output_directory = arg
+        elif opt == '-n':
+            prescription_rows = int(arg)
+        elif opt == '-s':
+            seed = int(arg)
+        elif opt == '-c':
+            postcode_rows = int(arg)
+        elif opt == '-r':
+            practice_count = int(arg)
+
+    if output_directory == '':
+        print_usage()
+        sys.exit(1)
+
+    os.makedirs(output_directory, exist_ok=True)
+    synthetic_data = SyntheticData(seed, practice_count)
+    synthetic_data.write_postcodes(os.path.join(output_directory, 'postcodes.csv'), max(postcode_rows, practice_count))
+    synthetic_data.write_addresses(os.path.join(output_directory, 'addresses.csv'))
+    synthetic_data.write_prescriptions(os.path.join(output_directory, 'prescriptions.csv'), prescription_rows)
+
+if __name__ == "__main__":
+    main()
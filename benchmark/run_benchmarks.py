@@ -0,0 +1,234 @@
+import getopt
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from FileReader.AddressFileReader import AddressFileReader
+from FileReader.PostcodeLookupReader import PostcodeLookupReader
+from FileReader.PracticeDimension import PracticeDimension
+from FileReader.PrescriptionFileReader import PrescriptionFileReader, numpy
+from FileReader.Profiler import Profiler
+
+""" Benchmarks every FileReader iteration method on the prescription file of a generated data set, first only
+    reading the rows and then also processing them, and the full main.py pipeline, cold, warm and profiled.
+    Reports wall time, CPU time, rows/sec, MB/sec and peak memory of every run: the peak resident set size so far,
+    or with -m the peak memory traced by tracemalloc during the run, which slows every run down.
+"""
+
+ADDRESS_HEADER = ("Period", "practice_code", "practice_name", "practice_building",
+                  "address", "locality", "town", "postcode")
+
+""" Iteration methods whose rows process_file accepts, batch_read and columnar_batch_read go through process_batch
+"""
+PROCESSING_METHODS = ['lazy_sequential_read', 'chunky_lazy_read', 'mmap_read', 'checkpointed_read', 'parallel_read']
+READING_METHODS = ['lazy_read', 'chunky_lazy_read', 'lazy_sequential_read', 'batch_read', 'projected_read',
+                   'mmap_read', 'checkpointed_read']
+
+
+def print_usage():
+    print('Usage: python3 -m benchmark.run_benchmarks -d <Data_directory> [-o <JSON_file_name>] [-m]')
+    print('The data directory holds the prescriptions.csv, addresses.csv and postcodes.csv written by '
+          'benchmark.generate_data.')
+    print('Use -m to trace the peak memory of every run with tracemalloc, which slows every run down.')
+
+
+def load_practice_dimension(data_directory):
+    postcode_reader = PostcodeLookupReader(os.path.join(data_directory, 'postcodes.csv'), None)
+    postcode_reader.set_iteration_method('projected_read')
+    for row in postcode_reader:
+        postcode_reader.process_file(row)
+
+    address_reader = AddressFileReader(os.path.join(data_directory, 'addresses.csv'), ADDRESS_HEADER)
+    address_reader.set_iteration_method('chunky_lazy_read')
+    for row in address_reader:
+        address_reader.process_file(row)
+
+    practice_dimension = PracticeDimension()
+    practice_dimension.populate(address_reader, postcode_reader)
+    return practice_dimension, postcode_reader.get_regions_list()
+
+
+def make_reader(filename, iteration_method, practice_dimension, regions, work_directory):
+    reader = PrescriptionFileReader(filename, None)
+    reader.set_cache_directory(os.path.join(work_directory, 'cache'))
+    reader.set_checkpoint_file(os.path.join(work_directory, 'checkpoint'))
+    reader.set_practice_dimension(practice_dimension)
+    reader.setup_region_based_dictionaries(regions)
+    reader.set_iteration_method(iteration_method)
+    if iteration_method == 'projected_read':
+        reader.set_projection(['PRACTICE', 'ACT COST'])
+    return reader
+
+
+def benchmark_iteration_methods(filename, practice_dimension, regions, profiler, work_directory):
+    for iteration_method in READING_METHODS:
+        stage = 'read:' + iteration_method
+        reader = make_reader(filename, iteration_method, practice_dimension, regions, work_directory)
+        with profiler.stage(stage):
+            for row in reader:
+                pass
+        profiler.count_reader(stage, reader)
+
+    for iteration_method in PROCESSING_METHODS:
+        stage = 'process:' + iteration_method
+        reader = make_reader(filename, iteration_method, practice_dimension, regions, work_directory)
+        with profiler.stage(stage):
+            for row in reader:
+                reader.process_file(row)
+        profiler.count_reader(stage, reader)
+
+    """ The first columnar run includes building the cache
+    """
+    for stage in ['process:columnar_read (building cache)', 'process:columnar_read']:
+        reader = make_reader(filename, 'columnar_read', practice_dimension, regions, work_directory)
+        with profiler.stage(stage):
+            for row in reader:
+                reader.process_file(row)
+        profiler.count_reader(stage, reader)
+
+    """ Split by SHA and PCT, then only the partitions of the first region are processed
+    """
+    reader = make_reader(filename, 'partitioned_read', practice_dimension, regions, work_directory)
+    with profiler.stage('partition'):
+        partition_store = reader.build_partitions(os.path.join(work_directory, 'partitions'))
+    profiler.add_throughput('partition', partition_store.get_row_count(), os.path.getsize(filename))
+
+    stage = 'process:partitioned_read (' + regions[0] + ')'
+    reader.set_partition_regions(regions[:1])
+    with profiler.stage(stage):
+        for row in reader:
+            reader.process_file(row)
+    profiler.add_throughput(stage, reader.get_line_count(),
+                            partition_store.get_total_size(reader.get_selected_partitions()))
+
+    """ columnar_batch_read runs on the cache built above
+    """
+    if numpy is not None:
+        for iteration_method in ['batch_read', 'columnar_batch_read']:
+            stage = 'process:' + iteration_method
+            reader = make_reader(filename, iteration_method, practice_dimension, regions, work_directory)
+            with profiler.stage(stage):
+                for rows in reader:
+                    reader.process_batch(rows)
+            profiler.count_reader(stage, reader)
+
+
+""" Runs main.py in a scratch directory, once without and once with the postcode index, and then once more with
+    --profile. The first two are timed as they are, the profiled run gives the stages, rows and peak memory, so the
+    cost of profiling does not show in the pipeline times.
+"""
+def benchmark_pipeline(data_directory, profiler, work_directory, trace_memory):
+    main_file = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'main.py')
+    postcode_file = os.path.join(data_directory, 'postcodes.csv')
+    prescription_file = os.path.join(data_directory, 'prescriptions.csv')
+    profile_file = os.path.join(work_directory, 'profile.json')
+
+    for derived_file in [postcode_file + '.index', prescription_file + '.cache']:
+        if os.path.isdir(derived_file):
+            shutil.rmtree(derived_file)
+        elif os.path.isfile(derived_file):
+            os.remove(derived_file)
+
+    runs = ['pipeline (cold)', 'pipeline (warm)', 'pipeline (profiled)']
+    for run in runs:
+        profile_arguments = []
+        if run == 'pipeline (profiled)':
+            profile_arguments = ['--profile', profile_file] + (['--trace-memory'] if trace_memory else [])
+
+        start_times = os.times()
+        with profiler.stage(run):
+            subprocess.run([sys.executable, '-W', 'ignore', main_file, '-c', postcode_file,
+                            '-a', os.path.join(data_directory, 'addresses.csv'), '-p', prescription_file] +
+                           profile_arguments, cwd=work_directory, check=True, stdout=subprocess.DEVNULL)
+
+        """ CPU time is that of the main.py process and its workers, not of this one
+        """
+        end_times = os.times()
+        profiler.get_stage(run)['cpu_seconds'] = end_times.children_user + end_times.children_system - \
+            start_times.children_user - start_times.children_system
+
+    with open(profile_file, 'rt') as f:
+        pipeline_profile = json.load(f)
+
+    for run in runs:
+        profiler.add_throughput(run, pipeline_profile['stages']['prescription_scan']['rows'],
+                                os.path.getsize(prescription_file))
+
+    """ The memory this process measured is not that of main.py, which only reports its own in the profiled run
+    """
+    for run in runs:
+        for key in ['cumulative_peak_rss_bytes', 'peak_rss_growth_bytes', 'peak_memory_bytes']:
+            profiler.get_stage(run).pop(key, None)
+
+    for key in ['cumulative_peak_rss_bytes', 'peak_memory_bytes']:
+        peaks = [stage[key] for stage in pipeline_profile['stages'].values() if key in stage]
+        if peaks:
+            profiler.get_stage('pipeline (profiled)')[key] = max(peaks)
+
+    return {'pipeline (profiled)': pipeline_profile}
+
+
+def format_number(value, scale=1.0, digits=2):
+    return '' if value is None else '{:,.{}f}'.format(value / scale, digits)
+
+
+def print_report(stages):
+    print('{:<42}{:>10}{:>10}{:>14}{:>10}{:>12}'.format('Run', 'Wall s', 'CPU s', 'Rows/s', 'MB/s', 'Peak MB'))
+    for name, measurement in stages.items():
+        print('{:<42}{:>10}{:>10}{:>14}{:>10}{:>12}'.format(
+            name, format_number(measurement['wall_seconds']), format_number(measurement['cpu_seconds']),
+            format_number(measurement.get('rows_per_second') or None, digits=0),
+            format_number(measurement.get('mb_per_second')),
+            format_number(measurement.get('peak_memory_bytes', measurement.get('cumulative_peak_rss_bytes')), 1e6)))
+
+
+def main():
+    data_directory = ''
+    output_file = ''
+    trace_memory = False
+
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "hmd:o:")
+    except getopt.GetoptError:
+        print_usage()
+        sys.exit(1)
+
+    for opt, arg in opts:
+        if opt == '-h':
+            print_usage()
+            sys.exit(1)
+        elif opt == '-d':
+            data_directory = arg
+        elif opt == '-o':
+            output_file = arg
+        elif opt == '-m':
+            trace_memory = True
+
+    if data_directory == '':
+        print_usage()
+        sys.exit(1)
+
+    data_directory = os.path.abspath(data_directory)
+    work_directory = tempfile.mkdtemp()
+    profiler = Profiler(trace_memory=trace_memory)
+
+    try:
+        """ main.py runs first, a child process starts out with the peak resident set size of its parent
+        """
+        pipeline_profiles = benchmark_pipeline(data_directory, profiler, work_directory, trace_memory)
+        practice_dimension, regions = load_practice_dimension(data_directory)
+        benchmark_iteration_methods(os.path.join(data_directory, 'prescriptions.csv'), practice_dimension, regions,
+                                    profiler, work_directory)
+    finally:
+        shutil.rmtree(work_directory)
+
+    print_report(profiler.get_stages())
+
+    if output_file != '':
+        with open(output_file, 'wt') as f:
+            json.dump({'runs': profiler.get_stages(), 'pipeline': pipeline_profiles}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
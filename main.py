@@ -1,29 +1,49 @@
-from time import time
+from concurrent.futures import ProcessPoolExecutor
+import json
 import sys
 import getopt
 from FileReader.PostcodeLookupReader import PostcodeLookupReader
 from FileReader.PrescriptionFileReader import PrescriptionFileReader
 from FileReader.AddressFileReader import AddressFileReader
+from FileReader.PracticeDimension import PracticeDimension
+from FileReader.PeriodBatch import PeriodBatch
+from FileReader.Profiler import Profiler
+
+ADDRESS_HEADER = ("Period", "practice_code", "practice_name", "practice_building",
+                  "address", "locality", "town", "postcode")
 
 
 def print_usage():
     print('Usage: python3 main.py -c <Postcode_File_Name> -a <Address_File_Name> -p <Prescription_file_name>')
     print('The file names should be fully qualified paths if not in current directory.')
+    print('Use -d <Prescription_directory> instead of -p to process every monthly extract in a directory, with one -a')
+    print('per address period. Each period is written to output_<PERIOD>.txt and the cumulative totals to output.txt.')
+    print('Use -k to checkpoint the prescription run, so it resumes or only processes appended rows next time.')
+    print('Use --profile <JSON_file_name> to write the time, throughput and peak memory of every stage.')
+    print('Add --trace-memory to also trace the peak Python allocations of every stage, which slows the run down.')
 
 
 def parse_args(args):
     postcode_file = ''
-    address_file = ''
+    address_files = []
     prescription_file = ''
+    prescription_directory = ''
+    checkpoint = False
+    profile_file = ''
+    trace_memory = False
 
     try:
-        opts, args = getopt.getopt(args, "hc:a:p:")
+        opts, args = getopt.getopt(args, "hkc:a:p:d:", ['profile=', 'trace-memory'])
     except getopt.GetoptError:
         print_usage()
         sys.exit(1)
 
     for opt, arg in opts:
-        if opt is '-h':
+        if opt == '--profile':
+            profile_file = arg
+        elif opt == '--trace-memory':
+            trace_memory = True
+        elif opt == '-h':
             print_usage()
             sys.exit(1)
         elif opt in '-c':
@@ -31,54 +51,166 @@ def parse_args(args):
         elif opt in '-p':
             prescription_file = arg
         elif opt in '-a':
-            address_file = arg
+            address_files.append(arg)
+        elif opt in '-d':
+            prescription_directory = arg
+        elif opt in '-k':
+            checkpoint = True
 
-    if postcode_file is '' or prescription_file is '' or address_file is '':
+    if postcode_file == '' or (prescription_file == '' and prescription_directory == '') or not address_files:
         print_usage()
         sys.exit(1)
     else:
-        return [postcode_file, address_file, prescription_file]
+        return [postcode_file, address_files, prescription_file, prescription_directory, checkpoint, profile_file,
+                trace_memory]
 
 
-def main():
-    start_time = time()
-    postcode_file, address_file, prescription_file = parse_args(sys.argv[1:])
+""" Each loader runs in a worker process, so it measures itself and returns its stages along with the reader
+"""
+def load_postcodes(postcode_file, stage, trace_memory):
+    profiler = Profiler(trace_memory=trace_memory)
+
+    with profiler.stage(stage):
+        process_postcodes_file = PostcodeLookupReader(postcode_file, None)
+        indexed = process_postcodes_file.load_index()
+
+        if not indexed:
+            process_postcodes_file.populate_csv_header(None)
+            process_postcodes_file.set_iteration_method('projected_read')
+
+            for row in process_postcodes_file:
+                process_postcodes_file.process_file(row)
 
-    process_postcodes_file = PostcodeLookupReader(postcode_file, None)
-    process_postcodes_file.populate_csv_header(None)
-    process_postcodes_file.set_iteration_method('lazy_read')
+            if not process_postcodes_file.save_index():
+                print('Could not write the postcode index ' + process_postcodes_file.get_index_file() +
+                      ', the postcode file will be read again next time.', file=sys.stderr)
 
-    for row in process_postcodes_file:
-        process_postcodes_file.process_file(row)
+    """ Nothing is read from the postcode file when the index is used, so no throughput is recorded
+    """
+    if not indexed:
+        profiler.count_reader(stage, process_postcodes_file)
+    return process_postcodes_file, profiler.get_stages()
 
-    header = ("Period", "practice_code", "practice_name", "practice_building",
-              "address", "locality", "town", "postcode")
 
-    process_address_file = AddressFileReader(address_file, header)
-    process_address_file.set_iteration_method('chunky_lazy_read')
+def load_addresses(address_file, stage, trace_memory):
+    profiler = Profiler(trace_memory=trace_memory)
 
-    process_address_file.set_location_to_search('LONDON')
+    with profiler.stage(stage):
+        process_address_file = AddressFileReader(address_file, ADDRESS_HEADER)
+        process_address_file.set_iteration_method('chunky_lazy_read')
 
-    for row in process_address_file:
-        process_address_file.process_file(row)
+        process_address_file.set_location_to_search('LONDON')
 
-    process_address_file.write_output_to_file()
+        for row in process_address_file:
+            process_address_file.process_file(row)
 
-    process_prescription_file = PrescriptionFileReader(prescription_file, None)
-    process_prescription_file.set_iteration_method('lazy_sequential_read')
-    process_prescription_file.set_practice_code_to_postcode_lookup(process_address_file.get_postcode_for_practice)
-    process_prescription_file.set_postcode_to_region_lookup(process_postcodes_file.get_region_from_postcode)
-    process_prescription_file.setup_region_based_dictionaries(process_postcodes_file.get_regions_list())
+    profiler.count_reader(stage, process_address_file)
+    return process_address_file, profiler.get_stages()
 
-    for row in process_prescription_file:
-        process_prescription_file.process_file(row)
 
-    end_time = time()
+def write_profile(profile_file, profiler, process_prescription_file):
+    profile = {'wall_seconds': profiler.get_wall_time(), 'stages': profiler.get_stages(),
+               'decode_seconds': process_prescription_file.get_decode_time(),
+               'aggregator_seconds': process_prescription_file.get_aggregator_times()}
+
+    with open(profile_file, 'wt') as f:
+        json.dump(profile, f, indent=2)
+
+
+""" The postcode and address files are independent, so each is loaded in its own worker process.
+    The prescription rows are parsed in this process, where they are aggregated: a read-ahead thread would hold the GIL
+    while it parses, so it could not overlap with the aggregation and only slowed the scan down.
+"""
+def main():
+    postcode_file, address_files, prescription_file, prescription_directory, checkpoint, profile_file, \
+        trace_memory = parse_args(sys.argv[1:])
+    profile = profile_file != ''
+    trace_memory = profile and trace_memory
+    profiler = Profiler(trace_memory=trace_memory)
+    address_stages = ['address_load' if len(address_files) == 1 else 'address_load:' + address_file
+                      for address_file in address_files]
+
+    with ProcessPoolExecutor(max_workers=len(address_files) + 1) as executor:
+        postcodes_future = executor.submit(load_postcodes, postcode_file, 'postcode_load', trace_memory)
+        address_futures = [executor.submit(load_addresses, address_file, stage, trace_memory)
+                           for address_file, stage in zip(address_files, address_stages)]
+
+        if prescription_directory != '':
+            with profiler.stage('reference_wait'):
+                process_postcodes_file, stages = postcodes_future.result()
+                profiler.add_stages(stages)
+                address_readers = []
+                for address_future in address_futures:
+                    address_reader, stages = address_future.result()
+                    profiler.add_stages(stages)
+                    address_readers.append(address_reader)
+
+            with profiler.stage('prescription_scan'):
+                period_batch = PeriodBatch(process_postcodes_file)
+                period_batch.set_iteration_method('lazy_sequential_read')
+                period_batch.set_profiling(profile)
+                for address_reader in address_readers:
+                    period_batch.add_address_reader(address_reader)
+                period_batch.add_prescription_directory(prescription_directory)
+                period_batch.process()
+                cumulative_reader = period_batch.get_cumulative_reader()
+
+            profiler.add_throughput('prescription_scan', cumulative_reader.get_line_count(),
+                                    period_batch.get_total_size())
+
+            with profiler.stage('output'):
+                address_readers[-1].write_output_to_file()
+                period_batch.write_output_to_file()
+
+            print('Processed periods ' + ', '.join(period_batch.get_periods()))
+            print('Results written to output.txt and output_<PERIOD>.txt')
+            print('Execution time: ' + str(profiler.get_wall_time()))
+
+            if profile:
+                write_profile(profile_file, profiler, cumulative_reader)
+            return
+
+        process_prescription_file = PrescriptionFileReader(prescription_file, None)
+        process_prescription_file.set_profiling(profile)
+
+        if checkpoint:
+            process_prescription_file.set_iteration_method('checkpointed_read')
+            process_prescription_file.load_checkpoint()
+        else:
+            process_prescription_file.set_iteration_method('lazy_sequential_read')
+
+        with profiler.stage('reference_wait'):
+            process_postcodes_file, stages = postcodes_future.result()
+            profiler.add_stages(stages)
+            address_readers = []
+            for address_future in address_futures:
+                address_reader, stages = address_future.result()
+                profiler.add_stages(stages)
+                address_readers.append(address_reader)
+
+    process_address_file = address_readers[-1]
+
+    with profiler.stage('prescription_scan'):
+        practice_dimension = PracticeDimension()
+        practice_dimension.populate(process_address_file, process_postcodes_file)
+
+        process_prescription_file.set_practice_dimension(practice_dimension)
+        process_prescription_file.setup_region_based_dictionaries(process_postcodes_file.get_regions_list())
+
+        for row in process_prescription_file:
+            process_prescription_file.process_file(row)
+
+    profiler.count_reader('prescription_scan', process_prescription_file)
+
+    with profiler.stage('output'):
+        process_address_file.write_output_to_file()
+        process_prescription_file.write_output_to_file()
 
     print('Results written to ' + process_prescription_file.get_output_file())
-    print('Execution time: ' + str(end_time - start_time))
+    print('Execution time: ' + str(profiler.get_wall_time()))
 
-    process_prescription_file.write_output_to_file()
+    if profile:
+        write_profile(profile_file, profiler, process_prescription_file)
 
 if __name__ == "__main__":
     main()
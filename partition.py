@@ -0,0 +1,42 @@
+import getopt
+import sys
+from FileReader.PrescriptionFileReader import PrescriptionFileReader
+
+
+def print_usage():
+    print('Usage: python3 partition.py -p <Prescription_file_name> -o <Partition_directory>')
+    print('Splits a prescription extract into one file per SHA and PCT, with a manifest.json of the partitions.')
+    print('PrescriptionFileReader.partitioned_read then only reads the partitions of the regions it is asked about.')
+
+
+def main():
+    prescription_file = ''
+    partition_directory = ''
+
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "hp:o:")
+    except getopt.GetoptError:
+        print_usage()
+        sys.exit(1)
+
+    for opt, arg in opts:
+        if opt == '-h':
+            print_usage()
+            sys.exit(1)
+        elif opt == '-p':
+            prescription_file = arg
+        elif opt == '-o':
+            partition_directory = arg
+
+    if prescription_file == '' or partition_directory == '':
+        print_usage()
+        sys.exit(1)
+
+    partition_store = PrescriptionFileReader(prescription_file, None).build_partitions(partition_directory)
+    partitions = partition_store.get_partitions()
+    print('{:,} rows in {} partitions across {} SHAs, {:,} rows skipped.'.format(
+        partition_store.get_row_count(), len(partitions), len(set(partition['sha'] for partition in partitions)),
+        partition_store.get_skipped_row_count()))
+
+if __name__ == "__main__":
+    main()
@@ -76,3 +76,42 @@ class PostcodeForNonexistantPracticeCodeTest(unittest.TestCase):
             process_address_file.process_file(row)
 
         self.assertEquals(process_address_file.get_postcode_for_practice('JUNK'), None)
+
+
+class ParallelReadTest(unittest.TestCase):
+    def test(self):
+        header = ("Period", "practice_code", "practice_name", "practice_building",
+                  "address", "locality", "town", "postcode")
+        process_address_file = AddressFileReader('samples/address_sample.csv', header)
+        process_address_file.set_iteration_method('parallel_read')
+        process_address_file.set_shard_iteration_method('chunky_lazy_read')
+        process_address_file.set_worker_count(3)
+        process_address_file.set_location_to_search('LONDON')
+
+        for row in process_address_file:
+            process_address_file.process_file(row)
+
+        self.assertEqual(process_address_file.get_location_count(), 2)
+        self.assertEqual(process_address_file.get_practice_code_to_postcode_count(), 12)
+        self.assertEqual(process_address_file.get_postcode_for_practice('A81010'), 'TS24 9DN')
+
+
+class CountAllLocationsTest(unittest.TestCase):
+    def test(self):
+        header = ("Period", "practice_code", "practice_name", "practice_building",
+                  "address", "locality", "town", "postcode")
+        process_address_file = AddressFileReader('samples/address_sample.csv', header)
+        process_address_file.set_iteration_method('chunky_lazy_read')
+        process_address_file.set_count_all_locations(True)
+
+        for row in process_address_file:
+            process_address_file.process_file(row)
+
+        self.assertEqual(process_address_file.get_count_for_location('LONDON'), 2)
+        self.assertEqual(process_address_file.get_count_for_location('CLEVELAND'), 8)
+        self.assertEqual(process_address_file.get_count_for_location('HARTLEPOOL'), 3)
+        self.assertEqual(process_address_file.get_count_for_location('STOCKTON ON TEES'), 2)
+        self.assertEqual(process_address_file.get_count_for_location('FARRER STREET'), 2)
+        self.assertEqual(process_address_file.get_count_for_location('STOCKTON ON'), 0)
+        self.assertEqual(process_address_file.get_location_count(), 0)
+        self.assertEqual(process_address_file.get_location_counts().most_common(1), [('CLEVELAND', 8)])
@@ -0,0 +1,105 @@
+import os
+import shutil
+import tempfile
+import unittest
+from FileReader.PrescriptionAggregators import BnfHierarchyAggregator
+from FileReader.PrescriptionFileReader import PrescriptionFileReader
+
+
+def dummy_postcode_lookup_method(practice_code):
+    practice_code_to_postcode = {'A86001': 'XYZ1 ABC', 'A86003': 'XYZ2 ABC', 'A86004': 'XYZ3 ABC', 'Y00516': None,
+                                 'A86006': 'XYZ4 ABC', 'A86007': 'XYZ5 ABC', 'A86008': 'XYZ6 ABC', 'PRACTICE': None}
+    return practice_code_to_postcode[practice_code]
+
+
+def dummy_postcode_to_region_lookup(postcode):
+    postcode_to_region = {'XYZ1 ABC': 'LONDON', 'XYZ2 ABC': 'LONDON', 'XYZ3 ABC': 'SOUTH EAST',
+                          'XYZ4 ABC': 'SOUTH WEST', 'XYZ5 ABC': 'SOUTH WEST', 'XYZ6 ABC': 'NORTH WEST',
+                          None: None}
+    return postcode_to_region[postcode]
+
+
+REGIONS = ['LONDON', 'SOUTH EAST', 'SOUTH WEST', 'NORTH WEST']
+
+
+def make_reader(directory, filename='samples/prescription_sample.csv'):
+    process_prescription_file = PrescriptionFileReader(filename, None)
+    process_prescription_file.set_cube_file(os.path.join(directory, 'prescription_sample.cube'))
+    process_prescription_file.set_iteration_method('lazy_sequential_read')
+    process_prescription_file.set_postcode_to_region_lookup(dummy_postcode_to_region_lookup)
+    process_prescription_file.set_practice_code_to_postcode_lookup(dummy_postcode_lookup_method)
+    process_prescription_file.setup_region_based_dictionaries(REGIONS + ['UNKNOWN'])
+    process_prescription_file.register_aggregator('bnf_hierarchy', BnfHierarchyAggregator())
+    return process_prescription_file
+
+
+class CubeMatchesSequentialReadTest(unittest.TestCase):
+    def test(self):
+        directory = tempfile.mkdtemp()
+        try:
+            process_prescription_file = make_reader(directory)
+            for row in process_prescription_file:
+                process_prescription_file.process_file(row)
+
+            aggregate_cube = process_prescription_file.build_aggregate_cube()
+            aggregate_cube.set_practice_lookups(dummy_postcode_lookup_method, dummy_postcode_to_region_lookup)
+
+            self.assertEqual(aggregate_cube.get_row_count(), 21)
+            self.assertEqual(aggregate_cube.get_average_cost(),
+                             process_prescription_file.get_average_cost_of_prescription())
+            self.assertEqual(aggregate_cube.get_top_spenders(), process_prescription_file.get_top_5_spenders())
+            self.assertEqual(aggregate_cube.get_average_price_by_region(regions=REGIONS + ['UNKNOWN']),
+                             process_prescription_file.get_average_price_by_region())
+            self.assertEqual(aggregate_cube.get_cost_per_prescription(),
+                             process_prescription_file.get_cost_per_prescription())
+            self.assertEqual(aggregate_cube.get_item_count_by_region(regions=REGIONS + ['UNKNOWN']),
+                             process_prescription_file.get_antidepressant_count_by_region())
+            self.assertEqual(aggregate_cube.get_bnf_totals('section'),
+                             process_prescription_file.get_bnf_totals('section'))
+            self.assertEqual(aggregate_cube.get_bnf_totals_by_region('0403'),
+                             process_prescription_file.get_bnf_totals_by_region('0403'))
+            aggregate_cube.close()
+        finally:
+            shutil.rmtree(directory)
+
+
+class CubeQueryTest(unittest.TestCase):
+    def test(self):
+        directory = tempfile.mkdtemp()
+        try:
+            aggregate_cube = make_reader(directory).build_aggregate_cube()
+
+            self.assertEqual(aggregate_cube.get_periods(), ['201109'])
+            self.assertEqual(aggregate_cube.query('SELECT SUM(items), SUM(act_cost) FROM cells WHERE practice = ?',
+                                                  ('A86008',)), [(43, 9711)])
+            self.assertRaises(ValueError, aggregate_cube.get_average_cost, 'no_such_category')
+            self.assertRaises(ValueError, aggregate_cube.get_bnf_totals_by_region, '040')
+            aggregate_cube.close()
+        finally:
+            shutil.rmtree(directory)
+
+
+class CubeRebuiltWhenSourceChangesTest(unittest.TestCase):
+    def test(self):
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, 'prescription_sample.csv')
+            shutil.copyfile('samples/prescription_sample.csv', filename)
+            process_prescription_file = make_reader(directory, filename)
+            aggregate_cube = process_prescription_file.build_aggregate_cube()
+            self.assertTrue(aggregate_cube.is_valid(process_prescription_file.get_source_signature()))
+
+            with open(filename, 'at') as f:
+                f.write('\nQ30,5D7,A86008,0106040M0,Bisacodyl_Tab E/C 5mg                 ,0000002,00000000.20,'
+                        '00000000.30,201110\n')
+            self.assertFalse(aggregate_cube.is_valid(process_prescription_file.get_source_signature()))
+
+            aggregate_cube = process_prescription_file.build_aggregate_cube()
+            self.assertEqual(aggregate_cube.get_row_count(), 22)
+            self.assertEqual(aggregate_cube.get_periods(), ['201109', '201110'])
+            aggregate_cube.close()
+        finally:
+            shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import pickle
+import unittest
+from FileReader.CountMinSketch import CountMinSketch
+
+
+class EstimateTest(unittest.TestCase):
+    def test(self):
+        count_min_sketch = CountMinSketch(width=64, depth=4)
+        totals = {}
+        for index in range(2000):
+            key = 'P' + str(index % 300)
+            totals[key] = totals.get(key, 0) + index
+            count_min_sketch.add(key, index)
+
+        self.assertEqual(count_min_sketch.get_total(), sum(totals.values()))
+        for key, total in totals.items():
+            self.assertGreaterEqual(count_min_sketch.estimate(key), total)
+        self.assertLessEqual(sum(count_min_sketch.estimate(key) - total for key, total in totals.items()),
+                             len(totals) * count_min_sketch.get_error_bound())
+
+
+class ExactWithoutCollisionsTest(unittest.TestCase):
+    def test(self):
+        count_min_sketch = CountMinSketch()
+        self.assertEqual(count_min_sketch.add('XYZ1 ABC', 177), 177)
+        self.assertEqual(count_min_sketch.add('XYZ1 ABC', 23), 200)
+        count_min_sketch.add('XYZ2 ABC', 6992)
+
+        self.assertEqual(count_min_sketch.estimate('XYZ1 ABC'), 200)
+        self.assertEqual(count_min_sketch.estimate('XYZ2 ABC'), 6992)
+        self.assertEqual(count_min_sketch.estimate('XYZ3 ABC'), 0)
+
+
+class MergeTest(unittest.TestCase):
+    def test(self):
+        first, second = CountMinSketch(128, 3), CountMinSketch(128, 3)
+        first.add('XYZ1 ABC', 100)
+        second.add('XYZ1 ABC', 50)
+        second.add('XYZ2 ABC', 70)
+
+        """ Shipped back from a worker process
+        """
+        first.merge(pickle.loads(pickle.dumps(second)))
+        self.assertEqual(first.estimate('XYZ1 ABC'), 150)
+        self.assertEqual(first.estimate('XYZ2 ABC'), 70)
+        self.assertEqual(first.get_total(), 220)
+        self.assertRaises(ValueError, first.merge, CountMinSketch(64, 3))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+from FileReader.DrugCatalogue import DrugCatalogue
+
+
+class DefaultCatalogueTest(unittest.TestCase):
+    def test(self):
+        drug_catalogue = DrugCatalogue.load()
+
+        self.assertEqual(drug_catalogue.classify('Peppermint Oil                          '), {'peppermint_oil'})
+        self.assertEqual(drug_catalogue.classify('Flucloxacillin Sodium                   '), {'flucloxacillin'})
+        self.assertEqual(drug_catalogue.classify('Venlafaxine                             '), {'antidepressant'})
+        self.assertEqual(drug_catalogue.classify('Sertraline Hydrochloride'), {'antidepressant'})
+
+
+class AntidepressantFragmentTest(unittest.TestCase):
+    def test(self):
+        drug_catalogue = DrugCatalogue.load()
+
+        self.assertEqual(drug_catalogue.classify('Hydrochloride'), frozenset())
+        self.assertEqual(drug_catalogue.classify('Dicycloverine Hydrochloride             '), frozenset())
+        self.assertEqual(drug_catalogue.classify('Venlafaxine Mirtazapine'), frozenset())
+        self.assertEqual(drug_catalogue.classify('                                        '), frozenset())
+
+
+class OverlappingPatternsTest(unittest.TestCase):
+    def test(self):
+        drug_catalogue = DrugCatalogue({'he': {'names': ['he'], 'match': 'contains'},
+                                        'she': {'names': ['she'], 'match': 'contains'},
+                                        'hers': {'names': ['hers'], 'match': 'contains'},
+                                        'ushers': {'names': ['ushers'], 'match': 'exact'}})
+
+        self.assertEqual(drug_catalogue.classify('ushers'), {'he', 'she', 'hers', 'ushers'})
+        self.assertEqual(drug_catalogue.classify('ushersx'), {'he', 'she', 'hers'})
+        self.assertEqual(drug_catalogue.classify('hhe'), {'he'})
+
+
+class BnfCodePrefixTest(unittest.TestCase):
+    def test(self):
+        drug_catalogue = DrugCatalogue({'antibacterial': {'bnf_code_prefixes': ['0501']},
+                                        'penicillin': {'bnf_code_prefixes': ['050101'], 'names': ['Amoxicillin']}})
+
+        self.assertTrue(drug_catalogue.uses_bnf_codes())
+        self.assertEqual(drug_catalogue.classify('Anything', '0501013B0'), {'antibacterial', 'penicillin'})
+        self.assertEqual(drug_catalogue.classify('Amoxicillin', '0000000A0'), {'penicillin'})
+        self.assertEqual(drug_catalogue.classify('Anything', '0502013B0'), frozenset())
+
+
+class SubstringsTest(unittest.TestCase):
+    def test(self):
+        drug_catalogue = DrugCatalogue({'antibacterial': {'bnf_code_prefixes': ['0501']},
+                                        'penicillin': {'bnf_code_prefixes': ['050101'], 'names': ['Amoxicillin ']}})
+
+        self.assertEqual(drug_catalogue.get_substrings('penicillin'), ('Amoxicillin', ',050101'))
+        self.assertEqual(drug_catalogue.get_substrings('antibacterial'), (',0501',))
+        self.assertEqual(drug_catalogue.get_substrings('unknown'), ())
+
+
+class UnknownMatchTypeTest(unittest.TestCase):
+    def test(self):
+        self.assertRaises(ValueError, DrugCatalogue, {'junk': {'names': ['Junk'], 'match': 'regex'}})
@@ -1,3 +1,9 @@
+import bz2
+import gzip
+import lzma
+import os
+import shutil
+import tempfile
 import unittest
 from FileReader import FileReader
 
@@ -88,3 +94,276 @@ class CommaInFieldsTest(unittest.TestCase):
         with self.assertRaises(ValueError):
             for row in dummy_file_reader:
                 pass
+
+
+class ByteRangesTest(unittest.TestCase):
+    def test(self):
+        dummy_file_reader = DummyFileReader('samples/sample.csv', None)
+        byte_ranges = dummy_file_reader.get_byte_ranges(4)
+
+        self.assertEqual(byte_ranges[0][0], 0)
+        self.assertEqual(byte_ranges[-1][1], os.path.getsize('samples/sample.csv'))
+        for previous, current in zip(byte_ranges, byte_ranges[1:]):
+            self.assertEqual(previous[1], current[0])
+
+
+class ParallelReadLineCountTest(unittest.TestCase):
+    def test(self):
+        dummy_file_reader = DummyFileReader('samples/sample.csv', None)
+        dummy_file_reader.set_iteration_method('parallel_read')
+        dummy_file_reader.set_worker_count(3)
+
+        self.assertEqual(list(dummy_file_reader), [])
+        self.assertEqual(dummy_file_reader.get_line_count(), 10)
+
+
+class ShardIterationMethodFailTest(unittest.TestCase):
+    def test(self):
+        dummy_file_reader = DummyFileReader('samples/sample.csv', None)
+
+        self.assertRaises(ValueError, dummy_file_reader.set_shard_iteration_method, 'parallel_read')
+
+
+class ProjectedReadQuotedFieldsTest(unittest.TestCase):
+    def test(self):
+        dummy_file_reader = DummyFileReader('samples/postcode_sample.csv', None)
+        dummy_file_reader.set_iteration_method('projected_read')
+        dummy_file_reader.set_projection(['Parliamentary Constituency Name', 'Socrata ID'])
+
+        rows = list(dummy_file_reader)
+
+        self.assertEqual(len(rows), 9)
+        self.assertEqual(rows[1], ('Manchester, Withington', '909901'))
+        self.assertEqual(dummy_file_reader.get_line_count(), 9)
+
+
+class ProjectionFailTest(unittest.TestCase):
+    def test(self):
+        dummy_file_reader = DummyFileReader('samples/postcode_sample.csv', None)
+
+        self.assertRaises(KeyError, dummy_file_reader.set_projection, ['JUNK'])
+
+
+class ChunkBoundaryTest(unittest.TestCase):
+    def test(self):
+        expected = []
+        with open('samples/address_sample.csv', 'rt') as f:
+            for line in f:
+                expected.append(line.rstrip('\n').split(','))
+
+        for chunk_size in [1, 7, 100, 168, 1 << 20]:
+            dummy_file_reader = DummyFileReader('samples/address_sample.csv', [i for i in range(8)])
+            dummy_file_reader.set_iteration_method('chunky_lazy_read')
+            dummy_file_reader.set_chunk_size(chunk_size)
+
+            self.assertEqual(list(dummy_file_reader), expected)
+            self.assertEqual(dummy_file_reader.get_line_count(), 12)
+
+
+class ChunkyLazyReadFilterTest(unittest.TestCase):
+    def test(self):
+        dummy_file_reader = DummyFileReader('samples/address_sample.csv', [i for i in range(8)])
+        dummy_file_reader.set_iteration_method('chunky_lazy_read')
+        dummy_file_reader.set_chunk_size(64)
+        dummy_file_reader.set_filter('HARTLEPOOL')
+
+        rows = list(dummy_file_reader)
+
+        self.assertTrue(len(rows) > 0)
+        self.assertTrue(all('HARTLEPOOL' in ','.join(row) for row in rows))
+        self.assertEqual(dummy_file_reader.get_line_count(), 12)
+
+
+class ChunkSizeFailTest(unittest.TestCase):
+    def test(self):
+        dummy_file_reader = DummyFileReader('samples/sample.csv', None)
+
+        self.assertRaises(ValueError, dummy_file_reader.set_chunk_size, 0)
+
+
+class MmapReadTest(unittest.TestCase):
+    def test(self):
+        dummy_file_reader = DummyFileReader('samples/prescription_sample.csv', None)
+        dummy_file_reader.set_iteration_method('mmap_read')
+
+        with open('samples/prescription_sample.csv', 'rt') as f:
+            expected = [line.rstrip('\n').split(',') for line in f]
+
+        rows = [list(row) for row in dummy_file_reader]
+
+        self.assertEqual(rows, expected)
+        self.assertEqual(dummy_file_reader.get_line_count(), 22)
+
+
+class MmapReadLazyFieldsTest(unittest.TestCase):
+    def test(self):
+        dummy_file_reader = DummyFileReader('samples/prescription_sample.csv', None)
+        dummy_file_reader.set_iteration_method('mmap_read')
+
+        for row in dummy_file_reader:
+            if row[2] == 'A86008':
+                self.assertEqual(len(row), 9)
+                self.assertEqual(bytes(row.get_bytes(7)), b'00000088.14')
+                self.assertEqual(bytes(row.get_bytes(-1)), b'201109')
+                self.assertRaises(IndexError, row.get_bytes, 9)
+                self.assertEqual(row[-1], '201109')
+                break
+
+
+class MmapReadNegativeIndexTest(unittest.TestCase):
+    def test(self):
+        dummy_file_reader = DummyFileReader('samples/prescription_sample.csv', None)
+        dummy_file_reader.set_iteration_method('mmap_read')
+
+        with open('samples/prescription_sample.csv', 'rt') as f:
+            expected = [line.rstrip('\n').split(',')[-1] for line in f]
+
+        self.assertEqual([bytes(row.get_bytes(-1)).decode() for row in dummy_file_reader], expected)
+        self.assertEqual([row[-1] for row in dummy_file_reader], expected)
+
+
+class FilterPushDownTest(unittest.TestCase):
+    def test(self):
+        expressions = ['Flucloxacillin', 'Peppermint Oil']
+        with open('samples/prescription_sample.csv', 'rt') as f:
+            expected = [line.rstrip('\n').split(',') for line in f
+                        if any(expression in line for expression in expressions)]
+
+        for iteration_method in ['lazy_sequential_read', 'chunky_lazy_read', 'batch_read', 'mmap_read']:
+            dummy_file_reader = DummyFileReader('samples/prescription_sample.csv', None)
+            dummy_file_reader.set_iteration_method(iteration_method)
+            dummy_file_reader.set_filter(expressions)
+
+            if iteration_method == 'batch_read':
+                rows = [row for batch in dummy_file_reader for row in batch]
+            else:
+                rows = [list(row) for row in dummy_file_reader]
+            rows = [[field.rstrip('\n') for field in row] for row in rows]
+
+            self.assertTrue(len(expected) > 0)
+            self.assertEqual(rows, expected)
+            self.assertEqual(dummy_file_reader.get_line_count(), 22)
+
+
+class MmapReadFilterNoMatchTest(unittest.TestCase):
+    def test(self):
+        dummy_file_reader = DummyFileReader('samples/prescription_sample.csv', None)
+        dummy_file_reader.set_iteration_method('mmap_read')
+        dummy_file_reader.set_filter('Not A Drug')
+
+        self.assertEqual(list(dummy_file_reader), [])
+        self.assertEqual(dummy_file_reader.get_filter_expressions(), ('Not A Drug',))
+        self.assertEqual(dummy_file_reader.get_line_count(), 22)
+
+
+def write_compressed_copies(filename, directory):
+    with open(filename, 'rb') as f:
+        content = f.read()
+
+    compressed_files = []
+    for extension, module in [('.gz', gzip), ('.bz2', bz2), ('.xz', lzma)]:
+        compressed_file = os.path.join(directory, os.path.basename(filename) + extension)
+        with module.open(compressed_file, 'wb') as f:
+            f.write(content)
+        compressed_files.append(compressed_file)
+
+    return compressed_files
+
+
+def read_rows(filename, iteration_method):
+    dummy_file_reader = DummyFileReader(filename, None)
+    dummy_file_reader.set_iteration_method(iteration_method)
+    if iteration_method == 'projected_read':
+        dummy_file_reader.set_projection(['PRACTICE', 'ITEMS'])
+
+    rows = [list(row) if iteration_method == 'mmap_read' else row for row in dummy_file_reader]
+    return rows, dummy_file_reader.get_line_count()
+
+
+class CompressedInputTest(unittest.TestCase):
+    def test(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        compressed_files = write_compressed_copies('samples/prescription_sample.csv', directory)
+
+        self.assertEqual([DummyFileReader(filename, None).get_compression() for filename in compressed_files],
+                         ['gzip', 'bz2', 'xz'])
+        self.assertIsNone(DummyFileReader('samples/prescription_sample.csv', None).get_compression())
+
+        for iteration_method in ['lazy_read', 'chunky_lazy_read', 'lazy_sequential_read', 'batch_read',
+                                 'projected_read', 'mmap_read']:
+            expected = read_rows('samples/prescription_sample.csv', iteration_method)
+            for filename in compressed_files:
+                self.assertEqual(read_rows(filename, iteration_method), expected)
+
+
+class CompressedParallelReadTest(unittest.TestCase):
+    def test(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = write_compressed_copies('samples/sample.csv', directory)[0]
+
+        dummy_file_reader = DummyFileReader(filename, None)
+        dummy_file_reader.set_iteration_method('parallel_read')
+        dummy_file_reader.set_worker_count(3)
+
+        self.assertRaises(ValueError, dummy_file_reader.get_byte_ranges, 3)
+        self.assertEqual(list(dummy_file_reader), [])
+        self.assertEqual(dummy_file_reader.get_line_count(), 10)
+
+
+class CompressedOpenFileOffsetTest(unittest.TestCase):
+    def test(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = write_compressed_copies('samples/sample.csv', directory)[0]
+
+        with open('samples/sample.csv', 'rb') as f:
+            f.seek(100)
+            expected = f.read()
+
+        with DummyFileReader(filename, None).open_file('rb', 100) as f:
+            self.assertEqual(f.read(), expected)
+
+
+class SampledReadTest(unittest.TestCase):
+    def test(self):
+        dummy_file_reader = DummyFileReader('samples/prescription_sample.csv', None)
+        dummy_file_reader.set_iteration_method('lazy_sequential_read')
+        expected = list(dummy_file_reader)[1:]
+
+        """ Sampling every block reads every row once, wherever the block boundaries fall
+        """
+        for block_size in [1, 7, 160, 1 << 20]:
+            dummy_file_reader = DummyFileReader('samples/prescription_sample.csv', None)
+            dummy_file_reader.set_sample(1, block_size)
+            dummy_file_reader.set_iteration_method('sampled_read')
+            self.assertEqual(list(dummy_file_reader), expected)
+            self.assertEqual(dummy_file_reader.get_line_count(), 21)
+
+        dummy_file_reader = DummyFileReader('samples/prescription_sample.csv', None)
+        dummy_file_reader.set_sample(0.5, 160, seed=3)
+        dummy_file_reader.set_iteration_method('sampled_read')
+        self.assertEqual(dummy_file_reader.get_block_count(), 16)
+        self.assertEqual(len(dummy_file_reader.get_sampled_blocks()), 8)
+
+        rows = list(dummy_file_reader)
+        self.assertEqual(rows, [row for row in expected if row in rows])
+        self.assertEqual(list(dummy_file_reader), rows)
+
+
+class SampledReadFailTest(unittest.TestCase):
+    def test(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        dummy_file_reader = DummyFileReader('samples/prescription_sample.csv', None)
+        dummy_file_reader.set_iteration_method('sampled_read')
+        self.assertRaises(ValueError, list, dummy_file_reader)
+        self.assertRaises(ValueError, dummy_file_reader.set_sample, 0)
+        self.assertRaises(ValueError, dummy_file_reader.set_sample, 0.5, 0)
+
+        dummy_file_reader = DummyFileReader(write_compressed_copies('samples/sample.csv', directory)[0], None)
+        dummy_file_reader.set_sample(0.5)
+        dummy_file_reader.set_iteration_method('sampled_read')
+        self.assertRaises(ValueError, list, dummy_file_reader)
@@ -0,0 +1,46 @@
+import pickle
+import unittest
+from FileReader.FixedPointParser import FixedPointParser
+
+
+class PenceTest(unittest.TestCase):
+    def test(self):
+        parser = FixedPointParser(2)
+
+        self.assertEqual(parser.parse('00000069.92'), 6992)
+        self.assertEqual(parser.parse('00000069.92'), 6992)
+        self.assertEqual(parser.parse(' 12.5 '), 1250)
+        self.assertEqual(parser.parse('-0.07'), -7)
+        self.assertEqual(parser.parse('3'), 300)
+        self.assertEqual(parser.parse('.5'), 50)
+        self.assertEqual(parser.parse('1.005'), 101)
+        self.assertEqual(parser.parse(6992), 6992)
+
+
+class ItemsTest(unittest.TestCase):
+    def test(self):
+        parser = FixedPointParser(0)
+
+        self.assertEqual(parser.parse('0000027'), 27)
+        self.assertEqual(parser.parse('+4'), 4)
+
+
+class InvalidFieldTest(unittest.TestCase):
+    def test(self):
+        parser = FixedPointParser(2)
+
+        for field in ['ACT COST   ', '', '.', '-', '1.2.3', '1e3', 'nan', '²', '١', None, 1.5]:
+            self.assertIsNone(parser.parse(field))
+
+
+class PickleDropsCacheTest(unittest.TestCase):
+    def test(self):
+        parser = FixedPointParser(2, cache_size=1)
+        parser.parse('1.00')
+        parser.parse('2.00')
+
+        copy = pickle.loads(pickle.dumps(parser))
+
+        self.assertEqual(copy.get_places(), 2)
+        self.assertEqual(copy.parse('2.00'), 200)
+        self.assertRaises(ValueError, FixedPointParser, -1)
@@ -0,0 +1,46 @@
+import pickle
+import unittest
+from FileReader.HyperLogLog import HyperLogLog
+
+
+class CountTest(unittest.TestCase):
+    def test(self):
+        hyper_log_log = HyperLogLog()
+        for repeat in range(3):
+            for index in range(20000):
+                hyper_log_log.add('A' + str(index).zfill(5))
+
+        self.assertLess(abs(hyper_log_log.count() - 20000), 20000 * 3 * hyper_log_log.get_standard_error())
+
+
+class SmallCountTest(unittest.TestCase):
+    def test(self):
+        hyper_log_log = HyperLogLog()
+        self.assertEqual(hyper_log_log.count(), 0)
+
+        for practice in ['A86001', 'A86003', 'A86004', 'A86003', 'A86001']:
+            hyper_log_log.add(practice)
+        self.assertEqual(hyper_log_log.count(), 3)
+
+
+class MergeTest(unittest.TestCase):
+    def test(self):
+        first, second, both = HyperLogLog(10), HyperLogLog(10), HyperLogLog(10)
+        for index in range(3000):
+            (first if index % 2 else second).add(str(index))
+            both.add(str(index))
+
+        """ Shipped back from a worker process
+        """
+        first.merge(pickle.loads(pickle.dumps(second)))
+        self.assertEqual(first.count(), both.count())
+        self.assertRaises(ValueError, first.merge, HyperLogLog(11))
+
+
+class PrecisionFailTest(unittest.TestCase):
+    def test(self):
+        self.assertRaises(ValueError, HyperLogLog, 3)
+        self.assertRaises(ValueError, HyperLogLog, 19)
+
+if __name__ == '__main__':
+    unittest.main()
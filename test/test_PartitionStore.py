@@ -0,0 +1,66 @@
+import shutil
+import tempfile
+import unittest
+from FileReader.PartitionStore import PartitionStore
+from FileReader.PrescriptionFileReader import PrescriptionFileReader
+
+
+class PartitionTest(unittest.TestCase):
+    def test(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        process_prescription_file = PrescriptionFileReader('samples/prescription_sample.csv', None)
+
+        partition_store = PartitionStore(directory)
+        partition_store.partition(process_prescription_file, block_size=4)
+
+        self.assertTrue(partition_store.is_valid(process_prescription_file.get_source_signature()))
+        self.assertEqual(partition_store.get_row_count(), 21)
+        self.assertEqual([(partition['sha'], partition['pct'], partition['rows'], partition['practices'])
+                          for partition in partition_store.get_partitions()],
+                         [('Q30', '5D7', 20, ['A86001', 'A86003', 'A86004', 'A86006', 'A86007', 'A86008']),
+                          ('Q30', '5D9', 1, ['Y00516'])])
+
+        with open('samples/prescription_sample.csv', 'rt') as f:
+            source_lines = [line.rstrip('\n') for line in f]
+        partition_lines = []
+        for partition in partition_store.get_partitions():
+            with open(partition_store.get_partition_file(partition), 'rt') as f:
+                lines = [line.rstrip('\n') for line in f]
+            self.assertEqual(lines[0], source_lines[0])
+            partition_lines.extend(lines[1:])
+        self.assertCountEqual(partition_lines, source_lines[1:])
+
+        """ A new store reads the manifest back
+        """
+        self.assertEqual(PartitionStore(directory).get_partitions(), partition_store.get_partitions())
+
+
+class SelectTest(unittest.TestCase):
+    def test(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        partition_store = PartitionStore(directory)
+        partition_store.partition(PrescriptionFileReader('samples/prescription_sample.csv', None))
+
+        regions = {'A86001': 'LONDON', 'A86003': 'LONDON', 'A86004': 'SOUTH EAST'}
+        self.assertEqual([partition['pct'] for partition in partition_store.select(['SOUTH EAST'], regions.get)],
+                         ['5D7'])
+        self.assertEqual([partition['pct'] for partition in partition_store.select(['UNKNOWN'], regions.get)],
+                         ['5D7', '5D9'])
+        self.assertEqual(partition_store.select(['NORTH EAST'], regions.get), [])
+        self.assertEqual(len(partition_store.select(shas=['Q30'])), 2)
+        self.assertEqual(partition_store.select(shas=['Q31']), [])
+
+
+class NotPartitionedTest(unittest.TestCase):
+    def test(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        partition_store = PartitionStore(directory)
+
+        self.assertFalse(partition_store.is_valid({'size': 0, 'mtime_ns': 0}))
+        self.assertRaises(ValueError, partition_store.get_partitions)
+
+if __name__ == '__main__':
+    unittest.main()
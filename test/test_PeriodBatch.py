@@ -0,0 +1,126 @@
+import bz2
+import gzip
+import lzma
+import os
+import shutil
+import tempfile
+import unittest
+from FileReader.AddressFileReader import AddressFileReader
+from FileReader.PeriodBatch import PeriodBatch
+from FileReader.PostcodeLookupReader import PostcodeLookupReader
+
+address_header = ("Period", "practice_code", "practice_name", "practice_building",
+                  "address", "locality", "town", "postcode")
+
+
+def make_address_reader(filename):
+    process_address_file = AddressFileReader(filename, address_header)
+    process_address_file.set_iteration_method('chunky_lazy_read')
+    for row in process_address_file:
+        process_address_file.process_file(row)
+    return process_address_file
+
+
+def make_postcode_reader():
+    postcode_lookup = PostcodeLookupReader('samples/postcode_sample.csv', None)
+    postcode_lookup.set_iteration_method('lazy_read')
+    for row in postcode_lookup:
+        postcode_lookup.process_file(row)
+    return postcode_lookup
+
+
+def copy_for_period(source, filename, period):
+    with open(source, 'rt') as f:
+        content = f.read()
+    with open(filename, 'wt') as f:
+        f.write(content.replace('201109', period).replace('201202', period))
+
+
+def get_results(process_prescription_file):
+    return [process_prescription_file.get_average_cost_of_prescription(),
+            process_prescription_file.get_average_price_by_region(),
+            process_prescription_file.get_cost_per_prescription(),
+            process_prescription_file.get_antidepressant_count_by_region(),
+            process_prescription_file.get_top_5_spenders()]
+
+
+class PerPeriodAndCumulativeTest(unittest.TestCase):
+    def test(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        for period in ['201109', '201110', '201111']:
+            copy_for_period('samples/prescription_sample.csv', os.path.join(directory, period + '.csv'), period)
+
+        period_batch = PeriodBatch(make_postcode_reader())
+        period_batch.set_worker_count(2)
+        period_batch.add_address_reader(make_address_reader('samples/address_sample.csv'))
+        period_batch.add_prescription_directory(directory)
+        period_batch.process()
+
+        single_period = PeriodBatch(make_postcode_reader())
+        single_period.add_address_reader(make_address_reader('samples/address_sample.csv'))
+        single_period.add_prescription_file('samples/prescription_sample.csv')
+        single_period.process()
+        expected = single_period.get_reader('201109')
+
+        self.assertEqual(period_batch.get_periods(), ['201109', '201110', '201111'])
+        for period in period_batch.get_periods():
+            self.assertEqual(get_results(period_batch.get_reader(period)), get_results(expected))
+
+        cumulative_reader = period_batch.get_cumulative_reader()
+        self.assertEqual(cumulative_reader.get_line_count(), 3 * expected.get_line_count())
+        self.assertEqual(cumulative_reader.get_average_cost_of_prescription(),
+                         expected.get_average_cost_of_prescription())
+        self.assertEqual(cumulative_reader.get_top_5_spenders(),
+                         [(postcode, round(3 * spend, 2)) for postcode, spend in expected.get_top_5_spenders()])
+
+
+class CompressedDirectoryTest(unittest.TestCase):
+    def test(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        for period, opener, extension in [('201109', open, '.csv'), ('201110', gzip.open, '.csv.gz'),
+                                          ('201111', bz2.open, '.csv.bz2'), ('201112', lzma.open, '.csv.xz')]:
+            copy_for_period('samples/prescription_sample.csv', os.path.join(directory, period + '.csv'), period)
+            if opener is not open:
+                with open(os.path.join(directory, period + '.csv'), 'rb') as f, \
+                        opener(os.path.join(directory, period + extension), 'wb') as compressed:
+                    compressed.write(f.read())
+                os.remove(os.path.join(directory, period + '.csv'))
+        open(os.path.join(directory, 'notes.txt'), 'w').close()
+
+        period_batch = PeriodBatch(make_postcode_reader())
+        period_batch.set_worker_count(1)
+        period_batch.add_address_reader(make_address_reader('samples/address_sample.csv'))
+        period_batch.add_prescription_directory(directory)
+        period_batch.process()
+
+        self.assertEqual(period_batch.get_periods(), ['201109', '201110', '201111', '201112'])
+        for period in period_batch.get_periods():
+            self.assertEqual(get_results(period_batch.get_reader(period)),
+                             get_results(period_batch.get_reader('201109')))
+
+
+class AddressPeriodMatchingTest(unittest.TestCase):
+    def test(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        for period in ['201109', '201202']:
+            copy_for_period('samples/address_sample.csv', os.path.join(directory, period + '.csv'), period)
+
+        period_batch = PeriodBatch(make_postcode_reader())
+        for period in ['201202', '201109']:
+            period_batch.add_address_reader(make_address_reader(os.path.join(directory, period + '.csv')))
+
+        self.assertEqual(period_batch.get_address_period('201109'), '201109')
+        self.assertEqual(period_batch.get_address_period('201201'), '201109')
+        self.assertEqual(period_batch.get_address_period('201203'), '201202')
+        self.assertEqual(period_batch.get_address_period('201101'), '201109')
+
+
+class DuplicatePeriodTest(unittest.TestCase):
+    def test(self):
+        period_batch = PeriodBatch(make_postcode_reader())
+        period_batch.add_prescription_file('samples/prescription_sample.csv')
+
+        self.assertRaises(ValueError, period_batch.add_prescription_file, 'samples/prescription_sample.csv')
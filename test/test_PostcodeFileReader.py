@@ -1,3 +1,7 @@
+import json
+import os
+import shutil
+import tempfile
 import unittest
 from FileReader.PostcodeLookupReader import PostcodeLookupReader
 
@@ -34,3 +38,104 @@ class RegionFromPostcodeFailTest(unittest.TestCase):
             postcode_lookup.process_file(row)
 
         self.assertRaises(KeyError, postcode_lookup.get_region_from_postcode, 'Junk')
+
+
+class ParallelReadTest(unittest.TestCase):
+    def test(self):
+        postcode_lookup = PostcodeLookupReader('samples/postcode_sample.csv', None)
+        postcode_lookup.set_iteration_method('parallel_read')
+        postcode_lookup.set_shard_iteration_method('lazy_read')
+        postcode_lookup.set_worker_count(3)
+
+        for row in postcode_lookup:
+            postcode_lookup.process_file(row)
+
+        self.assertEqual(postcode_lookup.get_total_postcodes(), 8)
+        self.assertEqual(postcode_lookup.get_regions_list(), ['South West', 'North West', 'West Midlands', 'London'])
+        self.assertEqual(postcode_lookup.get_region_from_postcode('WA3'), 'North West')
+
+
+class IndexRoundTripTest(unittest.TestCase):
+    def test(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        postcode_lookup = PostcodeLookupReader('samples/postcode_sample.csv', None)
+        postcode_lookup.set_index_file(os.path.join(directory, 'postcodes.index'))
+        self.assertFalse(postcode_lookup.load_index())
+
+        postcode_lookup.set_iteration_method('lazy_read')
+        for row in postcode_lookup:
+            postcode_lookup.process_file(row)
+        postcode_lookup.save_index()
+
+        indexed_lookup = PostcodeLookupReader('samples/postcode_sample.csv', None)
+        indexed_lookup.set_index_file(os.path.join(directory, 'postcodes.index'))
+
+        self.assertTrue(indexed_lookup.load_index())
+        self.assertEqual(indexed_lookup.get_total_postcodes(), 8)
+        self.assertEqual(indexed_lookup.get_regions_list(), postcode_lookup.get_regions_list())
+        self.assertEqual(indexed_lookup.get_region_from_postcode('BH21'), 'South West')
+
+
+class StaleIndexTest(unittest.TestCase):
+    def test(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = os.path.join(directory, 'postcodes.csv')
+        shutil.copy('samples/postcode_sample.csv', filename)
+
+        postcode_lookup = PostcodeLookupReader(filename, None)
+        postcode_lookup.set_iteration_method('lazy_read')
+        for row in postcode_lookup:
+            postcode_lookup.process_file(row)
+        postcode_lookup.save_index()
+
+        with open(filename, 'at') as f:
+            f.write('\n')
+
+        self.assertFalse(PostcodeLookupReader(filename, None).load_index())
+
+
+class MalformedIndexTest(unittest.TestCase):
+    def test(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        postcode_lookup = PostcodeLookupReader('samples/postcode_sample.csv', None)
+        postcode_lookup.set_index_file(os.path.join(directory, 'postcodes.index'))
+
+        for contents in ['[1, 2, 3]', '"index"', 'null', '{"source": ' +
+                         json.dumps(postcode_lookup.get_source_signature()) + ', "regions": [], "lookup": []}']:
+            with open(postcode_lookup.get_index_file(), 'wt') as f:
+                f.write(contents)
+            self.assertFalse(postcode_lookup.load_index())
+
+
+class UnwritableIndexTest(unittest.TestCase):
+    def test(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        postcode_lookup = PostcodeLookupReader('samples/postcode_sample.csv', None)
+        postcode_lookup.set_index_file(os.path.join(directory, 'missing', 'postcodes.index'))
+        postcode_lookup.set_iteration_method('lazy_read')
+
+        for row in postcode_lookup:
+            postcode_lookup.process_file(row)
+
+        self.assertFalse(postcode_lookup.save_index())
+        self.assertFalse(postcode_lookup.load_index())
+        self.assertEqual(postcode_lookup.get_region_from_postcode('BH21'), 'South West')
+
+
+class ProjectedReadTest(unittest.TestCase):
+    def test(self):
+        postcode_lookup = PostcodeLookupReader('samples/postcode_sample.csv', None)
+        postcode_lookup.set_iteration_method('projected_read')
+
+        for row in postcode_lookup:
+            self.assertEqual(len(row), 2)
+            postcode_lookup.process_file(row)
+
+        self.assertEqual(postcode_lookup.get_total_postcodes(), 8)
+        self.assertEqual(postcode_lookup.get_regions_list(), ['South West', 'North West', 'West Midlands', 'London'])
+        self.assertEqual(postcode_lookup.get_region_from_postcode('W1H'), 'London')
@@ -0,0 +1,53 @@
+import unittest
+from FileReader.AddressFileReader import AddressFileReader
+from FileReader.PostcodeLookupReader import PostcodeLookupReader
+from FileReader.PracticeDimension import PracticeDimension
+
+
+class PopulateFromReadersTest(unittest.TestCase):
+    def test(self):
+        header = ("Period", "practice_code", "practice_name", "practice_building",
+                  "address", "locality", "town", "postcode")
+        process_address_file = AddressFileReader('samples/address_sample.csv', header)
+        process_address_file.set_iteration_method('chunky_lazy_read')
+        for row in process_address_file:
+            process_address_file.process_file(row)
+
+        postcode_lookup = PostcodeLookupReader('samples/postcode_sample.csv', None)
+        postcode_lookup.set_iteration_method('lazy_read')
+        for row in postcode_lookup:
+            postcode_lookup.process_file(row)
+
+        practice_dimension = PracticeDimension()
+        practice_dimension.populate(process_address_file, postcode_lookup)
+        practice_id = practice_dimension.get_practice_id('A81010')
+
+        self.assertEqual(practice_dimension.get_practice_count(), 12)
+        self.assertEqual(practice_dimension.get_practice_code(practice_id), 'A81010')
+        self.assertEqual(practice_dimension.get_postcode(practice_id), 'TS24 9DN')
+        self.assertEqual(practice_dimension.get_outer_postcode(practice_id), 'TS24')
+        self.assertEqual(practice_dimension.get_regions(), postcode_lookup.get_regions_list())
+
+
+class IntegerInternedRegionsTest(unittest.TestCase):
+    def test(self):
+        practice_dimension = PracticeDimension()
+        first = practice_dimension.add_practice('P1', 'AB1 2CD', 'LONDON')
+        second = practice_dimension.add_practice('P2', 'EF3 4GH', 'LONDON')
+        third = practice_dimension.add_practice('P3', 'IJ5 6KL', None)
+
+        self.assertEqual([first, second, third], [0, 1, 2])
+        self.assertEqual(practice_dimension.get_region_id(first), practice_dimension.get_region_id(second))
+        self.assertEqual(practice_dimension.get_region_name(practice_dimension.get_region_id(first)), 'LONDON')
+        self.assertEqual(practice_dimension.get_region(third), None)
+        self.assertEqual(practice_dimension.get_region_from_postcode('AB1 2CD'), 'LONDON')
+
+
+class UnknownPracticeTest(unittest.TestCase):
+    def test(self):
+        practice_dimension = PracticeDimension()
+        practice_dimension.add_practice('P1', 'AB1 2CD', 'LONDON')
+
+        self.assertEqual(practice_dimension.get_practice_id('JUNK'), None)
+        self.assertEqual(practice_dimension.get_postcode_for_practice('JUNK'), None)
+        self.assertEqual(practice_dimension.get_region(None), None)
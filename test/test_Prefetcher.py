@@ -0,0 +1,48 @@
+import unittest
+from FileReader.Prefetcher import Prefetcher
+from FileReader.PrescriptionFileReader import PrescriptionFileReader
+
+
+class PrefetchedRowsMatchTest(unittest.TestCase):
+    def test(self):
+        rows = []
+        for prefetch in [False, True]:
+            process_prescription_file = PrescriptionFileReader('samples/prescription_sample.csv', None)
+            process_prescription_file.set_iteration_method('lazy_sequential_read')
+            iterable = Prefetcher(process_prescription_file, block_size=4, queue_size=2) if prefetch \
+                else process_prescription_file
+            rows.append(list(iterable))
+
+        self.assertEqual(rows[0], rows[1])
+        self.assertEqual(process_prescription_file.get_line_count(), 22)
+
+
+class PrefetchErrorTest(unittest.TestCase):
+    def test(self):
+        def failing_rows():
+            yield 1
+            raise ValueError('Broken row.')
+
+        prefetcher = Prefetcher(failing_rows(), block_size=1)
+        iterator = iter(prefetcher)
+
+        self.assertEqual(next(iterator), 1)
+        self.assertRaises(ValueError, next, iterator)
+
+
+class PrefetchStopsEarlyTest(unittest.TestCase):
+    def test(self):
+        read = []
+
+        def rows():
+            for row in range(1000):
+                read.append(row)
+                yield row
+
+        prefetcher = Prefetcher(rows(), block_size=10, queue_size=2)
+        for row in prefetcher:
+            if row == 5:
+                break
+        prefetcher.close()
+
+        self.assertLess(len(read), 1000)
@@ -0,0 +1,248 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+from FileReader.DrugCatalogue import DrugCatalogue
+from FileReader.PracticeDimension import PracticeDimension
+from FileReader.PrescriptionRecord import PrescriptionRecord
+from FileReader.PrescriptionAggregators import AverageCostAggregator, SpendByPostcodeAggregator, \
+    PriceByRegionAggregator, AntidepressantCountAggregator, BnfHierarchyAggregator, PracticeBnfPeriodAggregator, \
+    SampledAverageAggregator, DistinctCountAggregator, HeavySpenderAggregator
+
+
+drug_catalogue = DrugCatalogue.load()
+
+
+def make_record(practice, bnf_name, items, act_cost):
+    return PrescriptionRecord(practice, '0000000A0', bnf_name, items, act_cost, drug_catalogue.classify(bnf_name),
+                              {'P1': 'AB1 2CD', 'P2': 'EF3 4GH', 'P3': None}.get,
+                              {'AB1 2CD': 'LONDON', 'EF3 4GH': 'NORTH WEST'}.get)
+
+
+class RecordResolvesPostcodeOnceTest(unittest.TestCase):
+    def test(self):
+        calls = []
+
+        def lookup(practice):
+            calls.append(practice)
+            return 'AB1 2CD'
+
+        record = PrescriptionRecord('P1', '0000000A0', 'Peppermint Oil', 1, 200, frozenset(), lookup,
+                                    {'AB1 2CD': 'LONDON'}.get)
+
+        self.assertEqual(record.get_postcode(), 'AB1 2CD')
+        self.assertEqual(record.get_region(), 'LONDON')
+        self.assertEqual(calls, ['P1'])
+
+
+class RecordRemembersUnknownRegionTest(unittest.TestCase):
+    def test(self):
+        calls = []
+
+        def lookup(postcode):
+            calls.append(postcode)
+            raise KeyError('The region for this postcode is not available.')
+
+        record = PrescriptionRecord('P1', '0000000A0', 'Peppermint Oil', 1, 200, frozenset(), {'P1': 'ZZ9 9ZZ'}.get,
+                                    lookup)
+
+        self.assertIsNone(record.get_region())
+        self.assertIsNone(record.get_region())
+        self.assertEqual(calls, ['ZZ9 9ZZ'])
+
+
+class RecordPostcodeLookupNotSetTest(unittest.TestCase):
+    def test(self):
+        record = PrescriptionRecord('P1', '0000000A0', 'Peppermint Oil', 1, 200, frozenset(), None, None)
+
+        self.assertRaises(ValueError, record.get_postcode)
+
+
+class RecordResolvesDimensionLazilyTest(unittest.TestCase):
+    def test(self):
+        practice_dimension = PracticeDimension()
+        practice_dimension.add_practice('P1', 'AB1 2CD', 'LONDON')
+        practice_dimension = MagicMock(wraps=practice_dimension)
+
+        record = PrescriptionRecord('P1', '0000000A0', 'Peppermint Oil', 1, 200, frozenset(), None, None,
+                                    practice_dimension)
+
+        self.assertEqual(record.practice_id, 0)
+        practice_dimension.get_postcode.assert_not_called()
+        practice_dimension.get_region.assert_not_called()
+        self.assertEqual(record.get_postcode(), 'AB1 2CD')
+        self.assertEqual(record.get_region(), 'LONDON')
+        practice_dimension.get_region.assert_called_once_with(0)
+
+
+class AverageCostMergeTest(unittest.TestCase):
+    def test(self):
+        first = AverageCostAggregator()
+        second = AverageCostAggregator()
+        first.update(make_record('P1', 'Peppermint Oil', 1, 1000))
+        second.update(make_record('P2', 'Peppermint Oil', 1, 2000))
+        second.update(make_record('P2', 'Mirtazapine', 1, 9000))
+        first.merge(second)
+
+        self.assertEqual(first.get_average(), 15.0)
+
+
+class SpendByPostcodeTest(unittest.TestCase):
+    def test(self):
+        aggregator = SpendByPostcodeAggregator()
+        for record in [make_record('P1', 'Leg Bags', 1, 1000), make_record('P3', 'Leg Bags', 1, 500),
+                       make_record('P1', 'Leg Bags', 1, 250), make_record('P2', 'Leg Bags', None, None)]:
+            aggregator.update(record)
+
+        self.assertEqual(aggregator.get_spend_by_postcode(), {'AB1 2CD': 1250, 'UNKNOWN': 500})
+
+
+class PriceByRegionTest(unittest.TestCase):
+    def test(self):
+        aggregator = PriceByRegionAggregator()
+        aggregator.set_regions(['LONDON', 'NORTH WEST'])
+        for record in [make_record('P1', 'Flucloxacillin', 2, 1000), make_record('P2', 'Flucloxacillin', 1, 300),
+                       make_record('P3', 'Flucloxacillin', 1, 400), make_record('P1', 'Leg Bags', 1, 9900)]:
+            aggregator.update(record)
+
+        self.assertEqual(aggregator.get_average_price_by_region(), {'LONDON': 5.0, 'NORTH WEST': 3.0, 'UNKNOWN': 4.0})
+        self.assertEqual(aggregator.get_cost_per_prescription(), 4.0)
+
+
+class AntidepressantCountNeedsRegionsTest(unittest.TestCase):
+    def test(self):
+        aggregator = AntidepressantCountAggregator()
+        aggregator.update(make_record('P1', 'Mirtazapine', 3, 1000))
+        self.assertEqual(aggregator.get_count_by_region(), {})
+
+        aggregator.set_regions(['LONDON', 'NORTH WEST'])
+        aggregator.update(make_record('P1', 'Mirtazapine                    ', 3, 1000))
+        aggregator.update(make_record('P3', 'Mirtazapine', 3, 1000))
+        self.assertEqual(aggregator.get_count_by_region(), {'LONDON': 3, 'NORTH WEST': 0})
+
+
+class BnfHierarchyRollUpTest(unittest.TestCase):
+    def test(self):
+        aggregator = BnfHierarchyAggregator()
+        for practice, bnf_code, items, act_cost in [('P1', '0501013B0', 2, 1000), ('P2', '0501015P0', 1, 400),
+                                                    ('P1', '0502000C0', 1, 100), ('P3', '2250     ', 3, 900)]:
+            aggregator.update(PrescriptionRecord(practice, bnf_code, 'Name', items, act_cost, frozenset(),
+                                                 {'P1': 'AB1 2CD', 'P2': 'EF3 4GH', 'P3': None}.get,
+                                                 {'AB1 2CD': 'LONDON', 'EF3 4GH': 'NORTH WEST'}.get))
+
+        self.assertEqual(aggregator.get_totals('chapter'), {'05': (4, 1500), '22': (3, 900)})
+        self.assertEqual(aggregator.get_totals('section', '05'), {'0501': (3, 1400), '0502': (1, 100)})
+        self.assertEqual(aggregator.get_totals('paragraph'), {'050101': (3, 1400), '050200': (1, 100)})
+        self.assertEqual(aggregator.get_totals_by_region('0501'), {'LONDON': (2, 1000), 'NORTH WEST': (1, 400)})
+        self.assertEqual(aggregator.get_totals_by_region('2250'), {'UNKNOWN': (3, 900)})
+        self.assertRaises(ValueError, aggregator.get_totals, 'junk')
+        self.assertRaises(ValueError, aggregator.get_totals_by_region, '050')
+
+
+
+class AverageRoundsHalfPennyToEvenTest(unittest.TestCase):
+    def test(self):
+        aggregator = AverageCostAggregator()
+        for act_cost in [3054, 3055, 3055, 3054]:
+            aggregator.update(make_record('P1', 'Peppermint Oil', 1, act_cost))
+
+        self.assertEqual(aggregator.get_average(), 30.54)
+        self.assertEqual(AverageCostAggregator.average_in_pounds(21517, 2), 107.58)
+        self.assertEqual(AverageCostAggregator.average_in_pounds(1000, 3), 3.33)
+        self.assertEqual(AverageCostAggregator.average_in_pounds(-7, 2), -0.04)
+        self.assertEqual(AverageCostAggregator.average_in_pounds(15 * 10 ** 6, 1, 10 ** 6), 0.15)
+
+
+class PracticeBnfPeriodSpillsWithinBudgetTest(unittest.TestCase):
+    def test(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        records = [PrescriptionRecord(practice, bnf_code, 'Drug', items, act_cost, frozenset(), None, None,
+                                      period=period)
+                   for practice, bnf_code, period, items, act_cost in
+                   [('P2', '0403 ', '201109 ', 1, 100), ('P1', '0101', '201109', 2, 250),
+                    ('P2', '0403', '201110', 1, 90), ('P1', '0101', '201109', 3, 300),
+                    ('P3', '0101', '201109', None, 50), ('P2', '0403', '201109', 4, 20)]]
+
+        aggregators = [PracticeBnfPeriodAggregator(), PracticeBnfPeriodAggregator(max_keys=1, directory=directory)]
+        for aggregator in aggregators:
+            for record in records:
+                aggregator.update(record)
+
+        expected_totals = [(('P1', '0101', '201109'), (2, 5, 550)), (('P2', '0403', '201109'), (2, 5, 120)),
+                           (('P2', '0403', '201110'), (1, 1, 90))]
+        self.assertEqual(list(aggregators[0].get_totals()), expected_totals)
+        self.assertEqual(list(aggregators[1].get_totals()), expected_totals)
+        self.assertEqual(aggregators[0].get_spilled_run_count(), 0)
+        self.assertEqual(aggregators[1].get_spilled_run_count(), 4)
+
+        aggregators[1].close()
+        self.assertEqual(os.listdir(directory), [])
+
+
+class SampledAverageIntervalTest(unittest.TestCase):
+    def test(self):
+        sampled_average = SampledAverageAggregator()
+        sampled_average.set_regions(['LONDON', 'NORTH WEST'])
+
+        """ Blocks 0, 1 and 2 of 4 are read, block 2 has no Peppermint Oil
+        """
+        for block, costs in [(0, [100, 200]), (1, [400]), (2, [])]:
+            sampled_average.start_block(block)
+            for act_cost in costs:
+                sampled_average.update(make_record('P1', 'Peppermint Oil', 1, act_cost))
+            sampled_average.update(make_record('P1', 'Flucloxacillin', 2, 300))
+
+        self.assertEqual(sampled_average.get_sampled_block_count(), 3)
+        self.assertEqual(sampled_average.get_average_cost(4), (2.33, 1.39, 3.28))
+        self.assertEqual(sampled_average.get_average_cost(3), (2.33, 2.33, 2.33))
+        self.assertEqual(sampled_average.get_average_price_by_region(4), {'LONDON': (1.5, 1.5, 1.5),
+                                                                          'NORTH WEST': None})
+        self.assertEqual(sampled_average.get_cost_per_prescription(4), (1.5, 1.5, 1.5))
+
+
+class SampledAverageSingleBlockTest(unittest.TestCase):
+    def test(self):
+        sampled_average = SampledAverageAggregator()
+        for block in [0, 5]:
+            sampled_average.start_block(block)
+        sampled_average.update(make_record('P1', 'Peppermint Oil', 1, 400))
+
+        self.assertEqual(sampled_average.get_average_cost(10), (4.0, float('-inf'), float('inf')))
+        self.assertRaises(ValueError, sampled_average.get_cost_per_prescription, 10)
+
+
+class DistinctCountTest(unittest.TestCase):
+    def test(self):
+        distinct_count = DistinctCountAggregator()
+        for practice in ['P1', 'P1', 'P2', 'P3', 'P1']:
+            distinct_count.update(make_record(practice, 'Peppermint Oil', 1, 100))
+
+        self.assertEqual(distinct_count.get_practice_count(), 3)
+        self.assertEqual(distinct_count.get_bnf_code_count(), 1)
+
+
+class HeavySpenderTest(unittest.TestCase):
+    def test(self):
+        heavy_spenders = HeavySpenderAggregator(capacity=2)
+        for practice, act_cost in [('P1', 100), ('P3', 50), ('P2', 400), ('P1', 250), ('P3', 500), ('P2', None)]:
+            heavy_spenders.update(make_record(practice, 'Peppermint Oil', 1, act_cost))
+
+        self.assertEqual(heavy_spenders.get_top_spenders(2), [('UNKNOWN', 5.5), ('EF3 4GH', 4.0)])
+        self.assertEqual(heavy_spenders.get_top_spenders(1, scale=2), [('UNKNOWN', 11.0)])
+        self.assertEqual(HeavySpenderAggregator().get_top_spenders(), None)
+
+
+class HeavySpenderEvictionTest(unittest.TestCase):
+    def test(self):
+        heavy_spenders = HeavySpenderAggregator(capacity=10)
+        for index in range(3000):
+            postcode = ['HEAVY1', 'HEAVY2', 'HEAVY3'][index % 3] if index % 10 == 0 else 'LIGHT' + str(index)
+            heavy_spenders.update(PrescriptionRecord(postcode, '0000000A0', 'Peppermint Oil', 1, 100, frozenset(),
+                                                     lambda practice: practice, None))
+
+        self.assertEqual(heavy_spenders.get_top_spenders(3), [('HEAVY1', 100.0), ('HEAVY2', 100.0),
+                                                              ('HEAVY3', 100.0)])
+
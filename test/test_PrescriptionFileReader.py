@@ -1,6 +1,14 @@
+import gzip
+import os
+import shutil
+import tempfile
 import unittest
 from unittest.mock import MagicMock
-from FileReader.PrescriptionFileReader import PrescriptionFileReader
+from FileReader.Aggregator import Aggregator
+from FileReader.PracticeDimension import PracticeDimension
+from FileReader.PrescriptionAggregators import BnfHierarchyAggregator, SpendByPracticeAggregator, \
+    PracticeBnfPeriodAggregator
+from FileReader.PrescriptionFileReader import PrescriptionFileReader, numpy
 
 
 def dummy_postcode_lookup_method(practice_code):
@@ -161,3 +169,648 @@ class IsNumberPassTest(unittest.TestCase):
 class IsNumberFailTest(unittest.TestCase):
     def test(self):
         self.assertEquals(PrescriptionFileReader.is_number('Two'), False)
+
+
+class ParallelReadMatchesSequentialTest(unittest.TestCase):
+    def test(self):
+        results = []
+        for iteration_method in ['lazy_sequential_read', 'parallel_read']:
+            process_prescription_file = PrescriptionFileReader('samples/prescription_sample.csv', None)
+            process_prescription_file.set_iteration_method(iteration_method)
+            process_prescription_file.set_worker_count(3)
+            process_prescription_file.set_postcode_to_region_lookup(dummy_postcode_to_region_lookup)
+            process_prescription_file.set_practice_code_to_postcode_lookup(dummy_postcode_lookup_method)
+            process_prescription_file.setup_region_based_dictionaries(['LONDON', 'SOUTH EAST', 'SOUTH WEST',
+                                                                       'NORTH WEST'])
+
+            for row in process_prescription_file:
+                process_prescription_file.process_file(row)
+
+            results.append([process_prescription_file.get_line_count(),
+                            process_prescription_file.get_average_cost_of_prescription(),
+                            process_prescription_file.get_average_price_by_region(),
+                            process_prescription_file.get_cost_per_prescription(),
+                            process_prescription_file.get_antidepressant_count_by_region(),
+                            process_prescription_file.get_top_5_spenders()])
+
+        self.assertEqual(results[0], results[1])
+
+
+class ColumnarReadMatchesSequentialTest(unittest.TestCase):
+    def test(self):
+        cache_directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_directory)
+
+        results = []
+        for iteration_method in ['lazy_sequential_read', 'columnar_read']:
+            process_prescription_file = PrescriptionFileReader('samples/prescription_sample.csv', None)
+            process_prescription_file.set_iteration_method(iteration_method)
+            process_prescription_file.set_cache_directory(cache_directory)
+            process_prescription_file.set_postcode_to_region_lookup(dummy_postcode_to_region_lookup)
+            process_prescription_file.set_practice_code_to_postcode_lookup(dummy_postcode_lookup_method)
+            process_prescription_file.setup_region_based_dictionaries(['LONDON', 'SOUTH EAST', 'SOUTH WEST',
+                                                                       'NORTH WEST'])
+
+            for row in process_prescription_file:
+                process_prescription_file.process_file(row)
+
+            results.append([process_prescription_file.get_average_cost_of_prescription(),
+                            process_prescription_file.get_average_price_by_region(),
+                            process_prescription_file.get_cost_per_prescription(),
+                            process_prescription_file.get_antidepressant_count_by_region(),
+                            process_prescription_file.get_top_5_spenders()])
+
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(process_prescription_file.get_line_count(), 21)
+
+
+class ColumnarCacheInvalidationTest(unittest.TestCase):
+    def test(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = os.path.join(directory, 'prescriptions.csv')
+        shutil.copy('samples/prescription_sample.csv', filename)
+
+        process_prescription_file = PrescriptionFileReader(filename, None)
+        process_prescription_file.build_columnar_cache()
+        cache = process_prescription_file.get_columnar_cache()
+
+        self.assertTrue(cache.is_valid(process_prescription_file.get_source_signature()))
+        self.assertEqual(cache.get_row_count(), 21)
+
+        status = os.stat(filename)
+        os.utime(filename, ns=(status.st_atime_ns, status.st_mtime_ns + 10 ** 9))
+
+        self.assertFalse(cache.is_valid(process_prescription_file.get_source_signature()))
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class ProcessBatchMatchesSequentialTest(unittest.TestCase):
+    def test(self):
+        cache_directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_directory)
+
+        results = []
+        for iteration_method in ['lazy_sequential_read', 'batch_read', 'columnar_batch_read']:
+            process_prescription_file = PrescriptionFileReader('samples/prescription_sample.csv', None)
+            process_prescription_file.set_iteration_method(iteration_method)
+            process_prescription_file.set_cache_directory(cache_directory)
+            process_prescription_file.set_batch_size(8)
+            process_prescription_file.set_postcode_to_region_lookup(dummy_postcode_to_region_lookup)
+            process_prescription_file.set_practice_code_to_postcode_lookup(dummy_postcode_lookup_method)
+            process_prescription_file.setup_region_based_dictionaries(['LONDON', 'SOUTH EAST', 'SOUTH WEST',
+                                                                       'NORTH WEST'])
+            process_prescription_file.register_aggregator('bnf_hierarchy', BnfHierarchyAggregator())
+
+            for rows in process_prescription_file:
+                if iteration_method == 'lazy_sequential_read':
+                    process_prescription_file.process_file(rows)
+                else:
+                    process_prescription_file.process_batch(rows)
+
+            results.append([process_prescription_file.get_average_cost_of_prescription(),
+                            process_prescription_file.get_average_price_by_region(),
+                            process_prescription_file.get_cost_per_prescription(),
+                            process_prescription_file.get_antidepressant_count_by_region(),
+                            process_prescription_file.get_top_5_spenders(),
+                            {code: (items, round(spend, 2))
+                             for code, (items, spend) in process_prescription_file.get_bnf_totals('chemical').items()},
+                            process_prescription_file.get_bnf_totals_by_region('01')])
+
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0], results[2])
+        self.assertEqual(process_prescription_file.get_line_count(), 21)
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class ProcessBatchPostcodeLookupNotSetTest(unittest.TestCase):
+    def test(self):
+        process_prescription_file = PrescriptionFileReader('samples/prescription_sample.csv', None)
+        process_prescription_file.set_iteration_method('batch_read')
+
+        with self.assertRaises(ValueError):
+            for rows in process_prescription_file:
+                process_prescription_file.process_batch(rows)
+
+
+class CustomAggregatorTest(unittest.TestCase):
+    def test(self):
+        class ItemCountAggregator(Aggregator):
+            def __init__(self):
+                self.items = 0
+
+            def update(self, record):
+                if record.items is not None:
+                    self.items += record.items
+
+            def merge(self, other):
+                self.items += other.items
+
+        process_prescription_file = PrescriptionFileReader('samples/prescription_sample.csv', None)
+        process_prescription_file.set_iteration_method('lazy_sequential_read')
+        process_prescription_file.set_postcode_to_region_lookup(dummy_postcode_to_region_lookup)
+        process_prescription_file.set_practice_code_to_postcode_lookup(dummy_postcode_lookup_method)
+        process_prescription_file.setup_region_based_dictionaries(['LONDON', 'SOUTH EAST', 'SOUTH WEST', 'NORTH WEST'])
+        process_prescription_file.register_aggregator('item_count', ItemCountAggregator())
+
+        for row in process_prescription_file:
+            process_prescription_file.process_file(row)
+
+        self.assertEqual(process_prescription_file.get_aggregator('item_count').items, 697)
+        self.assertRaises(KeyError, process_prescription_file.get_aggregator, 'junk')
+
+
+class RecordFieldsTest(unittest.TestCase):
+    def test(self):
+        class RecordingAggregator(Aggregator):
+            def __init__(self, record_fields):
+                self.record_fields = record_fields
+                self.records = []
+
+            def get_record_fields(self):
+                return self.record_fields
+
+            def update(self, record):
+                self.records.append(record)
+
+            def merge(self, other):
+                self.records.extend(other.records)
+
+        process_prescription_file = PrescriptionFileReader('samples/prescription_sample.csv', None)
+        process_prescription_file.set_iteration_method('lazy_sequential_read')
+        for name in list(process_prescription_file.get_aggregators()):
+            process_prescription_file.remove_aggregator(name)
+        process_prescription_file.register_aggregator('items', RecordingAggregator({'items'}))
+
+        for row in process_prescription_file:
+            process_prescription_file.process_file(row)
+
+        record = process_prescription_file.get_aggregator('items').records[-1]
+        self.assertEqual(record.items, 2)
+        self.assertIsNone(record.practice)
+        self.assertIsNone(record.categories)
+        self.assertIsNone(record.period)
+
+        process_prescription_file.register_aggregator('period', RecordingAggregator({'period', 'categories'}))
+        record = process_prescription_file.decode_row(row)
+        self.assertEqual(record.period.strip(), '201109')
+        self.assertEqual(record.bnf_name.strip(), 'Nicotine')
+        self.assertIsNone(record.act_cost)
+
+        process_prescription_file.register_aggregator('everything', RecordingAggregator(None))
+        record = process_prescription_file.decode_row(row)
+        self.assertIsNotNone(record.practice)
+        self.assertIsNotNone(record.act_cost)
+
+
+class PracticeDimensionMatchesLookupsTest(unittest.TestCase):
+    def test(self):
+        practice_dimension = PracticeDimension()
+        for practice_code in ['A86001', 'A86003', 'A86004', 'Y00516', 'A86006', 'A86007', 'A86008']:
+            postcode = dummy_postcode_lookup_method(practice_code)
+            practice_dimension.add_practice(practice_code, postcode, dummy_postcode_to_region_lookup(postcode))
+
+        results = []
+        for use_dimension in [False, True]:
+            process_prescription_file = PrescriptionFileReader('samples/prescription_sample.csv', None)
+            process_prescription_file.set_iteration_method('lazy_sequential_read')
+            if use_dimension:
+                process_prescription_file.set_practice_dimension(practice_dimension)
+            else:
+                process_prescription_file.set_postcode_to_region_lookup(dummy_postcode_to_region_lookup)
+                process_prescription_file.set_practice_code_to_postcode_lookup(dummy_postcode_lookup_method)
+            process_prescription_file.setup_region_based_dictionaries(['LONDON', 'SOUTH EAST', 'SOUTH WEST',
+                                                                       'NORTH WEST'])
+
+            for row in process_prescription_file:
+                process_prescription_file.process_file(row)
+
+            results.append([process_prescription_file.get_average_cost_of_prescription(),
+                            process_prescription_file.get_average_price_by_region(),
+                            process_prescription_file.get_cost_per_prescription(),
+                            process_prescription_file.get_antidepressant_count_by_region(),
+                            process_prescription_file.get_top_5_spenders()])
+
+        self.assertEqual(results[0], results[1])
+
+
+class MmapReadMatchesSequentialTest(unittest.TestCase):
+    def test(self):
+        results = []
+        for iteration_method in ['lazy_sequential_read', 'mmap_read']:
+            process_prescription_file = PrescriptionFileReader('samples/prescription_sample.csv', None)
+            process_prescription_file.set_iteration_method(iteration_method)
+            process_prescription_file.set_postcode_to_region_lookup(dummy_postcode_to_region_lookup)
+            process_prescription_file.set_practice_code_to_postcode_lookup(dummy_postcode_lookup_method)
+            process_prescription_file.setup_region_based_dictionaries(['LONDON', 'SOUTH EAST', 'SOUTH WEST',
+                                                                       'NORTH WEST'])
+
+            for row in process_prescription_file:
+                process_prescription_file.process_file(row)
+
+            results.append([process_prescription_file.get_average_cost_of_prescription(),
+                            process_prescription_file.get_average_price_by_region(),
+                            process_prescription_file.get_cost_per_prescription(),
+                            process_prescription_file.get_antidepressant_count_by_region(),
+                            process_prescription_file.get_top_5_spenders()])
+
+        self.assertEqual(results[0], results[1])
+
+
+class TopSpendersIsRepeatableTest(unittest.TestCase):
+    def test(self):
+        process_prescription_file = PrescriptionFileReader('samples/prescription_sample.csv', None)
+        process_prescription_file.set_iteration_method('lazy_sequential_read')
+        process_prescription_file.set_postcode_to_region_lookup(dummy_postcode_to_region_lookup)
+        process_prescription_file.set_practice_code_to_postcode_lookup(dummy_postcode_lookup_method)
+        process_prescription_file.setup_region_based_dictionaries(['LONDON', 'SOUTH EAST', 'SOUTH WEST', 'NORTH WEST'])
+
+        for row in process_prescription_file:
+            process_prescription_file.process_file(row)
+
+        expected_list = [('XYZ3 ABC', 2864.9), ('XYZ2 ABC', 1583.24), ('XYZ6 ABC', 97.11), ('XYZ5 ABC', 34.5),
+                         ('UNKNOWN', 29.02)]
+        self.assertEqual(process_prescription_file.get_top_5_spenders(), expected_list)
+        self.assertEqual(process_prescription_file.get_top_5_spenders(), expected_list)
+        self.assertEqual(process_prescription_file.get_top_spenders(2), expected_list[:2])
+        self.assertEqual(len(process_prescription_file.get_top_spenders(100)), 7)
+
+
+class TopSpendersByPracticeAndRegionTest(unittest.TestCase):
+    def test(self):
+        process_prescription_file = PrescriptionFileReader('samples/prescription_sample.csv', None)
+        process_prescription_file.set_iteration_method('lazy_sequential_read')
+        process_prescription_file.set_postcode_to_region_lookup(dummy_postcode_to_region_lookup)
+        process_prescription_file.set_practice_code_to_postcode_lookup(dummy_postcode_lookup_method)
+        process_prescription_file.setup_region_based_dictionaries(['LONDON', 'SOUTH EAST', 'SOUTH WEST', 'NORTH WEST'])
+        self.assertRaises(KeyError, process_prescription_file.get_top_spenders_by_practice)
+        process_prescription_file.register_aggregator('spend_by_practice', SpendByPracticeAggregator())
+
+        for row in process_prescription_file:
+            process_prescription_file.process_file(row)
+
+        self.assertEqual(process_prescription_file.get_top_spenders_by_practice(2),
+                         [('A86004', 2864.9), ('A86003', 1583.24)])
+
+        top_spenders_by_region = process_prescription_file.get_top_spenders_by_region(1)
+        self.assertEqual(top_spenders_by_region['LONDON'], [('XYZ2 ABC', 1583.24)])
+        self.assertEqual(top_spenders_by_region['SOUTH WEST'], [('XYZ5 ABC', 34.5)])
+        self.assertEqual(top_spenders_by_region['UNKNOWN'], [('UNKNOWN', 29.02)])
+
+
+def process_with_checkpoints(filename, checkpoint_interval=1000000, row_limit=None):
+    process_prescription_file = PrescriptionFileReader(filename, None)
+    process_prescription_file.set_iteration_method('checkpointed_read')
+    process_prescription_file.set_checkpoint_interval(checkpoint_interval)
+    process_prescription_file.set_postcode_to_region_lookup(dummy_postcode_to_region_lookup)
+    process_prescription_file.set_practice_code_to_postcode_lookup(dummy_postcode_lookup_method)
+    process_prescription_file.setup_region_based_dictionaries(['LONDON', 'SOUTH EAST', 'SOUTH WEST', 'NORTH WEST'])
+    resumed = process_prescription_file.load_checkpoint()
+
+    for row_number, row in enumerate(process_prescription_file):
+        if row_limit is not None and row_number == row_limit:
+            break
+        process_prescription_file.process_file(row)
+
+    return process_prescription_file, resumed
+
+
+def get_results(process_prescription_file):
+    return [process_prescription_file.get_line_count(),
+            process_prescription_file.get_average_cost_of_prescription(),
+            process_prescription_file.get_average_price_by_region(),
+            process_prescription_file.get_cost_per_prescription(),
+            process_prescription_file.get_antidepressant_count_by_region(),
+            process_prescription_file.get_top_5_spenders()]
+
+
+class CheckpointResumeMatchesSequentialTest(unittest.TestCase):
+    def test(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = os.path.join(directory, 'prescriptions.csv')
+        shutil.copy('samples/prescription_sample.csv', filename)
+
+        expected, resumed = process_with_checkpoints('samples/prescription_sample.csv')
+        os.remove(expected.get_checkpoint_file())
+
+        """ Interrupted after 12 rows, so the last checkpoint holds the first 10
+        """
+        interrupted, resumed = process_with_checkpoints(filename, checkpoint_interval=5, row_limit=12)
+        self.assertFalse(resumed)
+
+        process_prescription_file, resumed = process_with_checkpoints(filename, checkpoint_interval=5)
+        self.assertTrue(resumed)
+        self.assertEqual(get_results(process_prescription_file), get_results(expected))
+
+
+class CheckpointResumeAfterSpillTest(unittest.TestCase):
+    def test(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = os.path.join(directory, 'prescriptions.csv')
+        shutil.copy('samples/prescription_sample.csv', filename)
+        spill_directory = os.path.join(directory, 'spill')
+
+        totals = []
+        for row_limit in [None, 12, None]:
+            process_prescription_file = PrescriptionFileReader(filename, None)
+            process_prescription_file.set_iteration_method('checkpointed_read')
+            process_prescription_file.set_checkpoint_interval(5)
+            process_prescription_file.set_postcode_to_region_lookup(dummy_postcode_to_region_lookup)
+            process_prescription_file.set_practice_code_to_postcode_lookup(dummy_postcode_lookup_method)
+            process_prescription_file.setup_region_based_dictionaries(['LONDON', 'SOUTH EAST', 'SOUTH WEST',
+                                                                       'NORTH WEST'])
+            process_prescription_file.register_aggregator('practice_bnf_period',
+                                                          PracticeBnfPeriodAggregator(1, spill_directory, 2))
+            process_prescription_file.load_checkpoint()
+
+            for row_number, row in enumerate(process_prescription_file):
+                if row_number == row_limit:
+                    break
+                process_prescription_file.process_file(row)
+
+            """ Reducing the runs and closing deletes every run file of the running aggregator
+            """
+            aggregator = process_prescription_file.get_aggregator('practice_bnf_period')
+            totals.append(list(aggregator.get_totals()))
+            aggregator.close()
+
+            if row_limit is None:
+                os.remove(process_prescription_file.get_checkpoint_file())
+
+        """ Interrupted after 12 rows, resumed from the checkpoint of the first 10
+        """
+        self.assertGreater(len(totals[0]), 1)
+        self.assertEqual(totals[2], totals[0])
+        self.assertEqual(os.listdir(spill_directory), [])
+
+
+class CheckpointIncrementalAppendTest(unittest.TestCase):
+    def test(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = os.path.join(directory, 'prescriptions.csv')
+
+        expected, resumed = process_with_checkpoints('samples/prescription_sample.csv')
+        os.remove(expected.get_checkpoint_file())
+
+        with open('samples/prescription_sample.csv', 'rt') as f:
+            lines = f.readlines()
+        with open(filename, 'wt') as f:
+            f.writelines(lines[:15])
+
+        process_with_checkpoints(filename)
+
+        with open(filename, 'at') as f:
+            f.writelines(lines[15:])
+
+        process_prescription_file, resumed = process_with_checkpoints(filename)
+        self.assertTrue(resumed)
+        self.assertEqual(get_results(process_prescription_file), get_results(expected))
+
+        """ Nothing was appended since, so the next run only restores the checkpoint
+        """
+        process_prescription_file, resumed = process_with_checkpoints(filename)
+        self.assertTrue(resumed)
+        self.assertEqual(get_results(process_prescription_file), get_results(expected))
+
+
+class CheckpointInvalidatedByRewriteTest(unittest.TestCase):
+    def test(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = os.path.join(directory, 'prescriptions.csv')
+        shutil.copy('samples/prescription_sample.csv', filename)
+
+        process_with_checkpoints(filename)
+
+        with open(filename, 'r+b') as f:
+            f.seek(-1, os.SEEK_END)
+            f.write(b'8')
+
+        process_prescription_file, resumed = process_with_checkpoints(filename)
+        self.assertFalse(resumed)
+        self.assertEqual(process_prescription_file.get_line_count(), 22)
+
+
+class CompressedInputMatchesSequentialTest(unittest.TestCase):
+    def test(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = os.path.join(directory, 'prescriptions.csv.gz')
+        with open('samples/prescription_sample.csv', 'rb') as source, gzip.open(filename, 'wb') as f:
+            shutil.copyfileobj(source, f)
+
+        expected, resumed = process_with_checkpoints('samples/prescription_sample.csv')
+        os.remove(expected.get_checkpoint_file())
+
+        process_prescription_file, resumed = process_with_checkpoints(filename)
+        self.assertEqual(get_results(process_prescription_file), get_results(expected))
+
+        process_prescription_file, resumed = process_with_checkpoints(filename)
+        self.assertTrue(resumed)
+        self.assertEqual(get_results(process_prescription_file), get_results(expected))
+
+        process_prescription_file = PrescriptionFileReader(filename, None)
+        process_prescription_file.set_iteration_method('columnar_read')
+        process_prescription_file.set_postcode_to_region_lookup(dummy_postcode_to_region_lookup)
+        process_prescription_file.set_practice_code_to_postcode_lookup(dummy_postcode_lookup_method)
+        process_prescription_file.setup_region_based_dictionaries(['LONDON', 'SOUTH EAST', 'SOUTH WEST',
+                                                                   'NORTH WEST'])
+        for row in process_prescription_file:
+            process_prescription_file.process_file(row)
+
+        self.assertEqual(get_results(process_prescription_file)[1:], get_results(expected)[1:])
+
+
+class ProfilingMatchesSequentialTest(unittest.TestCase):
+    def test(self):
+        results = []
+        for profiling in [False, True]:
+            process_prescription_file = PrescriptionFileReader('samples/prescription_sample.csv', None)
+            process_prescription_file.set_iteration_method('lazy_sequential_read')
+            process_prescription_file.set_profiling(profiling)
+            process_prescription_file.set_postcode_to_region_lookup(dummy_postcode_to_region_lookup)
+            process_prescription_file.set_practice_code_to_postcode_lookup(dummy_postcode_lookup_method)
+            process_prescription_file.setup_region_based_dictionaries(['LONDON', 'SOUTH EAST', 'SOUTH WEST',
+                                                                       'NORTH WEST'])
+
+            for row in process_prescription_file:
+                process_prescription_file.process_file(row)
+
+            results.append(get_results(process_prescription_file))
+
+        self.assertEqual(results[0], results[1])
+        self.assertGreater(process_prescription_file.get_decode_time(), 0)
+        self.assertEqual(list(process_prescription_file.get_aggregator_times()),
+                         list(process_prescription_file.get_aggregators()))
+
+
+class RowFilterTest(unittest.TestCase):
+    def test(self):
+        process_prescription_file = PrescriptionFileReader('samples/prescription_sample.csv', None)
+
+        self.assertIsNone(process_prescription_file.get_row_filter())
+
+        self.assertNotIn('bnf_hierarchy', process_prescription_file.get_aggregators())
+        self.assertRaises(KeyError, process_prescription_file.get_bnf_totals, 'chapter')
+
+        self.assertNotIn('spend_by_practice', process_prescription_file.get_aggregators())
+        process_prescription_file.remove_aggregator('spend_by_postcode')
+
+        row_filter = process_prescription_file.get_row_filter()
+        self.assertIn('Peppermint Oil', row_filter)
+        self.assertIn('Flucloxacillin', row_filter)
+        self.assertIn('Mirtazapine', row_filter)
+        self.assertRaises(KeyError, process_prescription_file.remove_aggregator, 'spend_by_postcode')
+
+        process_prescription_file.register_aggregator('bnf_hierarchy', BnfHierarchyAggregator())
+        self.assertIsNone(process_prescription_file.get_row_filter())
+
+
+class RowFilterPushDownMatchesSequentialTest(unittest.TestCase):
+    def test(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        iteration_methods = ['lazy_sequential_read', 'chunky_lazy_read', 'mmap_read', 'checkpointed_read']
+        if numpy is not None:
+            iteration_methods.append('batch_read')
+
+        results = []
+        for iteration_method in [None] + iteration_methods:
+            process_prescription_file = PrescriptionFileReader('samples/prescription_sample.csv', None)
+            process_prescription_file.set_checkpoint_file(os.path.join(directory, 'checkpoint'))
+            process_prescription_file.set_postcode_to_region_lookup(dummy_postcode_to_region_lookup)
+            process_prescription_file.set_practice_code_to_postcode_lookup(dummy_postcode_lookup_method)
+            process_prescription_file.setup_region_based_dictionaries(['LONDON', 'SOUTH EAST', 'SOUTH WEST',
+                                                                       'NORTH WEST'])
+            process_prescription_file.remove_aggregator('spend_by_postcode')
+
+            """ The first run reads every row, the others only those the aggregators count
+            """
+            if iteration_method is None:
+                process_prescription_file.set_iteration_method('lazy_sequential_read')
+            else:
+                process_prescription_file.set_iteration_method(iteration_method)
+                process_prescription_file.push_down_row_filter()
+
+            for row in process_prescription_file:
+                if iteration_method == 'batch_read':
+                    process_prescription_file.process_batch(row)
+                else:
+                    process_prescription_file.process_file(row)
+
+            results.append([process_prescription_file.get_line_count(),
+                            process_prescription_file.get_average_cost_of_prescription(),
+                            process_prescription_file.get_average_price_by_region(),
+                            process_prescription_file.get_cost_per_prescription(),
+                            process_prescription_file.get_antidepressant_count_by_region()])
+
+        for result in results[1:]:
+            self.assertEqual(result, results[0])
+
+
+def write_partitioned_sample(directory):
+    filename = os.path.join(directory, 'prescriptions.csv')
+    organisations = {'A86004': 'Q37,5L3', 'A86006': 'Q39,5QN', 'A86007': 'Q39,5QN', 'A86008': 'Q31,5NG'}
+    with open('samples/prescription_sample.csv', 'rt') as source, open(filename, 'wt') as f:
+        for line in source:
+            fields = line.split(',')
+            if fields[2] in organisations:
+                line = organisations[fields[2]] + line[7:]
+            f.write(line)
+    return filename
+
+
+class PartitionedReadPrunesRegionsTest(unittest.TestCase):
+    def test(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = write_partitioned_sample(directory)
+
+        results = []
+        for iteration_method in ['lazy_sequential_read', 'partitioned_read']:
+            process_prescription_file = PrescriptionFileReader(filename, None)
+            process_prescription_file.set_iteration_method(iteration_method)
+            process_prescription_file.set_postcode_to_region_lookup(dummy_postcode_to_region_lookup)
+            process_prescription_file.set_practice_code_to_postcode_lookup(dummy_postcode_lookup_method)
+            process_prescription_file.setup_region_based_dictionaries(['LONDON', 'SOUTH EAST', 'SOUTH WEST',
+                                                                       'NORTH WEST'])
+            process_prescription_file.register_aggregator('bnf_hierarchy', BnfHierarchyAggregator())
+            if iteration_method == 'partitioned_read':
+                process_prescription_file.build_partitions(os.path.join(directory, 'partitions'))
+                process_prescription_file.set_partition_regions(['LONDON'])
+                self.assertEqual([(partition['sha'], partition['pct']) for partition in
+                                  process_prescription_file.get_selected_partitions()], [('Q30', '5D7')])
+
+            for row in process_prescription_file:
+                process_prescription_file.process_file(row)
+
+            results.append([process_prescription_file.get_average_price_by_region()['LONDON'],
+                            process_prescription_file.get_antidepressant_count_by_region()['LONDON'],
+                            process_prescription_file.get_bnf_totals_by_region('0403')['LONDON']])
+
+        self.assertEqual(process_prescription_file.get_line_count(), 10)
+        self.assertEqual(results[1], results[0])
+
+
+class PartitionedReadOutOfDateTest(unittest.TestCase):
+    def test(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = write_partitioned_sample(directory)
+
+        process_prescription_file = PrescriptionFileReader(filename, None)
+        process_prescription_file.set_iteration_method('partitioned_read')
+        self.assertRaises(ValueError, list, process_prescription_file)
+
+        process_prescription_file.build_partitions(os.path.join(directory, 'partitions'))
+        with open(filename, 'at') as f:
+            f.write('\n')
+        self.assertRaises(ValueError, list, process_prescription_file)
+
+
+class ApproximateFullSampleMatchesExactTest(unittest.TestCase):
+    def test(self):
+        process_prescription_file = PrescriptionFileReader('samples/prescription_sample.csv', None)
+        process_prescription_file.set_postcode_to_region_lookup(dummy_postcode_to_region_lookup)
+        process_prescription_file.set_practice_code_to_postcode_lookup(dummy_postcode_lookup_method)
+        process_prescription_file.setup_region_based_dictionaries(['LONDON', 'SOUTH EAST', 'SOUTH WEST', 'NORTH WEST'])
+        process_prescription_file.set_approximate(1, block_size=200)
+
+        for row in process_prescription_file:
+            process_prescription_file.process_file(row)
+
+        self.assertEqual(process_prescription_file.get_approximate_average_cost_of_prescription(),
+                         (107.58, 107.58, 107.58))
+        self.assertEqual(process_prescription_file.get_approximate_cost_per_prescription(), (4.6, 4.6, 4.6))
+        self.assertEqual({region: estimate[0] for region, estimate in
+                          process_prescription_file.get_approximate_average_price_by_region().items()
+                          if estimate is not None},
+                         {region: price for region, price in
+                          process_prescription_file.get_average_price_by_region().items() if price})
+        self.assertEqual(process_prescription_file.get_approximate_top_spenders(),
+                         process_prescription_file.get_top_5_spenders())
+        self.assertEqual(process_prescription_file.get_distinct_practice_count(), 7)
+        self.assertEqual(process_prescription_file.get_distinct_bnf_code_count(), 20)
+
+
+class ApproximateSampleTest(unittest.TestCase):
+    def test(self):
+        process_prescription_file = PrescriptionFileReader('samples/prescription_sample.csv', None)
+        process_prescription_file.set_postcode_to_region_lookup(dummy_postcode_to_region_lookup)
+        process_prescription_file.set_practice_code_to_postcode_lookup(dummy_postcode_lookup_method)
+        for name in list(process_prescription_file.get_aggregators()):
+            process_prescription_file.remove_aggregator(name)
+        process_prescription_file.set_approximate(0.5, block_size=100, seed=1)
+
+        for row in process_prescription_file:
+            process_prescription_file.process_file(row)
+
+        self.assertEqual(process_prescription_file.get_aggregator('sampled_average').get_sampled_block_count(), 13)
+        self.assertLess(process_prescription_file.get_line_count(), 21)
+        average, lower, upper = process_prescription_file.get_approximate_cost_per_prescription()
+        self.assertLessEqual(lower, average)
+        self.assertLessEqual(average, upper)
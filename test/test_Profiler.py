@@ -0,0 +1,53 @@
+import tracemalloc
+import unittest
+from FileReader.Profiler import Profiler, resource
+from FileReader.PrescriptionFileReader import PrescriptionFileReader
+
+
+class StageTest(unittest.TestCase):
+    def test(self):
+        profiler = Profiler()
+
+        with profiler.stage('scan'):
+            process_prescription_file = PrescriptionFileReader('samples/prescription_sample.csv', None)
+            process_prescription_file.set_iteration_method('lazy_sequential_read')
+            for row in process_prescription_file:
+                pass
+
+        profiler.count_reader('scan', process_prescription_file)
+        stage = profiler.get_stage('scan')
+
+        self.assertGreater(stage['wall_seconds'], 0)
+        self.assertGreaterEqual(stage['cpu_seconds'], 0)
+        self.assertNotIn('peak_memory_bytes', stage)
+        if resource is not None:
+            self.assertGreater(stage['cumulative_peak_rss_bytes'], 0)
+            self.assertGreaterEqual(stage['peak_rss_growth_bytes'], 0)
+            self.assertLessEqual(stage['peak_rss_growth_bytes'], stage['cumulative_peak_rss_bytes'])
+        self.assertEqual(stage['rows'], 22)
+        self.assertEqual(stage['bytes'], 2507)
+        self.assertAlmostEqual(stage['rows_per_second'], 22 / stage['wall_seconds'])
+
+
+class PeakMemoryTest(unittest.TestCase):
+    def test(self):
+        profiler = Profiler(trace_memory=True)
+        self.addCleanup(tracemalloc.stop)
+
+        with profiler.stage('allocate'):
+            block = [0] * 100000
+            del block
+
+        self.assertGreaterEqual(profiler.get_stage('allocate')['peak_memory_bytes'], 800000)
+
+
+class StageFailTest(unittest.TestCase):
+    def test(self):
+        profiler = Profiler()
+
+        with self.assertRaises(ValueError):
+            with profiler.stage('failing'):
+                raise ValueError('Stage failed.')
+
+        self.assertIn('wall_seconds', profiler.get_stage('failing'))
+        self.assertRaises(KeyError, profiler.get_stage, 'missing')
@@ -0,0 +1,127 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from FileReader.SpillingTotals import SpillingTotals
+
+ROWS = [(('P2', '0403'), (1, 10)), (('P1', '0101'), (2, 20)), (('P3', '0403'), (3, 30)), (('P1', '0101'), (4, 40)),
+        (('P4', '0212'), (5, 50)), (('P2', '0403'), (6, 60)), (('P1', '0101'), (7, 70)), (('P5', '0101'), (8, 80))]
+
+
+def expected_totals(rows):
+    totals = {}
+    for key, values in rows:
+        totals[key] = tuple(total + value for total, value in zip(totals.get(key, (0, 0)), values))
+    return sorted(totals.items())
+
+
+class SpillAndMergeTest(unittest.TestCase):
+    def test(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        spilling_totals = SpillingTotals(2, max_keys=2, directory=directory)
+        for key, values in ROWS:
+            spilling_totals.add(key, values)
+
+        self.assertEqual(len(spilling_totals.get_run_files()), 3)
+        self.assertEqual(list(spilling_totals.items()), expected_totals(ROWS))
+        self.assertEqual(list(spilling_totals.items()), expected_totals(ROWS))
+
+        spilling_totals.close()
+        self.assertEqual(os.listdir(directory), [])
+        self.assertEqual(list(spilling_totals.items()), [])
+
+
+class InMemoryTest(unittest.TestCase):
+    def test(self):
+        spilling_totals = SpillingTotals(2)
+        for key, values in ROWS:
+            spilling_totals.add(key, values)
+
+        self.assertEqual(spilling_totals.get_run_files(), [])
+        self.assertEqual(list(spilling_totals.items()), expected_totals(ROWS))
+
+
+class MergePickledTest(unittest.TestCase):
+    def test(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        first = SpillingTotals(2, max_keys=2, directory=directory)
+        second = SpillingTotals(2, max_keys=2, directory=directory)
+        for key, values in ROWS[:4]:
+            first.add(key, values)
+        for key, values in ROWS[4:]:
+            second.add(key, values)
+
+        """ Shipped back from a worker process
+        """
+        first.merge(pickle.loads(pickle.dumps(second)))
+        self.assertEqual(list(first.items()), expected_totals(ROWS))
+        self.assertEqual(os.listdir(directory), [os.path.basename(first.get_run_directory())])
+        self.assertEqual(sorted(os.listdir(first.get_run_directory())), sorted(os.path.basename(run_file)
+                                                                               for run_file in first.get_run_files()))
+        first.close()
+
+
+class BoundedFanInTest(unittest.TestCase):
+    def test(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        spilling_totals = SpillingTotals(2, max_keys=1, directory=directory, fan_in=3)
+        for key, values in ROWS:
+            spilling_totals.add(key, values)
+        self.assertEqual(len(spilling_totals.get_run_files()), 7)
+
+        self.assertEqual(list(spilling_totals.items()), expected_totals(ROWS))
+        self.assertLess(len(spilling_totals.get_run_files()), 3)
+        self.assertEqual(sorted(os.listdir(spilling_totals.get_run_directory())),
+                         sorted(os.path.basename(run_file) for run_file in spilling_totals.get_run_files()))
+        self.assertEqual(list(spilling_totals.items()), expected_totals(ROWS))
+        self.assertRaises(ValueError, SpillingTotals, 2, 1, directory, 1)
+
+
+class LeftoverRunsRemovedTest(unittest.TestCase):
+    def test(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        spilling_totals = SpillingTotals(2, max_keys=2, directory=directory)
+        for key, values in ROWS:
+            spilling_totals.add(key, values)
+
+        """ A run spilled after the last checkpoint of an interrupted run is not among the resumed run files
+        """
+        resumed = pickle.loads(pickle.dumps(spilling_totals))
+        spilling_totals.spill()
+        self.assertEqual(len(os.listdir(resumed.get_run_directory())), len(resumed.get_run_files()) + 1)
+
+        resumed.close()
+        self.assertEqual(os.listdir(directory), [])
+
+
+class InvalidMaxKeysTest(unittest.TestCase):
+    def test(self):
+        self.assertRaises(ValueError, SpillingTotals, 2, 0)
+
+
+class CopySharesNoRunsTest(unittest.TestCase):
+    def test(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        spilling_totals = SpillingTotals(2, max_keys=1, directory=directory, fan_in=2)
+        for key, values in ROWS:
+            spilling_totals.add(key, values)
+        copy = spilling_totals.copy(os.path.join(directory, 'copy'))
+
+        self.assertEqual(list(spilling_totals.items()), expected_totals(ROWS))
+        spilling_totals.close()
+        self.assertEqual(list(copy.items()), expected_totals(ROWS))
+        copy.close()
+
+if __name__ == '__main__':
+    unittest.main()
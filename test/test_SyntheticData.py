@@ -0,0 +1,70 @@
+import os
+import shutil
+import tempfile
+import unittest
+from benchmark.generate_data import SyntheticData
+from FileReader.AddressFileReader import AddressFileReader
+from FileReader.PostcodeLookupReader import PostcodeLookupReader
+from FileReader.PrescriptionAggregators import SpendByPracticeAggregator
+from FileReader.PrescriptionFileReader import PrescriptionFileReader
+
+
+def write_data_set(directory, seed):
+    synthetic_data = SyntheticData(seed, practice_count=50, drug_count=40, outer_count=20)
+    synthetic_data.write_postcodes(os.path.join(directory, 'postcodes.csv'), 100)
+    synthetic_data.write_addresses(os.path.join(directory, 'addresses.csv'))
+    synthetic_data.write_prescriptions(os.path.join(directory, 'prescriptions.csv'), 1000, block_size=300)
+
+
+def read_bytes(filename):
+    with open(filename, 'rb') as f:
+        return f.read()
+
+
+class DeterministicTest(unittest.TestCase):
+    def test(self):
+        directories = [tempfile.mkdtemp() for i in range(3)]
+        for directory in directories:
+            self.addCleanup(shutil.rmtree, directory)
+
+        for directory, seed in zip(directories, [1, 1, 2]):
+            write_data_set(directory, seed)
+
+        filename = 'prescriptions.csv'
+        self.assertEqual(read_bytes(os.path.join(directories[0], filename)),
+                         read_bytes(os.path.join(directories[1], filename)))
+        self.assertNotEqual(read_bytes(os.path.join(directories[0], filename)),
+                            read_bytes(os.path.join(directories[2], filename)))
+
+
+class ReadableByReadersTest(unittest.TestCase):
+    def test(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        write_data_set(directory, 0)
+
+        postcode_lookup = PostcodeLookupReader(os.path.join(directory, 'postcodes.csv'), None)
+        postcode_lookup.set_iteration_method('projected_read')
+        for row in postcode_lookup:
+            postcode_lookup.process_file(row)
+
+        header = ("Period", "practice_code", "practice_name", "practice_building",
+                  "address", "locality", "town", "postcode")
+        process_address_file = AddressFileReader(os.path.join(directory, 'addresses.csv'), header)
+        process_address_file.set_iteration_method('chunky_lazy_read')
+        for row in process_address_file:
+            process_address_file.process_file(row)
+
+        process_prescription_file = PrescriptionFileReader(os.path.join(directory, 'prescriptions.csv'), None)
+        process_prescription_file.set_iteration_method('lazy_sequential_read')
+        process_prescription_file.set_practice_code_to_postcode_lookup(process_address_file.get_postcode_for_practice)
+        process_prescription_file.set_postcode_to_region_lookup(postcode_lookup.get_region_from_postcode)
+        process_prescription_file.setup_region_based_dictionaries(postcode_lookup.get_regions_list())
+        process_prescription_file.register_aggregator('spend_by_practice', SpendByPracticeAggregator())
+        for row in process_prescription_file:
+            process_prescription_file.process_file(row)
+
+        self.assertEqual(postcode_lookup.get_total_postcodes(), 20)
+        self.assertEqual(process_address_file.get_practice_code_to_postcode_count(), 48)
+        self.assertEqual(process_prescription_file.get_line_count(), 1001)
+        self.assertEqual(len(process_prescription_file.get_top_spenders_by_practice(5)), 5)